@@ -177,6 +177,84 @@ class HistogramM(BaseM):
         return output_text
 
 
+class FloatHistogramM(HistogramM):
+    """Histogram of float observations, e.g. durations in seconds"""
+
+    def __init__(self, field, help_text, buckets):
+        super(FloatHistogramM, self).__init__(field, help_text, buckets)
+        self.sum = FloatM(field + '_sum', '')
+
+
+class LabeledFloatHistogramM(BaseM):
+    """
+    FloatHistogramM with a separate histogram for each value of a label, e.g.
+    one per task name
+
+    The label values are only known once they are observed, so their redis
+    fields are named <field>{<label value>}_<bucket> and are found by prefix.
+    Callers must keep the set of label values bounded.
+    """
+
+    def __init__(self, field, help_text, buckets, label):
+        self.buckets = buckets
+        self.label = label
+        self.histograms = {}
+        super(LabeledFloatHistogramM, self).__init__(field, help_text)
+
+    def histogram(self, label_value):
+        if label_value not in self.histograms:
+            self.histograms[label_value] = FloatHistogramM(f'{self.field}{{{label_value}}}', '', self.buckets)
+        return self.histograms[label_value]
+
+    def redis_fields(self, conn):
+        """{label value: {bucket, 'sum' or 'inf': value}} of the fields stored in redis"""
+        prefix = self.field + '{'
+        fields = {}
+        for key, value in conn.hgetall(root_key).items():
+            key = key.decode('utf-8')
+            if key.startswith(prefix):
+                label_value, _, suffix = key[len(prefix) :].rpartition('}_')
+                if label_value:
+                    fields.setdefault(label_value, {})[suffix] = value
+        return fields
+
+    def reset_value(self, conn):
+        prefix = self.field + '{'
+        keys = [key for key in conn.hkeys(root_key) if key.decode('utf-8').startswith(prefix)]
+        if keys:
+            conn.hdel(root_key, *keys)
+        self.histograms = {}
+
+    def observe(self, value, label_value):
+        self.histogram(label_value).observe(value)
+
+    def decode(self, conn):
+        values = {}
+        for label_value, fields in self.redis_fields(conn).items():
+            values[label_value] = {
+                'counts': [int(fields.get(str(b), 0)) for b in self.buckets],
+                'sum': float(fields.get('sum', 0.0)),
+                'inf': int(fields.get('inf', 0)),
+            }
+        return values
+
+    def store_value(self, conn):
+        for histogram in self.histograms.values():
+            histogram.store_value(conn)
+
+    def to_prometheus(self, instance_data):
+        output_text = f"# HELP {self.field} {self.help_text}\n# TYPE {self.field} histogram\n"
+        for instance in instance_data:
+            for label_value, data in sorted(instance_data[instance].get(self.field, {}).items()):
+                labels = f'{self.label}="{label_value}",node="{instance}"'
+                for i, b in enumerate(self.buckets):
+                    output_text += f'{self.field}_bucket{{le="{b}",{labels}}} {sum(data["counts"][0:i+1])}\n'
+                output_text += f'{self.field}_bucket{{le="+Inf",{labels}}} {data["inf"]}\n'
+                output_text += f'{self.field}_count{{{labels}}} {data["inf"]}\n'
+                output_text += f'{self.field}_sum{{{labels}}} {data["sum"]}\n'
+        return output_text
+
+
 class Metrics(MetricsNamespace):
     # metric name, help_text
     METRICSLIST = []
@@ -245,8 +323,11 @@ class Metrics(MetricsNamespace):
     def decode(self, field):
         return self.METRICS[field].decode(self.conn)
 
-    def observe(self, field, value):
-        self.METRICS[field].observe(value)
+    def observe(self, field, value, label_value=None):
+        if label_value is None:
+            self.METRICS[field].observe(value)
+        else:
+            self.METRICS[field].observe(value, label_value)
         self.metrics_have_changed = True
         if self.auto_pipe_execute is True:
             self.pipe_execute()
@@ -354,7 +435,10 @@ class Metrics(MetricsNamespace):
 class DispatcherMetrics(Metrics):
     METRICSLIST = [
         SetFloatM('task_manager_get_tasks_seconds', 'Time spent in loading tasks from db'),
+        SetIntM('task_manager_tasks_loaded', 'Number of tasks loaded from db, fewer than all active tasks when only changes were loaded'),
         SetFloatM('task_manager_start_task_seconds', 'Time spent starting task'),
+        SetFloatM('task_manager_save_started_tasks_seconds', 'Time spent saving started tasks and submitting them to the dispatcher'),
+        SetFloatM('task_manager_tasks_started_per_second', 'Tasks started per second spent starting and submitting them'),
         SetFloatM('task_manager_process_running_tasks_seconds', 'Time spent processing running tasks'),
         SetFloatM('task_manager_process_pending_tasks_seconds', 'Time spent processing pending tasks'),
         SetFloatM('task_manager__schedule_seconds', 'Time spent in running the entire _schedule'),
@@ -376,10 +460,36 @@ class DispatcherMetrics(Metrics):
         SetFloatM('workflow_manager_recorded_timestamp', 'Unix timestamp when metrics were last recorded'),
         SetFloatM('workflow_manager_spawn_workflow_graph_jobs_seconds', 'Time spent spawning workflow tasks'),
         SetFloatM('workflow_manager_get_tasks_seconds', 'Time spent loading workflow tasks from db'),
+        SetIntM('workflow_manager_nodes_loaded', 'Number of workflow nodes loaded from db, only the changed ones when DAGs are kept between runs'),
         # dispatcher subsystem metrics
         SetIntM('dispatcher_pool_scale_up_events', 'Number of times local dispatcher scaled up a worker since startup'),
+        SetFloatM('dispatcher_pool_scale_up_seconds', 'Total time local dispatcher spent forking new workers since startup'),
+        SetIntM('dispatcher_pool_cold_starts', 'Number of tasks that had to wait for a new worker to be forked since startup'),
+        SetIntM('dispatcher_pool_idle_worker_count', 'Number of idle workers in the worker pool when metrics were last gathered'),
+        FloatM('dispatcher_control_queue_wait_seconds', 'Time control priority tasks spent waiting between publish and start'),
+        IntM('dispatcher_control_tasks_started', 'Number of control priority tasks started, counted once they finish'),
+        FloatM('dispatcher_normal_queue_wait_seconds', 'Time normal priority tasks spent waiting between publish and start'),
+        IntM('dispatcher_normal_tasks_started', 'Number of normal priority tasks started, counted once they finish'),
+        FloatM('dispatcher_bulk_queue_wait_seconds', 'Time bulk priority tasks spent waiting between publish and start'),
+        IntM('dispatcher_bulk_tasks_started', 'Number of bulk priority tasks started, counted once they finish'),
         SetIntM('dispatcher_pool_active_task_count', 'Number of active tasks in the worker pool when last task was submitted'),
         SetIntM('dispatcher_pool_max_worker_count', 'Highest number of workers in worker pool in last collection interval, about 20s'),
+        LabeledFloatHistogramM(
+            'dispatcher_task_publish_to_ack_seconds',
+            'Time between a task being published and the dispatcher receiving it',
+            settings.SUBSYSTEM_METRICS_DISPATCHER_TASK_BUCKETS,
+            'task',
+        ),
+        LabeledFloatHistogramM(
+            'dispatcher_task_ack_to_start_seconds',
+            'Time between the dispatcher receiving a task and a worker starting it',
+            settings.SUBSYSTEM_METRICS_DISPATCHER_TASK_BUCKETS,
+            'task',
+        ),
+        LabeledFloatHistogramM(
+            'dispatcher_task_execution_seconds', 'Time workers spent running tasks', settings.SUBSYSTEM_METRICS_DISPATCHER_TASK_BUCKETS, 'task'
+        ),
+        IntM('dispatcher_tasks_coalesced', 'Number of task submissions merged into an identical pending one'),
         SetFloatM('dispatcher_availability', 'Fraction of time (in last collection interval) dispatcher was able to receive messages'),
     ]
 
@@ -400,6 +510,13 @@ class CallbackReceiverMetrics(Metrics):
             'callback_receiver_batch_events_insert_db', 'Number of events batch inserted into database', settings.SUBSYSTEM_METRICS_BATCH_INSERT_BUCKETS
         ),
         SetFloatM('callback_receiver_event_processing_avg_seconds', 'Average processing time per event per callback receiver batch'),
+        SetIntM('callback_receiver_notifications_queue_size', 'Number of websocket notifications waiting to be sent by a callback receiver worker'),
+        IntM('callback_receiver_notifications_dropped', 'Number of websocket notifications dropped because the publisher queue was full'),
+        SetIntM('callback_receiver_backpressure_engaged', 'Whether the redis queue size is at or above JOB_EVENT_BACKPRESSURE_HIGH_WATER_MARK'),
+        IntM('callback_receiver_backpressure_skipped_websocket', 'Number of websocket messages skipped by running jobs because of backpressure'),
+        IntM('callback_receiver_events_spilled', 'Number of events written to the spill file because the database was unavailable'),
+        IntM('callback_receiver_events_spill_replayed', 'Number of events saved from the spill file'),
+        IntM('callback_receiver_events_spill_dropped', 'Number of events discarded because the spill file was full or disabled'),
     ]
 
     def __init__(self, *args, **kwargs):
@@ -441,7 +558,14 @@ class CustomToPrometheusMetricsCollector(prometheus_client.registry.Collector):
             if not entry:
                 logger.debug(f"{self._metrics._namespace} metric '{metric.field}' not found in redis data payload {json.dumps(instance_data, indent=2)}")
                 continue
-            if isinstance(metric, HistogramM):
+            if isinstance(metric, LabeledFloatHistogramM):
+                histogram = HistogramMetricFamily(metric.field, metric.help_text, labels=[metric.label])
+                for label_value, data in sorted(entry.items()):
+                    buckets = [[str(b), count] for b, count in zip(metric.buckets, itertools.accumulate(data['counts']))]
+                    buckets.append(['+Inf', data['inf']])
+                    histogram.add_metric([label_value], buckets, sum_value=data['sum'])
+                yield histogram
+            elif isinstance(metric, HistogramM):
                 buckets = list(zip(metric.buckets, entry['counts']))
                 buckets = [[str(i[0]), str(i[1])] for i in buckets]
                 yield HistogramMetricFamily(metric.field, metric.help_text, buckets=buckets, sum_value=entry['sum'])
@@ -1,8 +1,12 @@
 import json
 import logging
+import os
+import queue
+import threading
 import time
 import hmac
 import asyncio
+import atexit
 import redis
 
 from django.core.serializers.json import DjangoJSONEncoder
@@ -118,6 +122,9 @@ class RelayConsumer(AsyncJsonWebsocketConsumer):
 
 
 class EventConsumer(AsyncJsonWebsocketConsumer):
+    # clients opt in to receiving batched messages as a JSON list of events
+    batch_events = False
+
     async def connect(self):
         user = self.scope['user']
         if user and not user.is_anonymous:
@@ -170,6 +177,9 @@ class EventConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"error": "access denied to channel"})
             return
 
+        if 'batch_events' in data:
+            self.batch_events = bool(data['batch_events'])
+
         if 'groups' in data:
             groups = data['groups']
             new_groups = set()
@@ -217,6 +227,13 @@ class EventConsumer(AsyncJsonWebsocketConsumer):
     async def internal_message(self, event):
         await self.send(event['text'])
 
+    async def internal_message_batch(self, event):
+        if self.batch_events:
+            await self.send('[{}]'.format(','.join(event['texts'])))
+        else:
+            for text in event['texts']:
+                await self.send(text)
+
 
 def run_sync(func):
     event_loop = asyncio.new_event_loop()
@@ -224,6 +241,86 @@ def run_sync(func):
     event_loop.close()
 
 
+class ChannelNotificationPublisher:
+    """
+    Sends channel layer group messages from a long-lived event loop thread.
+
+    Callers only put messages on a bounded in-memory queue, so they never wait
+    on redis, and the channel layer connections are reused between messages.
+    When the queue is full, new messages are dropped and counted.
+    """
+
+    def __init__(self, maxsize):
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.channel_layer = get_channel_layer()
+        self.thread = threading.Thread(target=self.run, name='channel_notification_publisher', daemon=True)
+        self.thread.start()
+
+    def put(self, group, message):
+        try:
+            self.queue.put_nowait((group, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    def run(self):
+        event_loop = asyncio.new_event_loop()
+        while True:
+            messages = [self.queue.get()]
+            try:
+                while True:
+                    messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                event_loop.run_until_complete(self.send(messages))
+            finally:
+                for _ in messages:
+                    self.queue.task_done()
+
+    async def send(self, messages):
+        # messages are sent one at a time to preserve their order within a group
+        for group, message in messages:
+            try:
+                await self.channel_layer.group_send(group, message)
+            except Exception:
+                logger.exception(f'Failed to send channel notification to group {group}')
+
+    def flush(self, timeout=5):
+        """Wait, for at most timeout seconds, for queued messages to be sent"""
+        if self.pid != os.getpid():
+            return  # inherited through a fork, the publishing thread only exists in the parent
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_channel_notification_publisher():
+    """Returns the publisher for this process, starting it on first use (and again after a fork)"""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None or _publisher.pid != os.getpid():
+            _publisher = ChannelNotificationPublisher(settings.CHANNEL_NOTIFICATION_MAX_QUEUE_SIZE)
+        return _publisher
+
+
+def _flush_channel_notification_publisher():
+    if _publisher is not None:
+        _publisher.flush()
+
+
+# registered once, forked processes inherit it and flush their own publisher
+atexit.register(_flush_channel_notification_publisher)
+
+
 def _dump_payload(payload):
     try:
         return json.dumps(payload, cls=DjangoJSONEncoder)
@@ -241,11 +338,28 @@ def emit_channel_notification(group, payload):
     if payload_dumped is None:
         return
 
+    _send_channel_message(group, {"type": "internal.message", "text": payload_dumped, "needs_relay": True})
+
+
+def emit_channel_notification_batch(group, payloads):
+    """
+    Sends several payloads to a group in a single channel layer message
+
+    Clients which subscribed with batch_events receive them as one JSON list,
+    all other clients receive them one at a time.
+    """
+    payloads_dumped = [p for p in map(_dump_payload, payloads) if p is not None]
+    if not payloads_dumped:
+        return
+
+    _send_channel_message(group, {"type": "internal.message_batch", "texts": payloads_dumped, "needs_relay": True})
+
+
+def _send_channel_message(group, message):
+    if settings.CHANNEL_NOTIFICATION_ASYNC_PUBLISHER:
+        get_channel_notification_publisher().put(group, message)
+        return
+
     channel_layer = get_channel_layer()
 
-    run_sync(
-        channel_layer.group_send(
-            group,
-            {"type": "internal.message", "text": payload_dumped, "needs_relay": True},
-        )
-    )
+    run_sync(channel_layer.group_send(group, message))
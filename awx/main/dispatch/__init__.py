@@ -60,6 +60,19 @@ class PubSub(object):
         with self.conn.cursor() as cur:
             cur.execute('SELECT pg_notify(%s, %s);', (channel, payload))
 
+    def notify_many(self, messages):
+        """Send a list of (channel, payload) notifications, in order, in a single round trip"""
+        if len(messages) == 1:
+            return self.notify(*messages[0])
+        if not messages:
+            return
+        channels, payloads = zip(*messages)
+        with self.conn.cursor() as cur:
+            cur.execute(
+                'SELECT pg_notify(m.channel, m.payload) FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS m(channel, payload, n) ORDER BY m.n;',
+                (list(channels), list(payloads)),
+            )
+
     @staticmethod
     def current_notifies(conn):
         """
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+
+__all__ = ['Coalescer']
+
+
+class Coalescer:
+    """
+    Merges bursts of task messages published with @task(coalesce_key=...)
+
+    The first message with a given coalesce key is dispatched right away and
+    opens a window.  Messages with the same key that arrive during the window
+    are merged into a single trailing message, the latest one, which is
+    dispatched when the window ends and opens the next one.  Every submission
+    is followed by a run that starts after it, so this is safe for idempotent
+    tasks, and only trailing messages are ever held by the dispatcher.
+    """
+
+    def __init__(self):
+        # coalesce key: [window end, window, trailing message or None]
+        self.held = {}
+        self.coalesced = 0
+
+    def hold(self, body):
+        """Returns True if the message was held or merged, False if it should be dispatched right away"""
+        key = body.get('coalesce_key') if isinstance(body, dict) else None
+        if not key:
+            return False
+        window = body.get('coalesce_window', settings.DISPATCHER_COALESCE_WINDOW)
+        if window <= 0:
+            return False
+        entry = self.held.get(key)
+        if entry is None or (entry[2] is None and entry[0] <= time.monotonic()):
+            self.held[key] = [time.monotonic() + window, window, None]
+            return False
+        if entry[2] is not None:
+            self.coalesced += 1
+        entry[2] = body
+        return True
+
+    def due(self):
+        """Pop the trailing messages whose window has passed, in the order their windows opened"""
+        now = time.monotonic()
+        ready = []
+        for key, entry in list(self.held.items()):
+            deadline, window, body = entry
+            if deadline > now:
+                continue
+            if body is None:
+                del self.held[key]
+            else:
+                ready.append(body)
+                self.held[key] = [now + window, window, None]
+        return ready
+
+    def drain(self):
+        """Pop every trailing message, e.g. when the dispatcher stops"""
+        ready = [body for _, _, body in self.held.values() if body is not None]
+        self.held = {}
+        return ready
+
+    def time_until_next(self):
+        deadlines = [deadline for deadline, _, body in self.held.values() if body is not None]
+        if not deadlines:
+            return None
+        return min(deadlines) - time.monotonic()
@@ -46,6 +46,9 @@ class Control(object):
     def schedule(self, *args, **kwargs):
         return self.control_with_reply('schedule', *args, **kwargs)
 
+    def stats(self, *args, **kwargs):
+        return self.control_with_reply('stats', *args, **kwargs)
+
     @classmethod
     def generate_reply_queue_name(cls):
         return f"reply_to_{str(uuid.uuid4()).replace('-','_')}"
@@ -0,0 +1,121 @@
+import collections
+import importlib
+
+from django.conf import settings
+
+from awx.main.dispatch.publish import task_registry
+
+__all__ = ['TaskLedger']
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def task_label(task):
+    """
+    The task name to label metrics with, bounded to the tasks registered with
+    @task(); a module not imported in the dispatcher yet is imported first,
+    just as a worker running the task would
+    """
+    if task not in task_registry and task.startswith('awx.'):
+        try:
+            importlib.import_module(task.rsplit('.', 1)[0])
+        except Exception:
+            pass
+    return task if task in task_registry else 'other'
+
+
+class TaskLedger:
+    """
+    Rolling record of how long dispatcher tasks took, per task name
+
+    For every finished task the pool records three phases:
+
+    * publish_to_ack: from apply_async() until the dispatcher received it
+    * ack_to_start: waiting in the dispatcher until a worker started it
+    * execution: the worker running it
+
+    The last `window` runs of every task are kept for stats(), totals are
+    kept since startup.  Runs not yet exported to the subsystem metrics
+    histograms, and to the per priority class queue wait counters, are held
+    until export().
+    """
+
+    PHASES = ('publish_to_ack', 'ack_to_start', 'execution')
+    MAX_PENDING = 10000
+
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, 'DISPATCHER_TASK_LEDGER_WINDOW', 1000)
+        self.tasks = {}
+        self.pending = collections.deque(maxlen=self.MAX_PENDING)
+
+    def record(self, task, publish_to_ack, ack_to_start, execution, priority='normal'):
+        entry = self.tasks.get(task)
+        if entry is None:
+            entry = self.tasks[task] = {
+                'count': 0,
+                'total': dict.fromkeys(self.PHASES, 0.0),
+                'recent': {phase: collections.deque(maxlen=self.window) for phase in self.PHASES},
+            }
+        entry['count'] += 1
+        timings = dict(zip(self.PHASES, (publish_to_ack, ack_to_start, execution)))
+        for phase, value in timings.items():
+            if value is None:
+                continue
+            value = max(value, 0.0)
+            entry['total'][phase] += value
+            entry['recent'][phase].append(value)
+        self.pending.append((task, priority, timings))
+
+    def record_body(self, body, start, end):
+        """Record a finished task message, given when the worker started and finished it"""
+        time_pub, time_ack = body.get('time_pub'), body.get('time_ack')
+        self.record(
+            body.get('task', 'unknown'),
+            time_ack - time_pub if time_pub and time_ack else None,
+            start - time_ack if time_ack else None,
+            end - start,
+            priority=body.get('priority', 'normal'),
+        )
+
+    def stats(self):
+        """JSON serializable summary of every task seen, e.g. for dispatcherctl stats"""
+        stats = {}
+        for task, entry in self.tasks.items():
+            stats[task] = {'count': entry['count']}
+            for phase in self.PHASES:
+                recent = entry['recent'][phase]
+                stats[task][phase] = {
+                    'total': entry['total'][phase],
+                    'p50': percentile(recent, 0.5),
+                    'p95': percentile(recent, 0.95),
+                    'max': max(recent, default=None),
+                }
+        return stats
+
+    def export(self, metrics_object):
+        """
+        Observe the runs recorded since the last export in the dispatcher_task_*
+        histograms of their task, and add up their publish to start time by
+        priority class
+        """
+        queue_wait = collections.Counter()
+        started = collections.Counter()
+        labels = {}
+        while self.pending:
+            task, priority, timings = self.pending.popleft()
+            if task not in labels:
+                labels[task] = task_label(task)
+            for phase, value in timings.items():
+                if value is not None:
+                    metrics_object.observe(f'dispatcher_task_{phase}_seconds', max(value, 0.0), labels[task])
+            if timings['publish_to_ack'] is not None and timings['ack_to_start'] is not None:
+                queue_wait[priority] += max(timings['publish_to_ack'], 0.0) + max(timings['ack_to_start'], 0.0)
+                started[priority] += 1
+        for priority, count in started.items():
+            metrics_object.inc(f'dispatcher_{priority}_queue_wait_seconds', queue_wait[priority])
+            metrics_object.inc(f'dispatcher_{priority}_tasks_started', count)
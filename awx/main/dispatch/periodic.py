@@ -1,7 +1,12 @@
+import heapq
+import itertools
 import logging
+import random
 import time
 import yaml
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from django.conf import settings
 
 
 logger = logging.getLogger('awx.main.dispatch.periodic')
@@ -19,24 +24,44 @@ class ScheduledTask:
     and it runs at t=7s, then it calls for next run in 3s.
     However, if a complete interval has passed, that is counted as a missed run,
     and missed runs are abandoned (no catch-up runs).
+
+    Jitter:
+    With a jitter of N seconds, every run is delayed by a random amount of up
+    to N seconds past its target time, so that the same schedule on many nodes
+    does not fire at the same moment.  The target times themselves do not move.
     """
 
-    def __init__(self, name: str, data: dict):
+    def __init__(self, name: str, data: dict, jitter=0.0):
         # parameters need for schedule computation
         self.interval = int(data['schedule'].total_seconds())
         self.offset = 0  # offset relative to start time this schedule begins
         self.index = 0  # number of periods of the schedule that has passed
+        jitter = data.get('jitter', jitter)
+        if isinstance(jitter, timedelta):
+            jitter = jitter.total_seconds()
+        # keep a delayed run inside of its own interval
+        self.jitter = min(float(jitter), self.interval / 2)
+        self.delay = self.draw_delay()  # random delay of the next run
 
         # parameters that do not affect scheduling logic
         self.last_run = None  # time of last run, only used for debug
+        self.last_lateness = None  # seconds the last run was past its target, only used for debug
         self.completed_runs = 0  # number of times schedule is known to run
         self.name = name
         self.data = data  # used by caller to know what to run
 
+    def draw_delay(self):
+        return random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+
+    @property
+    def target(self):
+        "Time of the next run before jitter, with t=0 being the global_start of the scheduler class"
+        return (self.index + 1) * self.interval + self.offset
+
     @property
     def next_run(self):
         "Time until the next run with t=0 being the global_start of the scheduler class"
-        return (self.index + 1) * self.interval + self.offset
+        return self.target + self.delay
 
     def due_to_run(self, relative_time):
         return bool(self.next_run <= relative_time)
@@ -46,23 +71,26 @@ class ScheduledTask:
 
     def mark_run(self, relative_time):
         self.last_run = relative_time
+        self.last_lateness = relative_time - self.target
         self.completed_runs += 1
         new_index = self.expected_runs(relative_time)
         if new_index > self.index + 1:
             logger.warning(f'Missed {new_index - self.index - 1} schedules of {self.name}')
         self.index = new_index
+        self.delay = self.draw_delay()
 
     def missed_runs(self, relative_time):
         "Number of times job was supposed to ran but failed to, only used for debug"
         missed_ct = self.expected_runs(relative_time) - self.completed_runs
-        # if this is currently due to run do not count that as a missed run
-        if missed_ct and self.due_to_run(relative_time):
+        # if this is currently due to run (or only waiting out its jitter)
+        # do not count that as a missed run
+        if missed_ct and self.target <= relative_time:
             missed_ct -= 1
         return missed_ct
 
 
 class Scheduler:
-    def __init__(self, schedule):
+    def __init__(self, schedule, jitter=None):
         """
         Expects schedule in the form of a dictionary like
         {
@@ -70,8 +98,12 @@ class Scheduler:
         }
         Only the schedule nearest-second value is used for scheduling,
         the rest of the data is for use by the caller to know what to run.
+        A schedule may set its own 'jitter', otherwise the `jitter` given here
+        (by default DISPATCHER_SCHEDULE_JITTER) applies.
         """
-        self.jobs = [ScheduledTask(name, data) for name, data in schedule.items()]
+        if jitter is None:
+            jitter = getattr(settings, 'DISPATCHER_SCHEDULE_JITTER', 0.0)
+        self.jobs = [ScheduledTask(name, data, jitter=jitter) for name, data in schedule.items()]
         min_interval = min(job.interval for job in self.jobs)
         num_jobs = len(self.jobs)
 
@@ -88,19 +120,40 @@ class Scheduler:
         # internally times are all referenced relative to startup time, add grace period
         self.global_start = time.time() + 2.0
 
+        # heap of (next_run, tiebreaker, job), built on first use so the
+        # offsets above may still be adjusted
+        self.heap = None
+        self.counter = itertools.count()
+
+    def push(self, job):
+        heapq.heappush(self.heap, (job.next_run, next(self.counter), job))
+
+    def peek(self):
+        """Return the job that runs next, in O(log n)"""
+        if self.heap is None:
+            self.heap = []
+            for job in self.jobs:
+                self.push(job)
+        # a job marked as run from outside of the scheduler is queued at a
+        # stale time, put it back where it belongs
+        while self.heap[0][0] != self.heap[0][2].next_run:
+            self.push(heapq.heappop(self.heap)[2])
+        return self.heap[0][2]
+
     def get_and_mark_pending(self):
         relative_time = time.time() - self.global_start
         to_run = []
-        for job in self.jobs:
-            if job.due_to_run(relative_time):
-                to_run.append(job)
-                logger.debug(f'scheduler found {job.name} to run, {relative_time - job.next_run} seconds after target')
-                job.mark_run(relative_time)
+        while self.peek().due_to_run(relative_time):
+            job = heapq.heappop(self.heap)[2]
+            to_run.append(job)
+            logger.debug(f'scheduler found {job.name} to run, {relative_time - job.next_run} seconds after target')
+            job.mark_run(relative_time)
+            self.push(job)
         return to_run
 
     def time_until_next_run(self):
         relative_time = time.time() - self.global_start
-        next_job = min(self.jobs, key=lambda j: j.next_run)
+        next_job = self.peek()
         delta = next_job.next_run - relative_time
         if delta <= 0.1:
             # careful not to give 0 or negative values to the select timeout, which has unclear interpretation
@@ -123,6 +176,7 @@ class Scheduler:
         data['current_time'] = now
         data['current_time_relative'] = round(relative_time, 3)
         data['total_schedules'] = len(self.jobs)
+        data['total_missed_runs'] = sum(job.missed_runs(relative_time) for job in self.jobs)
 
         data['schedule_list'] = dict(
             [
@@ -132,6 +186,8 @@ class Scheduler:
                         last_run_seconds_ago=round(relative_time - job.last_run, 3) if job.last_run else None,
                         next_run_in_seconds=round(job.next_run - relative_time, 3),
                         offset_in_seconds=job.offset,
+                        jitter_in_seconds=job.jitter,
+                        last_run_lateness_seconds=round(job.last_lateness, 3) if job.last_lateness is not None else None,
                         completed_runs=job.completed_runs,
                         missed_runs=job.missed_runs(relative_time),
                     ),
@@ -9,8 +9,10 @@ from datetime import datetime
 from uuid import uuid4
 
 import collections
+import ctypes
 from multiprocessing import Process
 from multiprocessing import Queue as MPQueue
+from multiprocessing.sharedctypes import RawValue
 from queue import Full as QueueFull, Empty as QueueEmpty
 
 from django.conf import settings
@@ -23,6 +25,8 @@ import psutil
 
 from awx.main.models import UnifiedJob
 from awx.main.dispatch import reaper
+from awx.main.dispatch.ledger import TaskLedger
+from awx.main.dispatch.publish import TASK_PRIORITIES
 from awx.main.utils.common import convert_mem_str_to_bytes, get_mem_effective_capacity, log_excess_runtime
 
 if 'run_callback_receiver' in sys.argv:
@@ -31,30 +35,108 @@ else:
     logger = logging.getLogger('awx.main.dispatch')
 
 
-class NoOpResultQueue(object):
-    def put(self, item):
+# number of recently finished messages WorkerStatus keeps the uuid and timings of
+TIMINGS_RING_SIZE = 64
+
+
+class FinishedMessageSlot(ctypes.Structure):
+    _fields_ = [
+        ('uuid', ctypes.c_char * 64),
+        ('start_time', ctypes.c_double),
+        ('end_time', ctypes.c_double),
+    ]
+
+
+class WorkerStatusSlot(ctypes.Structure):
+    _fields_ = [
+        ('finished', ctypes.c_uint64),
+        ('start_time', ctypes.c_double),
+        ('uuid', ctypes.c_char * 64),
+        # the last finished messages, indexed by their sequence number modulo
+        # TIMINGS_RING_SIZE
+        ('finished_messages', FinishedMessageSlot * TIMINGS_RING_SIZE),
+    ]
+
+
+class WorkerStatus(object):
+    """
+    Status of one worker process, kept in shared memory
+
+    The worker process is the only writer: it records the message it starts
+    and counts the messages it finished.  The parent reads the slot without
+    any IPC round trip or unpickling, which keeps busy/idle checks cheap.
+    """
+
+    def __init__(self):
+        self.slot = RawValue(WorkerStatusSlot)
+
+    def start(self, body):
+        uuid = body.get('uuid') if isinstance(body, dict) else None
+        self.slot.uuid = str(uuid or '').encode('utf-8')[: WorkerStatusSlot.uuid.size - 1]
+        self.slot.start_time = time.time()
+
+    def finish(self):
+        message = self.slot.finished_messages[self.slot.finished % TIMINGS_RING_SIZE]
+        message.uuid = self.slot.uuid
+        message.start_time, message.end_time = self.slot.start_time, time.time()
+        self.slot.start_time = 0.0
+        self.slot.finished += 1
+
+    @property
+    def finished(self):
+        return self.slot.finished
+
+    def finished_message(self, seq):
+        """(uuid, start, end) of the finished message with this sequence number, if still known"""
+        if not 0 < self.slot.finished - seq <= TIMINGS_RING_SIZE:
+            return None
+        message = self.slot.finished_messages[seq % TIMINGS_RING_SIZE]
+        return message.uuid.decode('utf-8', 'replace'), message.start_time, message.end_time
+
+    @property
+    def current(self):
+        """(uuid, start time) of the running message, or None when idle"""
+        start_time = self.slot.start_time
+        if not start_time:
+            return None
+        return self.slot.uuid.decode('utf-8', 'replace'), start_time
+
+
+class NoOpWorkerStatus(object):
+    finished = 0
+    current = None
+
+    def start(self, body):
         pass
 
+    def finish(self):
+        pass
+
+    def finished_message(self, seq):
+        return None
+
 
 class PoolWorker(object):
     """
     Used to track a worker child process and its pending and finished messages.
 
-    This class makes use of two distinct multiprocessing.Queues to track state:
+    This class tracks state with:
 
     - self.queue: this is a queue which represents pending messages that should
                   be handled by this worker process; as new AMQP messages come
                   in, a pool will put() them into this queue; the child
                   process that is forked will get() from this queue and handle
                   received messages in an endless loop
-    - self.finished: this is a queue which the worker process uses to signal
-                     that it has finished processing a message
+    - self.status: a WorkerStatus slot in shared memory, where the worker
+                   process records the message it is running and counts the
+                   messages it has finished
 
     When a message is put() onto this worker, it is tracked in
     self.managed_tasks.
 
     Periodically, the worker will call .calculate_managed_tasks(), which will
-    cause messages in self.finished to be removed from self.managed_tasks.
+    remove the messages that the worker process finished since the last call
+    from self.managed_tasks, by the uuids recorded in self.status.
 
     In this way, self.managed_tasks represents a view of the messages assigned
     to a specific process.  The message at [0] is the least-recently inserted
@@ -70,24 +152,30 @@ class PoolWorker(object):
     def __init__(self, queue_size, target, args, **kwargs):
         self.messages_sent = 0
         self.messages_finished = 0
+        # name of the task most recently handed to this worker
+        self.last_task = None
         self.managed_tasks = collections.OrderedDict()
-        self.finished = MPQueue(queue_size) if self.track_managed_tasks else NoOpResultQueue()
+        self.status = WorkerStatus() if self.track_managed_tasks else NoOpWorkerStatus()
+        # TaskLedger that the timings of finished messages are recorded in
+        self.ledger = kwargs.get('ledger')
         self.queue = MPQueue(queue_size)
-        self.process = Process(target=target, args=(self.queue, self.finished) + args)
+        self.process = Process(target=target, args=(self.queue, self.status) + args)
         self.process.daemon = True
 
     def start(self):
         self.process.start()
 
     def put(self, body):
-        uuid = '?'
         if isinstance(body, dict):
             if not body.get('uuid'):
                 body['uuid'] = str(uuid4())
             uuid = body['uuid']
+            self.last_task = body.get('task')
+        else:
+            uuid = str(uuid4())
+        self.queue.put(body, block=True, timeout=5)
         if self.track_managed_tasks:
             self.managed_tasks[uuid] = body
-        self.queue.put(body, block=True, timeout=5)
         self.messages_sent += 1
         self.calculate_managed_tasks()
 
@@ -120,30 +208,43 @@ class PoolWorker(object):
     def exitcode(self):
         return str(self.process.exitcode)
 
+    def pop_finished(self, uuid):
+        """Remove a message the worker process finished from self.managed_tasks"""
+        if uuid:
+            return self.managed_tasks.pop(uuid, None)
+        # messages that aren't dicts carry no uuid to the worker process;
+        # they are handled in the order they were put()
+        for key, body in self.managed_tasks.items():
+            if not isinstance(body, dict):
+                return self.managed_tasks.pop(key)
+        return None
+
     def calculate_managed_tasks(self):
         if not self.track_managed_tasks:
             return
-        # look to see if any tasks were finished
-        finished = []
-        for _ in range(self.finished.qsize()):
-            try:
-                finished.append(self.finished.get(block=False))
-            except QueueEmpty:
-                break  # qsize is not always _totally_ up to date
+        finished = self.status.finished
+        seq = self.messages_finished
+        if finished - seq > TIMINGS_RING_SIZE:
+            # more messages finished since the last look than the status
+            # remembers; messages are handled in order, so the forgotten ones
+            # are the oldest
+            for _ in range(min(finished - seq - TIMINGS_RING_SIZE, len(self.managed_tasks))):
+                self.managed_tasks.popitem(last=False)
+            seq = finished - TIMINGS_RING_SIZE
+        for seq in range(seq, finished):
+            uuid, start, end = self.status.finished_message(seq)
+            body = self.pop_finished(uuid)
+            if self.ledger is not None and isinstance(body, dict):
+                self.ledger.record_body(body, start, end)
+        self.messages_finished = finished
 
-        # if any tasks were finished, removed them from the managed tasks for
-        # this worker
-        for uuid in finished:
-            try:
-                del self.managed_tasks[uuid]
-                self.messages_finished += 1
-            except KeyError:
-                # ansible _sometimes_ appears to send events w/ duplicate UUIDs;
-                # UUIDs for ansible events are *not* actually globally unique
-                # when this occurs, it's _fine_ to ignore this KeyError because
-                # the purpose of self.managed_tasks is to just track internal
-                # state of which events are *currently* being processed.
-                logger.warning('Event UUID {} appears to be have been duplicated.'.format(uuid))
+    @property
+    def running_since(self):
+        """Time the worker process started its current task, if known"""
+        current = self.status.current
+        if current and self.managed_tasks and current[0] == next(iter(self.managed_tasks)):
+            return current[1]
+        return None
 
     @property
     def current_task(self):
@@ -218,6 +319,7 @@ class WorkerPool(object):
 
     pool_cls = PoolWorker
     debug_meta = ''
+    ledger = None
 
     def __init__(self, min_workers=None, queue_size=None):
         self.name = settings.CLUSTER_HOST_ID
@@ -242,7 +344,7 @@ class WorkerPool(object):
         # for the DB and cache connections (that way lies race conditions)
         django_connection.close()
         django_cache.close()
-        worker = self.pool_cls(self.queue_size, self.target, (idx,) + self.target_args)
+        worker = self.pool_cls(self.queue_size, self.target, (idx,) + self.target_args, ledger=self.ledger)
         self.workers.append(worker)
         try:
             worker.start()
@@ -309,8 +411,27 @@ class AutoscalePool(WorkerPool):
     """
     An extended pool implementation that automatically scales workers up and
     down based on demand
+
+    With DISPATCHER_WARM_SPARE_WORKERS set, the pool forks workers ahead of
+    time so that this many are idle, plus one for each message in the last
+    minute that had to wait for a worker to be forked (a cold start).  Spares
+    are forked every SPARE_INTERVAL seconds by the consumer, and on cleanup,
+    never while a message is being written.  Idle workers that ran the same task last are preferred,
+    as their imports and caches are already warm.
+
+    Tasks are handled according to their @task(priority=...) class:
+
+    * control tasks may fork up to DISPATCHER_CONTROL_WORKERS workers past
+      max_workers, which other tasks can't use, and when even those are busy
+      they are queued behind other control tasks rather than behind long
+      running jobs
+    * normal tasks may keep at most max_workers workers busy
+    * bulk tasks may keep at most half of max_workers workers busy
     """
 
+    COLD_START_WINDOW = 60
+    SPARE_INTERVAL = 5
+
     pool_cls = StatefulPoolWorker
 
     def __init__(self, *args, **kwargs):
@@ -342,13 +463,76 @@ class AutoscalePool(WorkerPool):
         # initialize some things for subsystem metrics periodic gathering
         # the AutoscalePool class does not save these to redis directly, but reports via produce_subsystem_metrics
         self.scale_up_ct = 0
+        self.scale_up_seconds = 0.0
+        self.cold_start_ct = 0
         self.worker_count_max = 0
 
+        self.ledger = TaskLedger()
+
+        self.warm_spares = getattr(settings, 'DISPATCHER_WARM_SPARE_WORKERS', 0)
+        self.recent_cold_starts = collections.deque()
+
+        # how many workers tasks of each priority class may keep busy
+        self.lane_limits = {
+            'control': self.max_workers + getattr(settings, 'DISPATCHER_CONTROL_WORKERS', 0),
+            'normal': self.max_workers,
+            'bulk': max(1, self.max_workers // 2),
+        }
+
     def produce_subsystem_metrics(self, metrics_object):
         metrics_object.set('dispatcher_pool_scale_up_events', self.scale_up_ct)
+        metrics_object.set('dispatcher_pool_scale_up_seconds', self.scale_up_seconds)
+        metrics_object.set('dispatcher_pool_cold_starts', self.cold_start_ct)
         metrics_object.set('dispatcher_pool_active_task_count', sum(len(w.managed_tasks) for w in self.workers))
+        metrics_object.set('dispatcher_pool_idle_worker_count', sum(1 for w in self.workers if w.idle))
         metrics_object.set('dispatcher_pool_max_worker_count', self.worker_count_max)
         self.worker_count_max = len(self.workers)
+        self.ledger.export(metrics_object)
+
+    @property
+    def spare_target(self):
+        """Number of idle workers to keep around, 0 unless DISPATCHER_WARM_SPARE_WORKERS is set"""
+        if not self.warm_spares:
+            return 0
+        cutoff = time.monotonic() - self.COLD_START_WINDOW
+        while self.recent_cold_starts and self.recent_cold_starts[0] < cutoff:
+            self.recent_cold_starts.popleft()
+        return self.warm_spares + len(self.recent_cold_starts)
+
+    def add_spares(self):
+        target = self.spare_target
+        if not target:
+            return
+        idle_ct = sum(1 for w in self.workers if w.idle)
+        while idle_ct < target and not self.full:
+            self.up()
+            idle_ct += 1
+
+    @staticmethod
+    def priority_of(body):
+        if isinstance(body, dict):
+            return body.get('priority', 'normal')
+        return 'normal'
+
+    def lane_load(self, priority):
+        """
+        Number of workers busy with tasks of this priority class, or of a lower
+        one; control tasks count every busy worker
+        """
+        lower = TASK_PRIORITIES[TASK_PRIORITIES.index(priority) :]
+        return sum(1 for w in self.workers if any(self.priority_of(t) in lower for t in w.managed_tasks.values()))
+
+    def backlog_workers(self, priority):
+        """
+        The busy workers to queue a task behind when it can't start right
+        away, in order of preference.  Control tasks prefer workers that only
+        run control tasks themselves, then the shortest backlog.
+        """
+        busy_workers = [w for w in self.workers if w.busy]
+        random.shuffle(busy_workers)
+        if priority != 'control':
+            return busy_workers
+        return sorted(busy_workers, key=lambda w: (any(self.priority_of(t) != 'control' for t in w.managed_tasks.values()), len(w.managed_tasks)))
 
     @property
     def should_grow(self):
@@ -360,7 +544,7 @@ class AutoscalePool(WorkerPool):
 
     @property
     def full(self):
-        return len(self.workers) == self.max_workers
+        return len(self.workers) >= self.max_workers
 
     @property
     def debug_meta(self):
@@ -382,6 +566,9 @@ class AutoscalePool(WorkerPool):
         django.db.utils.Error exceptions.  Act accordingly.
         """
         orphaned = []
+        lost_uuids = []
+        spare_target = self.spare_target
+        idle_ct = sum(1 for w in self.workers if w.alive and w.idle)
         for w in self.workers[::]:
             if not w.alive:
                 # the worker process has exited
@@ -392,23 +579,21 @@ class AutoscalePool(WorkerPool):
                 logger.error('worker pid:{} is gone (exit={})'.format(w.pid, w.exitcode))
                 if w.current_task:
                     if w.current_task != 'QUIT':
-                        try:
-                            for j in UnifiedJob.objects.filter(celery_task_id=w.current_task['uuid']):
-                                reaper.reap_job(j, 'failed')
-                        except Exception:
-                            logger.exception('failed to reap job UUID {}'.format(w.current_task['uuid']))
+                        lost_uuids.append(w.current_task['uuid'])
                     else:
                         logger.warning(f'Worker was told to quit but has not, pid={w.pid}')
                 orphaned.extend(w.orphaned_tasks)
                 self.workers.remove(w)
-            elif w.idle and len(self.workers) > self.min_workers:
+            elif w.idle and len(self.workers) > self.min_workers and idle_ct > spare_target:
                 # the process has an empty queue (it's idle) and we have
-                # more processes in the pool than we need (> min)
+                # more processes in the pool than we need (> min, and more
+                # idle ones than the warm spares we keep)
                 # send this process a message so it will exit gracefully
                 # at the next opportunity
                 logger.debug('scaling down worker pid:{}'.format(w.pid))
                 w.quit()
                 self.workers.remove(w)
+                idle_ct -= 1
             if w.alive:
                 # if we discover a task manager invocation that's been running
                 # too long, reap it (because otherwise it'll just hold the postgres
@@ -421,13 +606,19 @@ class AutoscalePool(WorkerPool):
                     current_task_name = current_task.get('task', '')
                     if current_task_name.endswith(endings):
                         if 'started' not in current_task:
-                            w.managed_tasks[current_task['uuid']]['started'] = time.time()
+                            w.managed_tasks[current_task['uuid']]['started'] = w.running_since or time.time()
                         age = time.time() - current_task['started']
                         w.managed_tasks[current_task['uuid']]['age'] = age
                         if age > self.task_manager_timeout:
                             logger.error(f'{current_task_name} has held the advisory lock for {age}, sending SIGUSR1 to {w.pid}')
                             os.kill(w.pid, signal.SIGUSR1)
 
+        if lost_uuids:
+            try:
+                reaper.reap_jobs(UnifiedJob.objects.filter(celery_task_id__in=lost_uuids), 'failed')
+            except Exception:
+                logger.exception('failed to reap jobs with UUIDs {}'.format(lost_uuids))
+
         for m in orphaned:
             # if all the workers are dead, spawn at least one
             if not len(self.workers):
@@ -435,6 +626,8 @@ class AutoscalePool(WorkerPool):
             idx = random.choice(range(len(self.workers)))
             self.write(idx, m)
 
+        self.add_spares()
+
     def add_bind_kwargs(self, body):
         bind_kwargs = body.pop('bind_kwargs', [])
         body.setdefault('kwargs', {})
@@ -447,15 +640,17 @@ class AutoscalePool(WorkerPool):
                 worker_tasks[worker.pid] = list(worker.managed_tasks.keys())
             body['kwargs']['worker_tasks'] = worker_tasks
 
-    def up(self):
-        if self.full:
+    def up(self, max_workers=None):
+        if len(self.workers) >= (max_workers or self.max_workers):
             # if we can't spawn more workers, just toss this message into a
             # random worker's backlog
             idx = random.choice(range(len(self.workers)))
             return idx, self.workers[idx]
         else:
             self.scale_up_ct += 1
+            start = time.perf_counter()
             ret = super(AutoscalePool, self).up()
+            self.scale_up_seconds += time.perf_counter() - start
             new_worker_ct = len(self.workers)
             if new_worker_ct > self.worker_count_max:
                 self.worker_count_max = new_worker_ct
@@ -467,22 +662,41 @@ class AutoscalePool(WorkerPool):
         try:
             if isinstance(body, dict) and body.get('bind_kwargs'):
                 self.add_bind_kwargs(body)
-            if self.should_grow:
-                self.up()
+            priority = self.priority_of(body)
+            limit = self.lane_limits.get(priority, self.max_workers)
+            lane_open = self.lane_load(priority) < limit
+            if self.should_grow and lane_open:
+                if len(self.workers) >= self.min_workers and len(self.workers) < limit:
+                    # this message waits for a new worker to be forked
+                    self.cold_start_ct += 1
+                    self.recent_cold_starts.append(time.monotonic())
+                self.up(max_workers=limit)
+            task_name = body.get('task') if isinstance(body, dict) else None
             # we don't care about "preferred queue" round robin distribution, just
-            # find the first non-busy worker and claim it
-            workers = self.workers[:]
-            random.shuffle(workers)
-            for w in workers:
-                if not w.busy:
-                    w.put(body)
-                    break
+            # find a non-busy worker, preferably one that last ran the same task,
+            # and claim it
+            idle_workers = [w for w in self.workers if not w.busy]
+            if idle_workers and lane_open:
+                same_task = [w for w in idle_workers if task_name and w.last_task == task_name]
+                random.choice(same_task or idle_workers).put(body)
             else:
-                task_name = 'unknown'
-                if isinstance(body, dict):
-                    task_name = body.get('task')
-                logger.warning(f'Workers maxed, queuing {task_name}, load: {sum(len(w.managed_tasks) for w in self.workers)} / {len(self.workers)}')
-                return super(AutoscalePool, self).write(preferred_queue, body)
+                logger.warning(
+                    f'Workers maxed, queuing {task_name or "unknown"} ({priority}), '
+                    f'load: {sum(len(w.managed_tasks) for w in self.workers)} / {len(self.workers)}'
+                )
+                if priority != 'control' and not idle_workers:
+                    return super(AutoscalePool, self).write(preferred_queue, body)
+                # with idle workers around, tasks of a lane that is at its
+                # limit must not land on one of them, even when the backlogs
+                # are full
+                for backlog in self.backlog_workers(priority):
+                    try:
+                        backlog.put(body)
+                        return self.workers.index(backlog)
+                    except QueueFull:
+                        pass
+                logger.error(f'could not queue {task_name or "unknown"} ({priority}), the backlog of every busy worker is full')
+                return None
         except Exception:
             for conn in connections.all():
                 # If the database connection has a hiccup, re-establish a new
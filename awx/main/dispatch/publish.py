@@ -1,9 +1,14 @@
+import contextlib
 import inspect
 import logging
 import json
+import threading
 import time
 from uuid import uuid4
 
+import psycopg
+from django.conf import settings
+from django.db import connection as pg_connection
 from django_guid import get_guid
 
 from . import pg_bus_conn
@@ -11,11 +16,103 @@ from awx.main.utils import is_testing
 
 logger = logging.getLogger('awx.main.dispatch')
 
+_publish_batch = threading.local()
+
+# every @task by name, so the dispatcher workers can look them up without
+# importing and inspecting the task's module for every message
+task_registry = {}
+
+# priority classes of @task(priority=...), the worker pool reserves capacity
+# for control tasks and limits how much of it bulk tasks can use
+TASK_PRIORITIES = ('control', 'normal', 'bulk')
+
 
 def serialize_task(f):
     return '.'.join([f.__module__, f.__name__])
 
 
+def encode_message(obj):
+    """
+    Serialize a task message for pg_notify
+
+    If the message is over DISPATCHER_NOTIFY_MAX_BYTES, its args and kwargs
+    are stored in a DispatcherPayload row, and the message only references it.
+    The workers running the task load them back with load_payload().
+    """
+    message = json.dumps(obj)
+    if len(message.encode('utf-8')) <= settings.DISPATCHER_NOTIFY_MAX_BYTES:
+        return message
+    from awx.main.models import DispatcherPayload  # circular import
+
+    payload = DispatcherPayload.objects.create(data={'args': obj.get('args', []), 'kwargs': obj.get('kwargs', {})})
+    envelope = {k: v for k, v in obj.items() if k not in ('args', 'kwargs')}
+    envelope['payload_id'] = payload.id
+    return json.dumps(envelope)
+
+
+def load_payload(body):
+    """
+    Inverse of encode_message, restores the args and kwargs of a task message in place
+
+    The row is left for cleanup_dispatcher_payloads, a message sent to a
+    broadcast queue is loaded by every node.
+    """
+    from awx.main.models import DispatcherPayload  # circular import
+
+    payload = DispatcherPayload.objects.get(pk=body.pop('payload_id'))
+    # kwargs added by the dispatcher for bind_kwargs are already in the message
+    body['args'] = payload.data.get('args', [])
+    body['kwargs'] = {**payload.data.get('kwargs', {}), **body.get('kwargs', {})}
+    return body
+
+
+def notify(messages):
+    """
+    pg_notify a list of (queue, payload) messages with one round trip
+
+    Like a single apply_async, this uses the Django database connection, so
+    inside a transaction the messages are only delivered on commit.  Outside
+    of a transaction, a connection found broken is re-established and the
+    messages are sent again, once.
+    """
+    try:
+        with pg_bus_conn() as conn:
+            conn.notify_many(messages)
+    except (psycopg.InterfaceError, psycopg.OperationalError):
+        if pg_connection.in_atomic_block:
+            raise
+        logger.warning('Stale Postgres connection publishing dispatcher messages, reconnecting')
+        pg_connection.close()
+        with pg_bus_conn() as conn:
+            conn.notify_many(messages)
+
+
+@contextlib.contextmanager
+def publish_batch():
+    """
+    Collect the messages of every apply_async call made in this block, and
+    publish them together with a single round trip when the block exits
+
+    with publish_batch():
+        for job in jobs:
+            RunJob.apply_async([job.pk], queue=...)
+
+    Blocks can be nested, messages are sent when the outermost one exits.  If
+    the block raises, the collected messages are discarded.
+    """
+    if getattr(_publish_batch, 'messages', None) is not None:
+        yield
+        return
+    _publish_batch.messages = []
+    try:
+        yield
+        messages = _publish_batch.messages
+    finally:
+        _publish_batch.messages = None
+    if messages and not is_testing():
+        notify([(queue, encode_message(obj)) for queue, obj in messages])
+
+
 class task:
     """
     Used to decorate a function or class so that it can be run asynchronously
@@ -55,15 +152,42 @@ class task:
     @task(bind_kwargs=['dispatch_time'])
     def print_time(dispatch_time=None):
         print(f"Time I was dispatched: {dispatch_time}")
+
+    # Short scheduling and housekeeping tasks can ask for the control priority,
+    # so they are not stuck behind long running jobs when the worker pool is
+    # full; latency-insensitive background work can use bulk
+
+    @task(priority='control')
+    def heartbeat():
+        ...
+
+    # Idempotent tasks that are often submitted in bursts can be coalesced;
+    # the dispatcher runs the first message right away, and identical ones
+    # submitted in the next DISPATCHER_COALESCE_WINDOW seconds (or
+    # coalesce_window) are merged into one run at the end of the window.
+    # coalesce_key=True makes messages with the same args and kwargs
+    # identical, or it can be a function of the args and kwargs:
+
+    @task(coalesce_key=lambda inventory_id: inventory_id)
+    def update_inventory(inventory_id):
+        ...
     """
 
-    def __init__(self, queue=None, bind_kwargs=None):
+    def __init__(self, queue=None, bind_kwargs=None, priority='normal', coalesce_key=None, coalesce_window=None):
+        if priority not in TASK_PRIORITIES:
+            raise ValueError(f'priority must be one of {TASK_PRIORITIES}, not {priority}')
         self.queue = queue
         self.bind_kwargs = bind_kwargs
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.coalesce_window = coalesce_window
 
     def __call__(self, fn=None):
         queue = self.queue
         bind_kwargs = self.bind_kwargs
+        priority = self.priority
+        coalesce_key = self.coalesce_key
+        coalesce_window = self.coalesce_window
 
         class PublisherMixin(object):
             queue = None
@@ -88,6 +212,13 @@ class task:
                     obj['guid'] = guid
                 if bind_kwargs:
                     obj['bind_kwargs'] = bind_kwargs
+                if priority != 'normal':
+                    obj['priority'] = priority
+                if coalesce_key:
+                    key = json.dumps([args, kwargs], sort_keys=True) if coalesce_key is True else coalesce_key(*args, **kwargs)
+                    obj['coalesce_key'] = f'{cls.name}:{key}'
+                    if coalesce_window is not None:
+                        obj['coalesce_window'] = coalesce_window
                 obj.update(**kw)
                 return obj
 
@@ -101,9 +232,11 @@ class task:
                 obj = cls.get_async_body(args=args, kwargs=kwargs, uuid=uuid, **kw)
                 if callable(queue):
                     queue = queue()
-                if not is_testing():
-                    with pg_bus_conn() as conn:
-                        conn.notify(queue, json.dumps(obj))
+                batch = getattr(_publish_batch, 'messages', None)
+                if batch is not None:
+                    batch.append((queue, obj))
+                elif not is_testing():
+                    notify([(queue, encode_message(obj))])
                 return (obj, queue)
 
         # If the object we're wrapping *is* a class (e.g., RunJob), return
@@ -118,6 +251,7 @@ class task:
             ns.update(fn.__dict__)
         cls = type(fn.__name__, tuple(bases + [PublisherMixin]), ns)
         if inspect.isclass(fn):
+            task_registry[cls.name] = cls
             return cls
 
         # if the object being decorated is *not* a class (it's a Python
@@ -127,4 +261,5 @@ class task:
         setattr(fn, 'apply_async', cls.apply_async)
         setattr(fn, 'delay', cls.delay)
         setattr(fn, 'get_async_body', cls.get_async_body)
+        task_registry[cls.name] = fn
         return fn
@@ -1,6 +1,8 @@
 from datetime import timedelta
+import decimal
 import logging
 
+from django.db import connection
 from django.db.models import Q
 from django.conf import settings
 from django.utils.timezone import now as tz_now
@@ -17,37 +19,91 @@ def startup_reaping():
     so we will reap those jobs as a special action here
     """
     jobs = UnifiedJob.objects.filter(status='running', controller_node=Instance.objects.my_hostname())
-    job_ids = []
-    for j in jobs:
-        job_ids.append(j.id)
-        reap_job(
-            j,
-            'failed',
-            job_explanation='Task was marked as running at system start up. The system must have not shut down properly, so it has been marked as failed.',
-        )
+    job_ids = reap_jobs(
+        jobs,
+        'failed',
+        job_explanation='Task was marked as running at system start up. The system must have not shut down properly, so it has been marked as failed.',
+    )
     if job_ids:
         logger.error(f'Unified jobs {job_ids} were reaped on dispatch startup')
 
 
 def reap_job(j, status, job_explanation=None):
-    j.refresh_from_db(fields=['status', 'job_explanation'])
-    status_before = j.status
-    if status_before not in ('running', 'waiting'):
-        # just in case, don't reap jobs that aren't running
-        return
-    j.status = status
-    j.start_args = ''  # blank field to remove encrypted passwords
-    if j.job_explanation:
-        j.job_explanation += ' '  # Separate messages for readability
+    reap_jobs(UnifiedJob.objects.filter(pk=j.pk), status, job_explanation=job_explanation)
+    j.refresh_from_db(fields=['status', 'start_args', 'job_explanation'])
+
+
+def reap_jobs(jobs, status='failed', job_explanation=None):
+    """
+    Reap every job of the `jobs` queryset that is still running or waiting
+
+    The jobs are updated with a single UPDATE ... RETURNING rather than a
+    save() per job, so that reaping the thousands of jobs of a crashed node
+    stays cheap.  The bookkeeping UnifiedJob.save() would do (failed, finished,
+    elapsed, the template's last job) is done in bulk as well, status changes
+    are emitted over the websocket once the transaction commits, and failure
+    notifications for all of the jobs are sent by one task.
+
+    Returns the ids of the jobs that were reaped.
+    """
     if job_explanation is None:
-        j.job_explanation += 'Task was marked as running but was not present in the job queue, so it has been marked as failed.'
-    else:
-        j.job_explanation += job_explanation
-    j.save(update_fields=['status', 'start_args', 'job_explanation'])
-    if hasattr(j, 'send_notification_templates'):
-        j.send_notification_templates('failed')
-    j.websocket_emit_status(status)
-    logger.error(f'{j.log_format} is no longer {status_before}; reaping')
+        job_explanation = 'Task was marked as running but was not present in the job queue, so it has been marked as failed.'
+    ref_time = tz_now()
+    finished = status in ('successful', 'failed', 'error', 'canceled')
+    candidates, params = jobs.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        # the status check is repeated outside of the subquery so that it is
+        # re-evaluated for rows another process changed in the meantime
+        cursor.execute(
+            f"UPDATE {connection.ops.quote_name(UnifiedJob._meta.db_table)} "
+            "SET status = %s, failed = %s, start_args = '', modified = %s, "
+            "finished = CASE WHEN %s THEN COALESCE(finished, %s) ELSE finished END, "
+            "job_explanation = CASE WHEN job_explanation = '' THEN %s ELSE job_explanation || ' ' || %s END "
+            f"WHERE id IN ({candidates}) AND status IN ('running', 'waiting') RETURNING id",
+            [status, status in ('failed', 'error', 'canceled'), ref_time, finished, ref_time, job_explanation, job_explanation, *params],
+        )
+        job_ids = sorted(row[0] for row in cursor.fetchall())
+    if not job_ids:
+        return job_ids
+
+    # polymorphic, so these are the Job, ProjectUpdate, ... subclasses
+    reaped = list(UnifiedJob.objects.filter(pk__in=job_ids))
+    logger.error(f'Reaping {len(reaped)} jobs that are no longer running or waiting: {", ".join(j.log_format for j in reaped)}')
+
+    elapsed = []
+    for j in reaped:
+        if j.started and j.finished and not j.elapsed:
+            j.elapsed = decimal.Decimal((j.finished - j.started).total_seconds()).quantize(decimal.Decimal('1.000'))
+            elapsed.append(j)
+    if elapsed:
+        UnifiedJob.objects.bulk_update(elapsed, ['elapsed'])
+
+    # every reaped job updates its template in id order, as their save() would,
+    # jobs of the same template share one copy of it so each sees the
+    # current_job and last_job left by the previous one
+    parents = {}
+    for j in sorted(reaped, key=lambda j: j.pk):
+        parent_field = j._get_parent_field_name()
+        if not parent_field or not j.unified_job_template_id:
+            continue
+        if j.unified_job_template_id in parents:
+            setattr(j, parent_field, parents[j.unified_job_template_id])
+        else:
+            parents[j.unified_job_template_id] = j._get_parent_instance()
+        j._update_parent_instance()
+
+    def emit_status():
+        for j in reaped:
+            j._websocket_emit_status(status)
+            if hasattr(j, 'update_webhook_status'):
+                j.update_webhook_status(status)
+
+    connection.on_commit(emit_status)
+
+    from awx.main.tasks.system import handle_failure_notifications
+
+    handle_failure_notifications.delay(job_ids)
+    return job_ids
 
 
 def reap_waiting(instance=None, status='failed', job_explanation=None, grace_period=None, excluded_uuids=None, ref_time=None):
@@ -66,8 +122,7 @@ def reap_waiting(instance=None, status='failed', job_explanation=None, grace_per
     jobs = UnifiedJob.objects.filter(status='waiting', modified__lte=ref_time - timedelta(seconds=grace_period), controller_node=hostname)
     if excluded_uuids:
         jobs = jobs.exclude(celery_task_id__in=excluded_uuids)
-    for j in jobs:
-        reap_job(j, status, job_explanation=job_explanation)
+    return reap_jobs(jobs, status, job_explanation=job_explanation)
 
 
 def reap(instance=None, status='failed', job_explanation=None, excluded_uuids=None, ref_time=None):
@@ -86,5 +141,4 @@ def reap(instance=None, status='failed', job_explanation=None, excluded_uuids=No
         jobs = UnifiedJob.objects.filter(base_Q)
     if excluded_uuids:
         jobs = jobs.exclude(celery_task_id__in=excluded_uuids)
-    for j in jobs:
-        reap_job(j, status, job_explanation=job_explanation)
+    return reap_jobs(jobs, status, job_explanation=job_explanation)
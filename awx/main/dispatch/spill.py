@@ -0,0 +1,156 @@
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import shutil
+import struct
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger('awx.main.dispatch')
+
+__all__ = ['SpillLog', 'serialize_event', 'deserialize_event']
+
+
+def serialize_event(event):
+    """Turn an unsaved event model instance into a JSON serializable spill record"""
+    record = serializers.serialize('python', [event])[0]
+    record['pk'] = None
+    record['skip_websocket_message'] = getattr(event, '_skip_websocket_message', False)
+    record['notification_trigger_event'] = getattr(event, '_notification_trigger_event', False)
+    return record
+
+
+def deserialize_event(record):
+    """Inverse of serialize_event, returns an unsaved event model instance"""
+    record = record.copy()
+    skip_websocket_message = record.pop('skip_websocket_message', False)
+    notification_trigger_event = record.pop('notification_trigger_event', False)
+    event = next(serializers.deserialize('python', [record])).object
+    if skip_websocket_message:
+        event._skip_websocket_message = True
+    if notification_trigger_event:
+        event._notification_trigger_event = True
+    return event
+
+
+class SpillLog:
+    """
+    Append-only log of records that could not be saved to the database
+
+    Every record is stored as a 4 byte big-endian length followed by that
+    many bytes of JSON.  A record cut short by a crash in the middle of an
+    append is ignored, along with anything after it.
+
+    Readers and writers serialize on an flock()ed sidecar file, so the
+    callback receiver and `awx-manage job_event_spill` can work on the
+    same log.
+    """
+
+    HEADER = struct.Struct('>I')
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def __repr__(self):
+        return f'SpillLog({self.path})'
+
+    @property
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    @contextlib.contextmanager
+    def locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f'{self.path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, records):
+        """Append records in order, returns how many fit under max_bytes"""
+        written = 0
+        with self.locked():
+            size = self.size
+            with open(self.path, 'ab') as f:
+                for record in records:
+                    data = json.dumps(record, cls=DjangoJSONEncoder).encode('utf-8')
+                    if size + self.HEADER.size + len(data) > self.max_bytes:
+                        break
+                    f.write(self.HEADER.pack(len(data)) + data)
+                    size += self.HEADER.size + len(data)
+                    written += 1
+                f.flush()
+                os.fsync(f.fileno())
+        return written
+
+    def _read(self, f):
+        while True:
+            header = f.read(self.HEADER.size)
+            if len(header) < self.HEADER.size:
+                if header:
+                    logger.warning(f'Ignoring truncated record at the end of {self.path}')
+                return
+            (length,) = self.HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                logger.warning(f'Ignoring truncated record at the end of {self.path}')
+                return
+            yield json.loads(data)
+
+    def read(self):
+        """Yield all records in the log, in order"""
+        with self.locked():
+            try:
+                with open(self.path, 'rb') as f:
+                    yield from self._read(f)
+            except FileNotFoundError:
+                return
+
+    def replay(self, save, chunk_size=1000):
+        """
+        Hand the records to save() in chunks, in order
+
+        Records of chunks that save() returned for are removed from the log.
+        If save() raises, the remaining records are kept for the next replay
+        and the exception propagates.  Returns the number of records saved.
+        """
+        replayed = 0
+        with self.locked():
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return 0
+            with f:
+                offset = 0
+                done = False
+                try:
+                    records = self._read(f)
+                    while True:
+                        chunk = [record for _, record in zip(range(chunk_size), records)]
+                        if not chunk:
+                            done = True
+                            break
+                        save(chunk)
+                        replayed += len(chunk)
+                        offset = f.tell()
+                finally:
+                    if done:
+                        os.unlink(self.path)
+                    elif offset > 0:
+                        # keep what has not been saved yet
+                        f.seek(offset)
+                        with open(f'{self.path}.tmp', 'wb') as remaining:
+                            shutil.copyfileobj(f, remaining)
+                            remaining.flush()
+                            os.fsync(remaining.fileno())
+                        os.replace(f'{self.path}.tmp', self.path)
+        return replayed
@@ -18,6 +18,7 @@ from django.conf import settings
 
 from awx.main.dispatch.pool import WorkerPool
 from awx.main.dispatch.periodic import Scheduler
+from awx.main.dispatch.coalesce import Coalescer
 from awx.main.dispatch import pg_bus_conn
 from awx.main.utils.common import log_excess_runtime
 from awx.main.utils.db import set_connection_name
@@ -66,7 +67,7 @@ class AWXConsumerBase(object):
     def control(self, body):
         logger.warning(f'Received control signal:\n{body}')
         control = body.get('control')
-        if control in ('status', 'schedule', 'running', 'cancel'):
+        if control in ('status', 'schedule', 'running', 'cancel', 'stats'):
             reply_queue = body['reply_to']
             if control == 'status':
                 msg = '\n'.join([self.listening_on, self.pool.debug()])
@@ -77,6 +78,8 @@ class AWXConsumerBase(object):
                 for worker in self.pool.workers:
                     worker.calculate_managed_tasks()
                     msg.extend(worker.managed_tasks.keys())
+            elif control == 'stats':
+                msg = self.pool.ledger.stats() if self.pool.ledger is not None else {}
             elif control == 'cancel':
                 msg = []
                 task_ids = set(body['task_ids'])
@@ -101,7 +104,7 @@ class AWXConsumerBase(object):
     def dispatch_task(self, body):
         """This will place the given body into a worker queue to run method decorated as a task"""
         if isinstance(body, dict):
-            body['time_ack'] = time.time()
+            body.setdefault('time_ack', time.time())
 
         if len(self.pool):
             if "uuid" in body and body['uuid']:
@@ -179,18 +182,32 @@ class AWXConsumerPG(AWXConsumerBase):
         # NOTE: if we run out of database connections, it is important to still run cleanup
         # so that we scale down workers and free up connections
         schedule['pool_cleanup'] = {'control': self.pool.cleanup, 'schedule': timedelta(seconds=60)}
+        if getattr(self.pool, 'warm_spares', 0):
+            # fork warm spare workers here, rather than while dispatching messages
+            schedule['pool_add_spares'] = {'control': self.pool.add_spares, 'schedule': timedelta(seconds=self.pool.SPARE_INTERVAL)}
         # record subsystem metrics for the dispatcher
         schedule['metrics_gather'] = {'control': self.record_metrics, 'schedule': timedelta(seconds=20)}
         self.scheduler = Scheduler(schedule)
+        self.coalescer = Coalescer()
 
     def record_metrics(self):
         current_time = time.time()
         self.pool.produce_subsystem_metrics(self.subsystem_metrics)
         self.subsystem_metrics.set('dispatcher_availability', self.listen_cumulative_time / (current_time - self.last_metrics_gather))
+        self.subsystem_metrics.inc('dispatcher_tasks_coalesced', self.coalescer.coalesced)
+        self.coalescer.coalesced = 0
         self.subsystem_metrics.pipe_execute()
         self.listen_cumulative_time = 0.0
         self.last_metrics_gather = current_time
 
+    def dispatch_task(self, body):
+        """Duplicate messages with a coalesce_key are held for a moment to merge them, see Coalescer"""
+        if isinstance(body, dict):
+            body['time_ack'] = time.time()
+        if self.coalescer.hold(body):
+            return
+        super().dispatch_task(body)
+
     def run_periodic_tasks(self):
         """
         Run general periodic logic, and return maximum time in seconds before
@@ -214,13 +231,27 @@ class AWXConsumerPG(AWXConsumerBase):
                 # bypasses pg_notify for scheduled tasks
                 self.dispatch_task(body)
 
+        for body in self.coalescer.due():
+            super().dispatch_task(body)
+
         if self.pg_is_down:
             logger.info('Dispatcher listener connection established')
             self.pg_is_down = False
 
         self.listen_start = time.time()
 
-        return self.scheduler.time_until_next_run()
+        next_run = self.scheduler.time_until_next_run()
+        next_release = self.coalescer.time_until_next()
+        if next_release is not None:
+            # like the scheduler, never give the select a timeout of 0
+            next_run = min(next_run, max(next_release, 0.01))
+        return next_run
+
+    def stop(self, signum, frame):
+        # the trailing messages of coalesced tasks must not be lost
+        for body in self.coalescer.drain():
+            super().dispatch_task(body)
+        super().stop(signum, frame)
 
     def run(self, *args, **kwargs):
         super(AWXConsumerPG, self).run(*args, **kwargs)
@@ -289,7 +320,7 @@ class BaseWorker(object):
     def read(self, queue):
         return queue.get(block=True, timeout=1)
 
-    def work_loop(self, queue, finished, idx, *args):
+    def work_loop(self, queue, status, idx, *args):
         ppid = os.getppid()
         signal_handler = WorkerSignalHandler()
         set_connection_name('worker')  # set application_name to distinguish from other dispatcher processes
@@ -307,6 +338,7 @@ class BaseWorker(object):
             except Exception:
                 logger.exception("Exception on worker {}, reconnecting: ".format(idx))
                 continue
+            status.start(body)
             try:
                 for conn in db.connections.all():
                     # If the database connection has a hiccup during the prior message, close it
@@ -316,9 +348,7 @@ class BaseWorker(object):
             except Exception:
                 logger.exception(f'Unhandled exception in perform_work in worker pid={os.getpid()}')
             finally:
-                if 'uuid' in body:
-                    uuid = body['uuid']
-                    finished.put(uuid)
+                status.finish()
         logger.debug('worker exiting gracefully pid:{}'.format(os.getpid()))
 
     def perform_work(self, body):
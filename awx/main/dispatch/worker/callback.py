@@ -4,6 +4,7 @@ import os
 import signal
 import time
 import datetime
+from collections import deque
 
 from django.conf import settings
 from django.utils.functional import cached_property
@@ -15,10 +16,12 @@ import psutil
 
 import redis
 
-from awx.main.consumers import emit_channel_notification
+from awx.main.consumers import emit_channel_notification, get_channel_notification_publisher
 from awx.main.models import JobEvent, AdHocCommandEvent, ProjectUpdateEvent, InventoryUpdateEvent, SystemJobEvent, UnifiedJob
 from awx.main.constants import ACTIVE_STATES
-from awx.main.models.events import emit_event_detail
+from awx.main.models.events import emit_event_details
+from awx.main.queue import callback_queue_names, callback_queue_shard_count
+from awx.main.dispatch.spill import SpillLog, deserialize_event, serialize_event
 from awx.main.utils.profiling import AWXProfiler
 import awx.main.analytics.subsystem_metrics as s_metrics
 from .base import BaseWorker
@@ -52,6 +55,59 @@ def job_stats_wrapup(job_identifier, event=None):
         logger.exception('Worker failed to save stats or emit notifications: Job {}'.format(job_identifier))
 
 
+def pk_default_expression(cursor, cls):
+    """
+    The SQL default of the primary key column of cls, e.g. nextval('main_jobevent_id_seq'::regclass)
+
+    The partitioned event tables were created with LIKE ... INCLUDING ALL (see
+    migration 0144), so their id sequences are still owned by the
+    _unpartitioned_ tables and pg_get_serial_sequence returns NULL for them.
+    """
+    cursor.execute(
+        'SELECT pg_get_expr(d.adbin, d.adrelid) FROM pg_attrdef d '
+        'JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum '
+        'WHERE d.adrelid = %s::regclass AND a.attname = %s',
+        [cls._meta.db_table, cls._meta.pk.column],
+    )
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return f"nextval('{cls._meta.db_table}_{cls._meta.pk.column}_seq'::regclass)"
+    return row[0]
+
+
+def copy_events(cls, events):
+    """
+    Equivalent of cls.objects.bulk_create(events) using PostgreSQL COPY FROM STDIN
+
+    Primary keys are reserved from the table sequence before streaming rows,
+    so that saved events can still be broadcast with their ids.
+    """
+    fields = cls._meta.concrete_fields
+    qn = django_connection.ops.quote_name
+    columns = ', '.join(qn(f.column) for f in fields)
+    with django_connection.cursor() as cursor:
+        cursor.execute(f'SELECT {pk_default_expression(cursor, cls)} FROM generate_series(1, %s)', [len(events)])
+        for e, (pk,) in zip(events, cursor.fetchall()):
+            e.pk = pk
+        try:
+            with cursor.copy(f'COPY {qn(cls._meta.db_table)} ({columns}) FROM STDIN') as copy:
+                for e in events:
+                    copy.write_row([f.get_db_prep_save(f.pre_save(e, True), connection=django_connection) for f in fields])
+        except Exception:
+            # unset the reserved ids so that individual saves will INSERT
+            for e in events:
+                e.pk = None
+            raise
+    for e in events:
+        e._state.adding = False
+        e._state.db = django_connection.alias
+
+
+def spill_log(idx):
+    """The spill file of callback receiver worker number idx"""
+    return SpillLog(os.path.join(settings.JOB_EVENT_SPILL_DIR, f'callback_receiver_{idx}.spill'), settings.JOB_EVENT_SPILL_MAX_BYTES)
+
+
 class CallbackBrokerWorker(BaseWorker):
     """
     A worker implementation that deserializes callback event data and persists
@@ -63,42 +119,81 @@ class CallbackBrokerWorker(BaseWorker):
 
     MAX_RETRIES = 2
     INDIVIDUAL_EVENT_RETRIES = 3
+    SPILL_REPLAY_INTERVAL = 5
     last_stats = time.time()
     last_flush = time.time()
     total = 0
     last_event = ''
     prof = None
+    notifications_dropped = 0
 
-    def __init__(self):
+    def __init__(self, clear_statistics=True):
         self.buff = {}
         self.redis = redis.Redis.from_url(settings.BROKER_URL)
         self.subsystem_metrics = s_metrics.CallbackReceiverMetrics(auto_pipe_execute=False)
         self.queue_pop = 0
-        self.queue_name = settings.CALLBACK_QUEUE
+        self.queue_names = [settings.CALLBACK_QUEUE]
+        # events popped from redis in a batch, but not yet handed to perform_work
+        self.pending = deque()
+        self.spill = None
+        self.spill_pending = False
+        self.last_spill_replay = 0
         self.prof = AWXProfiler("CallbackBrokerWorker")
-        for key in self.redis.keys('awx_callback_receiver_statistics_*'):
-            self.redis.delete(key)
+        # workers created outside of the callback receiver (e.g. to replay
+        # spill files) must leave the statistics of the running workers alone
+        if clear_statistics:
+            for key in self.redis.keys('awx_callback_receiver_statistics_*'):
+                self.redis.delete(key)
 
     @cached_property
     def pid(self):
         """This needs to be obtained after forking, or else it will give the parent process"""
         return os.getpid()
 
+    def pop_messages(self):
+        """
+        Return a list of raw messages from the callback queue(s), waiting up to 1 second for one to arrive
+
+        With JOB_EVENT_READ_BATCH_SIZE > 1, up to that many messages are taken
+        from each queue in a single round trip with LRANGE + LTRIM in a
+        MULTI/EXEC block, so workers never receive the same message twice.
+        """
+        batch_size = settings.JOB_EVENT_READ_BATCH_SIZE
+        if batch_size > 1:
+            with self.redis.pipeline() as pipe:
+                for queue_name in self.queue_names:
+                    pipe.lrange(queue_name, 0, batch_size - 1)
+                    pipe.ltrim(queue_name, batch_size, -1)
+                messages = [message for result in pipe.execute()[::2] for message in result]
+            if messages:
+                return messages
+        res = self.redis.blpop(self.queue_names, timeout=1)
+        if res is None:
+            return []
+        return [res[1]]
+
     def read(self, queue):
+        if self.pending:
+            return self.pending.popleft()
         try:
-            res = self.redis.blpop(self.queue_name, timeout=1)
-            if res is None:
+            messages = self.pop_messages()
+            if not messages:
                 return {'event': 'FLUSH'}
-            self.total += 1
-            self.queue_pop += 1
-            self.subsystem_metrics.inc('callback_receiver_events_popped_redis', 1)
-            self.subsystem_metrics.inc('callback_receiver_events_in_memory', 1)
-            return json.loads(res[1])
+            self.total += len(messages)
+            self.queue_pop += len(messages)
+            self.subsystem_metrics.inc('callback_receiver_events_popped_redis', len(messages))
+            self.subsystem_metrics.inc('callback_receiver_events_in_memory', len(messages))
+            for message in messages:
+                try:
+                    self.pending.append(json.loads(message))
+                except json.JSONDecodeError:
+                    logger.exception("failed to decode JSON message from redis")
+                    self.subsystem_metrics.inc('callback_receiver_events_in_memory', -1)
+            if self.pending:
+                return self.pending.popleft()
         except redis.exceptions.RedisError:
             logger.exception("encountered an error communicating with redis")
             time.sleep(1)
-        except (json.JSONDecodeError, KeyError):
-            logger.exception("failed to decode JSON message from redis")
         finally:
             self.record_statistics()
             self.record_read_metrics()
@@ -109,8 +204,13 @@ class CallbackBrokerWorker(BaseWorker):
         if self.queue_pop == 0:
             return
         if self.subsystem_metrics.should_pipe_execute() is True:
-            queue_size = self.redis.llen(self.queue_name)
+            with self.redis.pipeline(transaction=False) as pipe:
+                for queue_name in callback_queue_names():
+                    pipe.llen(queue_name)
+                queue_size = sum(pipe.execute())
             self.subsystem_metrics.set('callback_receiver_events_queue_size_redis', queue_size)
+            high_water_mark = settings.JOB_EVENT_BACKPRESSURE_HIGH_WATER_MARK
+            self.subsystem_metrics.set('callback_receiver_backpressure_engaged', int(high_water_mark > 0 and queue_size >= high_water_mark))
             self.subsystem_metrics.pipe_execute()
             self.queue_pop = 0
 
@@ -124,6 +224,15 @@ class CallbackBrokerWorker(BaseWorker):
                 logger.exception("encountered an error communicating with redis")
                 self.last_stats = time.time()
 
+    def record_publisher_metrics(self):
+        if not settings.CHANNEL_NOTIFICATION_ASYNC_PUBLISHER:
+            return
+        publisher = get_channel_notification_publisher()
+        self.subsystem_metrics.set('callback_receiver_notifications_queue_size', publisher.qsize())
+        dropped = publisher.dropped
+        self.subsystem_metrics.inc('callback_receiver_notifications_dropped', dropped - self.notifications_dropped)
+        self.notifications_dropped = dropped
+
     def debug(self):
         return f'.  worker[pid:{self.pid}] sent={self.total} rss={self.mb}MB {self.last_event}'
 
@@ -139,10 +248,78 @@ class CallbackBrokerWorker(BaseWorker):
             filepath = self.prof.stop()
             logger.error(f'profiling is disabled, wrote {filepath}')
 
-    def work_loop(self, *args, **kw):
+    def work_loop(self, queue, status, idx, *args):
         if settings.AWX_CALLBACK_PROFILE:
             signal.signal(signal.SIGUSR1, self.toggle_profiling)
-        return super(CallbackBrokerWorker, self).work_loop(*args, **kw)
+        if settings.JOB_EVENT_SPILL_DIR:
+            self.spill = spill_log(idx)
+            self.spill_pending = self.spill.size > 0
+        if callback_queue_shard_count():
+            # with JOB_EVENT_QUEUE_SHARDING, every worker owns the queue of one
+            # shard, the first one also drains the unsharded queue
+            all_queues = callback_queue_names()
+            self.queue_names = [all_queues[idx + 1]]
+            if idx == 0:
+                self.queue_names.append(all_queues[0])
+        return super(CallbackBrokerWorker, self).work_loop(queue, status, idx, *args)
+
+    def save_events(self, cls, events):
+        if settings.JOB_EVENT_PERSISTENCE_METHOD == 'copy' and django_connection.vendor == 'postgresql':
+            copy_events(cls, events)
+        else:
+            cls.objects.bulk_create(events)
+
+    def spill_events(self):
+        """Move the events that could not be saved from the buffer to the spill file"""
+        events = [e for cls_events in self.buff.values() for e in cls_events]
+        self.buff = {}
+        self.subsystem_metrics.inc('callback_receiver_events_in_memory', -len(events))
+        spilled = 0
+        if self.spill:
+            try:
+                spilled = self.spill.append(serialize_event(e) for e in events)
+            except Exception:
+                logger.exception(f'Failed to write events to {self.spill.path}')
+            self.spill_pending = self.spill_pending or spilled > 0
+            self.subsystem_metrics.inc('callback_receiver_events_spilled', spilled)
+        if spilled < len(events):
+            logger.error(f'Giving up on {len(events) - spilled} events.')
+            self.subsystem_metrics.inc('callback_receiver_events_spill_dropped', len(events) - spilled)
+
+    def replay_spill(self, spill):
+        """Save the events in a spill file through the regular flush, returns the number of events saved"""
+
+        def save(records):
+            for record in records:
+                event = deserialize_event(record)
+                self.buff.setdefault(type(event), []).append(event)
+            self.subsystem_metrics.inc('callback_receiver_events_in_memory', len(records))
+            try:
+                self.flush(force=True)
+            except Exception:
+                # the records are still in the spill file
+                self.subsystem_metrics.inc('callback_receiver_events_in_memory', -sum(len(events) for events in self.buff.values()))
+                self.buff = {}
+                raise
+
+        replayed = spill.replay(save)
+        self.subsystem_metrics.inc('callback_receiver_events_spill_replayed', replayed)
+        return replayed
+
+    def replay_spilled_events(self):
+        if not self.spill_pending or time.time() - self.last_spill_replay < self.SPILL_REPLAY_INTERVAL:
+            return
+        if any(self.buff.values()):
+            return
+        self.last_spill_replay = time.time()
+        try:
+            django_connection.ensure_connection()
+            replayed = self.replay_spill(self.spill)
+        except Exception:
+            logger.exception(f'Failed to replay events from {self.spill.path}, will try again')
+            return
+        logger.warning(f'Saved {replayed} events from {self.spill.path}')
+        self.spill_pending = False
 
     def flush(self, force=False):
         now = tz_now()
@@ -156,7 +333,7 @@ class CallbackBrokerWorker(BaseWorker):
             for cls, events in self.buff.items():
                 if not events:
                     continue
-                logger.debug(f'{cls.__name__}.objects.bulk_create({len(events)})')
+                logger.debug(f'{cls.__name__} {settings.JOB_EVENT_PERSISTENCE_METHOD}({len(events)})')
                 for e in events:
                     e.modified = now  # this can be set before created because now is set above on line 149
                     if not e.created:
@@ -167,7 +344,7 @@ class CallbackBrokerWorker(BaseWorker):
                 metrics_duration_to_save = time.perf_counter()
                 saved_events = []
                 try:
-                    cls.objects.bulk_create(events)
+                    self.save_events(cls, events)
                     metrics_bulk_events_saved += len(events)
                     saved_events = events
                     self.buff[cls] = []
@@ -175,7 +352,7 @@ class CallbackBrokerWorker(BaseWorker):
                     # If the database is flaking, let ensure_connection throw a general exception
                     # will be caught by the outer loop, which goes into a proper sleep and retry loop
                     django_connection.ensure_connection()
-                    logger.warning(f'Error in events bulk_create, will try indiviually, error: {str(exc)}')
+                    logger.warning(f'Error in events {settings.JOB_EVENT_PERSISTENCE_METHOD}, will try indiviually, error: {str(exc)}')
                     # if an exception occurs, we should re-attempt to save the
                     # events one-by-one, because something in the list is
                     # broken/stale
@@ -203,10 +380,10 @@ class CallbackBrokerWorker(BaseWorker):
                                 logger.info(f'Database Error Saving individual Event uuid={e.uuid} try={retry_count}, error: {str(exc_indv)}')
 
                 metrics_duration_to_save = time.perf_counter() - metrics_duration_to_save
+                websocket_events = [e for e in saved_events if not getattr(e, '_skip_websocket_message', False)]
+                metrics_events_broadcast += len(websocket_events)
+                emit_event_details(websocket_events)
                 for e in saved_events:
-                    if not getattr(e, '_skip_websocket_message', False):
-                        metrics_events_broadcast += 1
-                        emit_event_detail(e)
                     if getattr(e, '_notification_trigger_event', False):
                         job_stats_wrapup(getattr(e, e.JOB_REFERENCE), event=e)
             self.last_flush = time.time()
@@ -224,6 +401,7 @@ class CallbackBrokerWorker(BaseWorker):
                     / (metrics_bulk_events_saved + metrics_singular_events_saved - metrics_events_missing_created),
                 )
             if self.subsystem_metrics.should_pipe_execute() is True:
+                self.record_publisher_metrics()
                 self.subsystem_metrics.pipe_execute()
 
     def perform_work(self, body):
@@ -283,13 +461,14 @@ class CallbackBrokerWorker(BaseWorker):
                 except Exception as exc:
                     # Aside form bugs, exceptions here are assumed to be due to database flake
                     if retries >= self.MAX_RETRIES:
-                        logger.exception('Worker could not re-establish database connectivity, giving up on one or more events.')
-                        self.buff = {}
+                        logger.exception('Worker could not re-establish database connectivity.')
+                        self.spill_events()
                         return
                     delay = 60 * retries
                     logger.warning(f'Database Error Flushing Job Events, retry #{retries + 1} in {delay} seconds: {str(exc)}')
                     django_connection.close()
                     time.sleep(delay)
                     retries += 1
+            self.replay_spilled_events()
         except Exception:
             logger.exception(f'Callback Task Processor Raised Unexpected Exception processing event data:\n{body}')
@@ -10,6 +10,7 @@ from kubernetes.config import kube_config
 from django.conf import settings
 from django_guid import set_guid
 
+from awx.main.dispatch.publish import load_payload, task_registry
 from awx.main.tasks.system import dispatch_startup, inform_cluster_of_shutdown
 
 from .base import BaseWorker
@@ -33,9 +34,15 @@ class TaskWorker(BaseWorker):
 
         awx.main.tasks.system.delete_inventory
         awx.main.tasks.jobs.RunProjectUpdate
+
+        Tasks of modules that were already imported are found in the @task
+        registry, others are imported (which registers them) the first time.
         """
         if not task.startswith('awx.'):
             raise ValueError('{} is not a valid awx task'.format(task))
+        _call = task_registry.get(task)
+        if _call is not None:
+            return _call
         module, target = task.rsplit('.', 1)
         module = importlib.import_module(module)
         _call = None
@@ -53,6 +60,8 @@ class TaskWorker(BaseWorker):
         """
         task = body['task']
         uuid = body.get('uuid', '<unknown>')
+        if 'payload_id' in body:
+            load_payload(body)
         args = body.get('args', [])
         kwargs = body.get('kwargs', {})
         if 'guid' in body:
@@ -97,7 +106,6 @@ class TaskWorker(BaseWorker):
             'task': u'awx.main.tasks.jobs.RunProjectUpdate'
         }
         """
-        settings.__clean_on_fork__()
         result = None
         try:
             result = self.run_callable(body)
@@ -126,17 +134,24 @@ class TaskWorker(BaseWorker):
         finally:
             # It's frustrating that we have to do this, but the python k8s
             # client leaves behind cacert files in /tmp, so we must clean up
-            # the tmpdir per-dispatcher process every time a new task comes in
-            try:
-                kube_config._cleanup_temp_files()
-            except Exception:
-                logger.exception('failed to cleanup k8s client tmp files')
+            # the tmpdir per-dispatcher process after tasks that used it
+            if kube_config._temp_files:
+                try:
+                    kube_config._cleanup_temp_files()
+                except Exception:
+                    logger.exception('failed to cleanup k8s client tmp files')
 
         for callback in body.get('callbacks', []) or []:
             callback['uuid'] = body['uuid']
             self.perform_work(callback)
         return result
 
+    def work_loop(self, *args, **kwargs):
+        # close the database and cache connections inherited from the parent
+        # once, rather than checking for a fork before every task
+        settings.__clean_on_fork__()
+        return super(TaskWorker, self).work_loop(*args, **kwargs)
+
     def on_start(self):
         dispatch_startup()
 
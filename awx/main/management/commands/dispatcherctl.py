@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from awx.main.dispatch.control import Control
+
+
+class Command(BaseCommand):
+    """
+    Inspect the dispatcher running on this node
+
+    `stats` lists the timings the dispatcher recorded for every task since it
+    started, sorted by the total time workers spent running them
+    """
+
+    help = 'Inspect the local dispatcher'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='command', required=True)
+        stats = subparsers.add_parser('stats', help='print publish, wait and run times of the tasks the dispatcher has handled')
+        stats.add_argument('--host', dest='host', help='hostname of the dispatcher to ask, defaults to this node')
+        stats.add_argument('--json', dest='json', action='store_true', help='print the raw statistics as JSON')
+
+    def handle(self, *args, **options):
+        if options['command'] == 'stats':
+            return self.stats(options)
+
+    def stats(self, options):
+        try:
+            stats = Control('dispatcher', host=options.get('host')).stats()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        if options.get('json'):
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+            return
+
+        def fmt(value):
+            return '-' if value is None else f'{value:.3f}'
+
+        self.stdout.write(
+            f'{"task":<60} {"count":>7} {"run total":>10} {"run p50":>9} {"run p95":>9} {"run max":>9} {"wait p95":>9} {"ack p95":>9}'
+        )
+        for task, entry in sorted(stats.items(), key=lambda item: -item[1]['execution']['total']):
+            execution = entry['execution']
+            self.stdout.write(
+                f'{task:<60} {entry["count"]:>7} {fmt(execution["total"]):>10} {fmt(execution["p50"]):>9} {fmt(execution["p95"]):>9} '
+                f'{fmt(execution["max"]):>9} {fmt(entry["ack_to_start"]["p95"]):>9} {fmt(entry["publish_to_ack"]["p95"]):>9}'
+            )
@@ -0,0 +1,53 @@
+import glob
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from awx.main.dispatch.spill import SpillLog
+
+
+class Command(BaseCommand):
+    """
+    Inspect or replay the job events that callback receiver workers wrote to
+    their spill files (see JOB_EVENT_SPILL_DIR) while the database was
+    unavailable
+    """
+
+    help = 'Inspect or replay job events spilled to disk by the callback receiver'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', dest='dir', help='Directory containing the spill files, defaults to JOB_EVENT_SPILL_DIR')
+        parser.add_argument('--replay', dest='replay', action='store_true', help='save the spilled events to the database and remove them from the spill files')
+
+    def handle(self, *args, **options):
+        spill_dir = options.get('dir') or settings.JOB_EVENT_SPILL_DIR
+        if not spill_dir:
+            raise CommandError('JOB_EVENT_SPILL_DIR is not set, use --dir')
+        paths = sorted(glob.glob(os.path.join(spill_dir, '*.spill')))
+        if not paths:
+            self.stdout.write(f'No spill files in {spill_dir}')
+            return
+
+        if options.get('replay'):
+            from awx.main.dispatch.worker import CallbackBrokerWorker
+
+            # keep the statistics of the running callback receiver workers
+            worker = CallbackBrokerWorker(clear_statistics=False)
+            for path in paths:
+                replayed = worker.replay_spill(SpillLog(path, settings.JOB_EVENT_SPILL_MAX_BYTES))
+                self.stdout.write(f'{path}: saved {replayed} events')
+            worker.subsystem_metrics.pipe_execute()
+            return
+
+        for path in paths:
+            spill = SpillLog(path, settings.JOB_EVENT_SPILL_MAX_BYTES)
+            jobs = Counter()
+            for record in spill.read():
+                model = record['model'].split('.')[-1]
+                job_reference = next((k for k in ('job', 'project_update', 'ad_hoc_command', 'inventory_update', 'system_job') if k in record['fields']), None)
+                jobs[(model, record['fields'].get(job_reference))] += 1
+            self.stdout.write(f'{path}: {spill.size} bytes, {sum(jobs.values())} events')
+            for (model, job_id), count in sorted(jobs.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+                self.stdout.write(f'  {model} for #{job_id}: {count}')
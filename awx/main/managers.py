@@ -3,9 +3,10 @@
 
 import logging
 import uuid
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
 from django.db.models.functions import Lower
+from django.utils.timezone import now
 from awx.main.utils.filters import SmartFilter
 from awx.main.utils.pglock import advisory_lock
 from awx.main.constants import RECEPTOR_PENDING
@@ -80,6 +81,43 @@ class HostManager(models.Manager):
         return qs
 
 
+class HostMetricManager(models.Manager):
+    def record_automation(self, hostnames, automated_at=None, batch_size=None):
+        """Mark the given hostnames as automated against.
+
+        Missing HostMetric records are created, existing ones get their
+        last_automation bumped, automated_counter incremented and are
+        un-deleted. On PostgreSQL each batch is a single
+        INSERT ... ON CONFLICT (hostname) DO UPDATE statement.
+
+        Hostnames are deduplicated and sorted, and every batch is committed on
+        its own, so concurrent job wrapups lock the same rows in the same order
+        and only hold a batch worth of row locks at a time.
+        """
+        automated_at = automated_at or now()
+        batch_size = batch_size or settings.HOST_METRIC_UPSERT_BATCH_SIZE
+        hostnames = sorted(set(hostnames))
+        for i in range(0, len(hostnames), batch_size):
+            batch = hostnames[i : i + batch_size]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {self.model._meta.db_table} (hostname, first_automation, last_automation, automated_counter, deleted_counter, deleted)
+                        SELECT hostname, %s, %s, 1, 0, false FROM unnest(%s::varchar[]) AS hostname
+                        ON CONFLICT (hostname) DO UPDATE
+                        SET last_automation = EXCLUDED.last_automation,
+                            automated_counter = {self.model._meta.db_table}.automated_counter + 1,
+                            deleted = false
+                        """,
+                        [automated_at, automated_at, batch],
+                    )
+            else:
+                with transaction.atomic():
+                    self.bulk_create([self.model(hostname=hostname, last_automation=automated_at) for hostname in batch], ignore_conflicts=True)
+                    self.filter(hostname__in=batch).update(last_automation=automated_at, automated_counter=models.F('automated_counter') + 1, deleted=False)
+
+
 class HostMetricActiveManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(deleted=False)
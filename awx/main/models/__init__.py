@@ -64,6 +64,7 @@ from awx.main.models.ha import (  # noqa
     InstanceGroup,
     TowerScheduleState,
 )
+from awx.main.models.dispatcher_payload import DispatcherPayload  # noqa
 from awx.main.models.rbac import (  # noqa
     Role,
     batch_role_ancestor_rebuilding,
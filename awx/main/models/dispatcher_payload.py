@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class DispatcherPayload(models.Model):
+    """
+    Arguments of a dispatcher task message too large for pg_notify, the
+    message carries the id of this row instead (see awx.main.dispatch.publish)
+    """
+
+    class Meta:
+        app_label = 'main'
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    data = models.JSONField(default=dict)
@@ -4,12 +4,11 @@ import datetime
 from datetime import timezone
 import logging
 from collections import defaultdict
-import itertools
 import time
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models, DatabaseError, transaction
+from django.db import models, DatabaseError, connection
 from django.db.models.functions import Cast
 from django.utils.dateparse import parse_datetime
 from django.utils.text import Truncator
@@ -61,9 +60,10 @@ def create_host_status_counts(event_data):
     return dict(host_status_counts)
 
 
-def emit_event_detail(event):
+def event_detail_payload(event):
+    """Returns the channel group name and websocket payload for a saved event, or None if it should not be sent"""
     if settings.UI_LIVE_UPDATES_ENABLED is False and event.event not in MINIMAL_EVENTS:
-        return
+        return None
     cls = event.__class__
     relation = {
         JobEvent: 'job_id',
@@ -79,7 +79,7 @@ def emit_event_detail(event):
         url = '/api/v2/ad_hoc_command_events/{}'.format(event.id)
     group = camelcase_to_underscore(cls.__name__) + 's'
     timestamp = event.created.isoformat()
-    consumers.emit_channel_notification(
+    return (
         '-'.join([group, str(getattr(event, relation))]),
         {
             'id': event.id,
@@ -106,6 +106,36 @@ def emit_event_detail(event):
     )
 
 
+def emit_event_detail(event):
+    detail = event_detail_payload(event)
+    if detail is not None:
+        consumers.emit_channel_notification(*detail)
+
+
+def emit_event_details(events):
+    """
+    Sends websocket messages for a list of saved events
+
+    With JOB_EVENT_BROADCAST_BATCH enabled, the events are grouped by channel
+    group and each group gets a single message for all of its events.
+    """
+    if not settings.JOB_EVENT_BROADCAST_BATCH:
+        for event in events:
+            emit_event_detail(event)
+        return
+    groups = {}
+    for event in events:
+        detail = event_detail_payload(event)
+        if detail is not None:
+            group, payload = detail
+            groups.setdefault(group, []).append(payload)
+    for group, payloads in groups.items():
+        if len(payloads) == 1:
+            consumers.emit_channel_notification(group, payloads[0])
+        else:
+            consumers.emit_channel_notification_batch(group, payloads)
+
+
 class BasePlaybookEvent(CreatedModifiedModel):
     """
     An event/message logged from a playbook callback for each host.
@@ -536,6 +566,8 @@ class JobEvent(BasePlaybookEvent):
             pass
         return hostnames
 
+    HOST_SUMMARY_STATS = ('changed', 'dark', 'failures', 'ignored', 'ok', 'processed', 'rescued', 'skipped')
+
     def _update_host_summary_from_stats(self, hostnames):
         with ignore_inventory_computed_fields():
             try:
@@ -547,7 +579,7 @@ class JobEvent(BasePlaybookEvent):
                 return
             job = self.job
 
-            from awx.main.models import Host, JobHostSummary  # circular import
+            from awx.main.models import Host  # circular import
 
             if self.job.inventory.kind == 'constructed':
                 all_hosts = Host.objects.filter(id__in=self.job.inventory.hosts.values_list(Cast('instance_id', output_field=models.IntegerField()))).only(
@@ -560,69 +592,98 @@ class JobEvent(BasePlaybookEvent):
                 constructed_host_map = {}
                 host_map = self.host_map
 
-            existing_host_ids = set(h.id for h in all_hosts)
-
-            summaries = dict()
-            updated_hosts_list = list()
+            host_stats = {}
             for host in hostnames:
-                updated_hosts_list.append(host.lower())
-                host_id = host_map.get(host)
-                if host_id not in existing_host_ids:
-                    host_id = None
-                constructed_host_id = constructed_host_map.get(host)
-                host_stats = {}
-                for stat in ('changed', 'dark', 'failures', 'ignored', 'ok', 'processed', 'rescued', 'skipped'):
+                host_stats[host] = {}
+                for stat in self.HOST_SUMMARY_STATS:
                     try:
-                        host_stats[stat] = self.event_data.get(stat, {}).get(host, 0)
+                        host_stats[host][stat] = self.event_data.get(stat, {}).get(host, 0)
                     except AttributeError:  # in case event_data[stat] isn't a dict.
                         pass
-                summary = JobHostSummary(
-                    created=now(), modified=now(), job_id=job.id, host_id=host_id, constructed_host_id=constructed_host_id, host_name=host, **host_stats
-                )
-                summary.failed = bool(summary.dark or summary.failures)
-                summaries[(host_id, host)] = summary
-
-            JobHostSummary.objects.bulk_create(summaries.values())
-
-            # update the last_job_id and last_job_host_summary_id
-            # in single queries
-            host_mapping = dict((summary['host_id'], summary['id']) for summary in JobHostSummary.objects.filter(job_id=job.id).values('id', 'host_id'))
-            updated_hosts = set()
-            for h in all_hosts:
-                # if the hostname *shows up* in the playbook_on_stats event
-                if h.name in hostnames:
-                    h.last_job_id = job.id
-                    updated_hosts.add(h)
-                if h.id in host_mapping:
-                    h.last_job_host_summary_id = host_mapping[h.id]
-                    updated_hosts.add(h)
-
-            Host.objects.bulk_update(list(updated_hosts), ['last_job_id', 'last_job_host_summary_id'], batch_size=100)
+
+            if connection.vendor == 'postgresql':
+                self._save_host_summaries_sql(job, host_stats, host_map, constructed_host_map)
+            else:
+                self._save_host_summaries_orm(job, host_stats, host_map, constructed_host_map, all_hosts)
 
             # Create/update Host Metrics
-            self._update_host_metrics(updated_hosts_list)
+            self._update_host_metrics([host.lower() for host in hostnames])
+
+    def _save_host_summaries_orm(self, job, host_stats, host_map, constructed_host_map, all_hosts):
+        from awx.main.models import Host, JobHostSummary  # circular import
+
+        existing_host_ids = set(h.id for h in all_hosts)
+
+        summaries = dict()
+        for host, stats in host_stats.items():
+            host_id = host_map.get(host)
+            if host_id not in existing_host_ids:
+                host_id = None
+            constructed_host_id = constructed_host_map.get(host)
+            summary = JobHostSummary(
+                created=now(), modified=now(), job_id=job.id, host_id=host_id, constructed_host_id=constructed_host_id, host_name=host, **stats
+            )
+            summary.failed = bool(summary.dark or summary.failures)
+            summaries[(host_id, host)] = summary
+
+        JobHostSummary.objects.bulk_create(summaries.values())
+
+        # update the last_job_id and last_job_host_summary_id
+        # in single queries
+        host_mapping = dict((summary['host_id'], summary['id']) for summary in JobHostSummary.objects.filter(job_id=job.id).values('id', 'host_id'))
+        updated_hosts = set()
+        for h in all_hosts:
+            # if the hostname *shows up* in the playbook_on_stats event
+            if h.name in host_stats:
+                h.last_job_id = job.id
+                updated_hosts.add(h)
+            if h.id in host_mapping:
+                h.last_job_host_summary_id = host_mapping[h.id]
+                updated_hosts.add(h)
+
+        Host.objects.bulk_update(list(updated_hosts), ['last_job_id', 'last_job_host_summary_id'], batch_size=100)
+
+    def _save_host_summaries_sql(self, job, host_stats, host_map, constructed_host_map):
+        """
+        Set-based equivalent of _save_host_summaries_orm for PostgreSQL
+
+        The per-host stats are passed as one array per column, so that a
+        single statement inserts every JobHostSummary and points the hosts
+        at them, regardless of the number of hosts.
+        """
+        hostnames = list(host_stats.keys())
+        columns = [
+            hostnames,
+            [host_map.get(host) for host in hostnames],
+            [constructed_host_map.get(host) for host in hostnames],
+        ]
+        for stat in self.HOST_SUMMARY_STATS:
+            columns.append([host_stats[host].get(stat, 0) for host in hostnames])
+        stat_columns = ', '.join(self.HOST_SUMMARY_STATS)
+        current_time = now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH stats AS (
+                    SELECT * FROM unnest(%s::varchar[], %s::integer[], %s::integer[], {', '.join(['%s::integer[]'] * len(self.HOST_SUMMARY_STATS))})
+                    AS stats (host_name, host_id, constructed_host_id, {stat_columns})
+                ), summaries AS (
+                    INSERT INTO main_jobhostsummary (created, modified, job_id, host_id, constructed_host_id, host_name, {stat_columns}, failed)
+                    SELECT %s, %s, %s, main_host.id, stats.constructed_host_id, stats.host_name, {stat_columns}, (dark > 0 OR failures > 0)
+                    FROM stats LEFT JOIN main_host ON main_host.id = stats.host_id
+                    RETURNING id, host_id
+                )
+                UPDATE main_host SET last_job_id = %s, last_job_host_summary_id = summaries.id
+                FROM summaries WHERE main_host.id = summaries.host_id
+                """,
+                columns + [current_time, current_time, job.id, job.id],
+            )
 
     @staticmethod
     def _update_host_metrics(updated_hosts_list):
         from awx.main.models import HostMetric  # circular import
 
-        current_time = now()
-
-        # FUTURE:
-        #   - Hand-rolled implementation of itertools.batched(), introduced in Python 3.12.  Replace.
-        #   - Ability to do ORM upserts *may* have been introduced in Django 5.0.
-        #     See the entry about `create_defaults` in https://docs.djangoproject.com/en/5.0/releases/5.0/#models.
-        #     Hopefully this will be fully ready for batch use by 5.2 LTS.
-
-        args = [iter(updated_hosts_list)] * 500
-        for hosts in itertools.zip_longest(*args):
-            with transaction.atomic():
-                HostMetric.objects.bulk_create(
-                    [HostMetric(hostname=hostname, last_automation=current_time) for hostname in hosts if hostname is not None], ignore_conflicts=True
-                )
-                HostMetric.objects.filter(hostname__in=hosts).update(
-                    last_automation=current_time, automated_counter=models.F('automated_counter') + 1, deleted=False
-                )
+        HostMetric.objects.record_automation(updated_hosts_list)
 
     @property
     def job_verbosity(self):
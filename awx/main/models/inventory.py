@@ -35,7 +35,7 @@ from awx.main.fields import (
     SmartFilterField,
     OrderedManyToManyField,
 )
-from awx.main.managers import HostManager, HostMetricActiveManager
+from awx.main.managers import HostManager, HostMetricActiveManager, HostMetricManager
 from awx.main.models.base import BaseModel, CommonModelNameNotUnique, VarsDictProperty, accepts_json
 from awx.main.models.events import InventoryUpdateEvent, UnpartitionedInventoryUpdateEvent
 from awx.main.models.unified_jobs import UnifiedJob, UnifiedJobTemplate
@@ -875,7 +875,7 @@ class HostMetric(models.Model):
     )
     used_in_inventories = models.IntegerField(null=True, help_text=_('How many inventories contain this host'))
 
-    objects = models.Manager()
+    objects = HostMetricManager()
     active_objects = HostMetricActiveManager()
 
     def get_absolute_url(self, request=None):
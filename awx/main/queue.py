@@ -2,14 +2,20 @@
 # All Rights Reserved.
 
 # Python
+import itertools
 import json
 import logging
+import threading
 import redis
 
 # Django
 from django.conf import settings
 
-__all__ = ['CallbackQueueDispatcher']
+__all__ = ['CallbackQueueDispatcher', 'callback_queue_names', 'callback_queue_shard_count']
+
+# keys under which callback events reference their unified job, see the
+# JOB_REFERENCE attribute of the event models
+JOB_REFERENCE_KEYS = ('job_id', 'project_update_id', 'ad_hoc_command_id', 'inventory_update_id', 'system_job_id')
 
 
 # use a custom JSON serializer so we can properly handle !unsafe and !vault
@@ -22,11 +28,111 @@ class AnsibleJSONEncoder(json.JSONEncoder):
         return super(AnsibleJSONEncoder, self).default(o)
 
 
+def callback_queue_shard_count():
+    """Number of sharded callback queues, 0 when JOB_EVENT_QUEUE_SHARDING is disabled"""
+    if getattr(settings, 'JOB_EVENT_QUEUE_SHARDING', False):
+        return settings.JOB_EVENT_WORKERS
+    return 0
+
+
+def callback_queue_names():
+    """
+    All redis lists consumed by the callback receiver
+
+    The unsharded CALLBACK_QUEUE is always included, so that events queued
+    before sharding was turned on are still processed.
+    """
+    queue = getattr(settings, 'CALLBACK_QUEUE', '')
+    return [queue] + [f'{queue}_{shard}' for shard in range(callback_queue_shard_count())]
+
+
 class CallbackQueueDispatcher(object):
+    """
+    Pushes events onto the callback receiver queue in redis
+
+    If JOB_EVENT_DISPATCH_BATCH_SIZE is greater than 1, events are buffered
+    and pushed with a single multi-value RPUSH once the buffer is full, or
+    JOB_EVENT_DISPATCH_BUFFER_SECONDS after the first buffered event,
+    whichever comes first.  Callers must flush() when they are done so that
+    no events are left behind in the buffer.  Events that could not be pushed
+    stay in the buffer and are retried on the next flush.
+
+    With JOB_EVENT_QUEUE_SHARDING enabled, events are pushed to one of
+    JOB_EVENT_WORKERS queues chosen by their job id instead, so that all
+    events of a job are consumed, in order, by the same callback receiver
+    worker.
+
+    The length of the queue after each push is used as a backpressure signal:
+    backpressure is True from the time it reaches
+    JOB_EVENT_BACKPRESSURE_HIGH_WATER_MARK until it drops below half of that.
+    """
+
     def __init__(self):
         self.queue = getattr(settings, 'CALLBACK_QUEUE', '')
+        self.shards = callback_queue_shard_count()
         self.logger = logging.getLogger('awx.main.queue.CallbackQueueDispatcher')
         self.connection = redis.Redis.from_url(settings.BROKER_URL)
+        self.batch_size = getattr(settings, 'JOB_EVENT_DISPATCH_BATCH_SIZE', 1)
+        self.buffer_seconds = getattr(settings, 'JOB_EVENT_DISPATCH_BUFFER_SECONDS', 0.05)
+        self.high_water_mark = getattr(settings, 'JOB_EVENT_BACKPRESSURE_HIGH_WATER_MARK', 0)
+        self.backpressure = False
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def queue_for(self, obj):
+        if self.shards:
+            for key in JOB_REFERENCE_KEYS:
+                if obj.get(key):
+                    return f'{self.queue}_{int(obj[key]) % self.shards}'
+        return self.queue
 
     def dispatch(self, obj):
-        self.connection.rpush(self.queue, json.dumps(obj, cls=AnsibleJSONEncoder))
+        queue = self.queue_for(obj)
+        message = json.dumps(obj, cls=AnsibleJSONEncoder)
+        if self.batch_size <= 1:
+            self.push(queue, message)
+            return
+        with self.lock:
+            self.buffer.append((queue, message))
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.buffer_seconds, self._flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.buffer:
+            buffered, self.buffer = self.buffer, []
+            pushed = 0
+            try:
+                for queue, group in itertools.groupby(buffered, key=lambda item: item[0]):
+                    messages = [message for _, message in group]
+                    self.push(queue, *messages)
+                    pushed += len(messages)
+            except Exception:
+                # keep the unsent events, in order, so that the next flush retries them
+                self.buffer = buffered[pushed:]
+                raise
+
+    def push(self, queue, *messages):
+        queue_length = self.connection.rpush(queue, *messages)
+        if self.high_water_mark > 0:
+            if queue_length >= self.high_water_mark:
+                self.backpressure = True
+            elif queue_length < self.high_water_mark // 2:
+                self.backpressure = False
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            self.logger.exception('Failed to push buffered events to the callback queue')
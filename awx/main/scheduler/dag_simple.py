@@ -132,6 +132,10 @@ class SimpleDAG(object):
         self.node_from_edges_by_label[label][from_obj_ord].append(to_obj_ord)
         self.node_to_edges_by_label[label][to_obj_ord].append(from_obj_ord)
 
+    def replace_node_object(self, obj):
+        '''Store obj in place of the node object equal to it, keeping the node's edges'''
+        self.nodes[self.node_obj_to_node_index[obj]]['node_object'] = obj
+
     def find_ord(self, obj):
         return self.node_obj_to_node_index.get(obj, None)
 
@@ -54,7 +54,7 @@ class WorkflowDAG(SimpleDAG):
         for p in parent_nodes:
             if p.do_not_run is True:
                 continue
-            elif p.unified_job_template is None:
+            elif p.unified_job_template_id is None:
                 continue
             # do_not_run is False, node might still run a job and thus blocks children
             elif not p.job:
@@ -100,7 +100,7 @@ class WorkflowDAG(SimpleDAG):
                     nodes.extend(self.get_children(obj, 'failure_nodes') + self.get_children(obj, 'always_nodes'))
                 elif obj.job.status == 'successful':
                     nodes.extend(self.get_children(obj, 'success_nodes') + self.get_children(obj, 'always_nodes'))
-            elif obj.unified_job_template is None:
+            elif obj.unified_job_template_id is None:
                 nodes.extend(self.get_children(obj, 'failure_nodes') + self.get_children(obj, 'always_nodes'))
             else:
                 # This catches root nodes or ANY convergence nodes
@@ -129,7 +129,7 @@ class WorkflowDAG(SimpleDAG):
     def is_workflow_done(self):
         for node in self.nodes:
             obj = node['node_object']
-            if obj.do_not_run is False and not obj.job and obj.unified_job_template:
+            if obj.do_not_run is False and not obj.job and obj.unified_job_template_id is not None:
                 return False
             elif obj.job and obj.job.status not in ['successful', 'failed', 'canceled', 'error']:
                 return False
@@ -143,7 +143,7 @@ class WorkflowDAG(SimpleDAG):
 
         for node in self.nodes:
             obj = node['node_object']
-            if obj.do_not_run is False and obj.unified_job_template is None:
+            if obj.do_not_run is False and obj.unified_job_template_id is None:
                 failed_nodes.append(node)
             elif obj.job and obj.job.status in ['failed', 'canceled', 'error']:
                 failed_nodes.append(node)
@@ -151,7 +151,7 @@ class WorkflowDAG(SimpleDAG):
         for node in failed_nodes:
             obj = node['node_object']
             if (len(self.get_children(obj, 'failure_nodes')) + len(self.get_children(obj, 'always_nodes'))) == 0:
-                if obj.unified_job_template is None:
+                if obj.unified_job_template_id is None:
                     res = True
                     failed_unified_job_template_node_ids.append(str(obj.id))
                 else:
@@ -187,7 +187,7 @@ class WorkflowDAG(SimpleDAG):
 
     def _are_all_nodes_dnr_decided(self, workflow_nodes):
         for n in workflow_nodes:
-            if n.do_not_run is False and not n.job and n.unified_job_template:
+            if n.do_not_run is False and not n.job and n.unified_job_template_id is not None:
                 return False
         return True
 
@@ -214,7 +214,7 @@ class WorkflowDAG(SimpleDAG):
                         return False
                 else:
                     return False
-            elif not p.do_not_run and p.unified_job_template is None:
+            elif not p.do_not_run and p.unified_job_template_id is None:
                 if node in (self.get_children(p, 'failure_nodes') + self.get_children(p, 'always_nodes')):
                     return False
             else:
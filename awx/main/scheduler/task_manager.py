@@ -15,12 +15,12 @@ from django.db import transaction
 from django.utils.translation import gettext_lazy as _, gettext_noop
 from django.utils.timezone import now as tz_now
 from django.conf import settings
-from django.contrib.contenttypes.models import ContentType
 
 from ansible_base.lib.utils.models import get_type_for_model
 
 # AWX
-from awx.main.dispatch.reaper import reap_job
+from awx.main.dispatch.publish import publish_batch
+from awx.main.dispatch.reaper import reap_jobs
 from awx.main.models import (
     Instance,
     InventorySource,
@@ -28,6 +28,7 @@ from awx.main.models import (
     Job,
     Project,
     UnifiedJob,
+    UnifiedJobTemplate,
     WorkflowApproval,
     WorkflowJob,
     WorkflowJobNode,
@@ -40,16 +41,24 @@ from awx.main.utils import (
     ScheduleWorkflowManager,
 )
 from awx.main.utils.common import task_manager_bulk_reschedule, is_testing
-from awx.main.signals import disable_activity_stream
+from awx.main.registrar import activity_stream_registrar
+from awx.main.signals import activity_stream_create_bulk, disable_activity_stream
 from awx.main.constants import ACTIVE_STATES
 from awx.main.scheduler.dependency_graph import DependencyGraph
 from awx.main.scheduler.task_manager_models import TaskManagerModels
+from awx.main.scheduler.task_snapshot import TaskSnapshot, tasks_queryset
+from awx.main.scheduler.workflow_dag_cache import WorkflowDAGCache
 import awx.main.analytics.subsystem_metrics as s_metrics
 from awx.main.utils import decrypt_field
 
 
 logger = logging.getLogger('awx.main.scheduler')
 
+# tasks of the TaskManager kept between runs, see TASK_MANAGER_INCREMENTAL_STATE
+task_snapshot = TaskSnapshot()
+# DAGs of the running workflows kept between runs, see WORKFLOW_MANAGER_INCREMENTAL_STATE
+workflow_dag_cache = WorkflowDAGCache()
+
 
 def timeit(func):
     def inner(*args, **kwargs):
@@ -90,15 +99,7 @@ class TaskBase:
 
     @timeit
     def get_tasks(self, filter_args):
-        wf_approval_ctype_id = ContentType.objects.get_for_model(WorkflowApproval).id
-        qs = (
-            UnifiedJob.objects.filter(**filter_args)
-            .exclude(launch_type='sync')
-            .exclude(polymorphic_ctype_id=wf_approval_ctype_id)
-            .order_by('created')
-            .prefetch_related('dependent_jobs')
-        )
-        self.all_tasks = [t for t in qs]
+        self.all_tasks = [t for t in tasks_queryset(filter_args)]
 
     def record_aggregate_metrics(self, *args):
         if not is_testing():
@@ -178,7 +179,7 @@ class WorkflowManager(TaskBase):
                 ScheduleWorkflowManager().schedule()
                 # Do not process any more workflow jobs. Stop here.
                 break
-            dag = WorkflowDAG(workflow_job)
+            dag = self.dags[workflow_job.id]
             status_changed = False
             if workflow_job.cancel_flag:
                 workflow_job.workflow_nodes.filter(do_not_run=False, job__isnull=True).update(do_not_run=True)
@@ -212,6 +213,7 @@ class WorkflowManager(TaskBase):
                     status_changed = True
 
             if status_changed:
+                workflow_dag_cache.evict(workflow_job.id)
                 if workflow_job.spawned_by_workflow:
                     ScheduleWorkflowManager().schedule()
                 workflow_job.websocket_emit_status(workflow_job.status)
@@ -224,14 +226,9 @@ class WorkflowManager(TaskBase):
                     logger.debug('Spawning jobs for %s', workflow_job.log_format)
                 else:
                     logger.debug('No nodes to spawn for %s', workflow_job.log_format)
+                spawn_nodes = self.spawn_node_jobs(workflow_job, spawn_nodes)
                 for spawn_node in spawn_nodes:
-                    if spawn_node.unified_job_template is None:
-                        continue
-                    kv = spawn_node.get_job_kwargs()
-                    job = spawn_node.unified_job_template.create_unified_job(**kv)
-                    spawn_node.job = job
-                    spawn_node.save()
-                    logger.debug('Spawned %s in %s for node %s', job.log_format, workflow_job.log_format, spawn_node.pk)
+                    job = spawn_node.job
                     can_start = True
                     if isinstance(spawn_node.unified_job_template, WorkflowJobTemplate):
                         workflow_ancestors = job.get_ancestor_workflows()
@@ -282,9 +279,39 @@ class WorkflowManager(TaskBase):
 
         return result
 
+    def spawn_node_jobs(self, workflow_job, spawn_nodes):
+        """
+        Create the jobs of the spawn_nodes that have a unified job template and
+        return those nodes.  The node links and the activity stream entries of
+        the jobs are saved together, so a node with many children does not cost
+        a node update and an activity stream entry insert per child.  The
+        templates are loaded here, the nodes may be kept between runs.
+        """
+        templates = UnifiedJobTemplate.objects.in_bulk({n.unified_job_template_id for n in spawn_nodes if n.unified_job_template_id is not None})
+        spawned = []
+        for spawn_node in spawn_nodes:
+            spawn_node.unified_job_template = templates.get(spawn_node.unified_job_template_id)
+            if spawn_node.unified_job_template is None:
+                continue
+            kv = spawn_node.get_job_kwargs()
+            with disable_activity_stream():
+                spawn_node.job = spawn_node.unified_job_template.create_unified_job(**kv)
+            spawned.append(spawn_node)
+            logger.debug('Spawned %s in %s for node %s', spawn_node.job.log_format, workflow_job.log_format, spawn_node.pk)
+        if spawned:
+            WorkflowJobNode.objects.bulk_update(spawned, ['job'])
+            activity_stream_create_bulk([n.job for n in spawned if n.job.__class__ in activity_stream_registrar.models])
+        return spawned
+
     @timeit
     def get_tasks(self, filter_args):
         self.all_tasks = [wf for wf in WorkflowJob.objects.filter(**filter_args)]
+        if not settings.WORKFLOW_MANAGER_INCREMENTAL_STATE:
+            workflow_dag_cache.clear()
+            self.dags = {workflow_job.id: WorkflowDAG(workflow_job) for workflow_job in self.all_tasks}
+            return
+        self.dags = workflow_dag_cache.get_dags(self.all_tasks)
+        self.subsystem_metrics.set(f"{self.prefix}_nodes_loaded", workflow_dag_cache.loaded)
 
     @timeit
     def _schedule(self):
@@ -427,12 +454,24 @@ class TaskManager(TaskBase):
         self.time_delta_job_explanation = timedelta(seconds=30)
         super().__init__(prefix="task_manager")
 
+    @timeit
+    def get_tasks(self, filter_args):
+        if not settings.TASK_MANAGER_INCREMENTAL_STATE:
+            task_snapshot.clear()
+            self.all_tasks = [t for t in tasks_queryset(filter_args)]
+            return
+        # the snapshot holds exactly the tasks _schedule asks for
+        self.all_tasks = task_snapshot.sync()
+        transaction.on_commit(task_snapshot.commit)
+        self.subsystem_metrics.set(f"{self.prefix}_tasks_loaded", task_snapshot.loaded)
+
     def after_lock_init(self):
         """
         Init AFTER we know this instance of the task manager will run because the lock is acquired.
         """
         self.dependency_graph = DependencyGraph()
         self.tm_models = TaskManagerModels()
+        self.started_tasks = []
         self.controlplane_ig = self.tm_models.instance_groups.controlplane_ig
 
     def process_job_dep_failures(self, task):
@@ -496,39 +535,60 @@ class TaskManager(TaskBase):
             task.save()
             self.pre_start_failed.append(task.id)
         else:
+            task.celery_task_id = str(uuid.uuid4())
             if type(task) is WorkflowJob:
                 task.status = 'running'
                 task.send_notification_templates('running')
                 logger.debug('Transitioning %s to running status.', task.log_format)
                 # Call this to ensure Workflow nodes get spawned in timely manner
                 ScheduleWorkflowManager().schedule()
+                with disable_activity_stream():
+                    task.save()
+                    task.log_lifecycle("waiting")
             # at this point we already have control/execution nodes selected for the following cases
             else:
                 execution_node_msg = f' and execution node {task.execution_node}' if task.execution_node else ''
                 logger.debug(
                     f'Submitting job {task.log_format} controlled by {task.controller_node} to instance group {instance_group.name}{execution_node_msg}.'
                 )
-            with disable_activity_stream():
-                task.celery_task_id = str(uuid.uuid4())
-                task.save()
-                task.log_lifecycle("waiting")
-
-        # apply_async does a NOTIFY to the channel dispatcher is listening to
-        # postgres will treat this as part of the transaction, which is what we want
-        if task.status != 'failed' and type(task) is not WorkflowJob:
-            task_cls = task._get_task_class()
-            task_cls.apply_async(
-                [task.pk],
-                opts,
-                queue=task.get_queue_name(),
-                uuid=task.celery_task_id,
-            )
+                # saved and submitted to the dispatcher together with the other
+                # tasks started in this cycle, see save_started_tasks
+                self.started_tasks.append((task, opts))
 
         # In exception cases, like a job failing pre-start checks, we send the websocket status message.
         # For jobs going into waiting, we omit this because of performance issues, as it should go to running quickly
         if task.status != 'waiting':
             task.websocket_emit_status(task.status)  # adds to on_commit
 
+    @timeit
+    def save_started_tasks(self):
+        """
+        Save the tasks start_task moved to waiting with one bulk UPDATE, and
+        submit them to the dispatcher in one batch of messages
+        """
+        if not self.started_tasks:
+            return
+        started_tasks, self.started_tasks = self.started_tasks, []
+        tasks = [task for task, opts in started_tasks]
+        modified = tz_now()
+        for task in tasks:
+            task.modified = modified
+        UnifiedJob.objects.bulk_update(
+            tasks,
+            ['status', 'celery_task_id', 'controller_node', 'execution_node', 'instance_group', 'job_explanation', 'modified'],
+        )
+        # apply_async does a NOTIFY to the channel dispatcher is listening to
+        # postgres will treat this as part of the transaction, which is what we want
+        with publish_batch():
+            for task, opts in started_tasks:
+                task.log_lifecycle("waiting")
+                task._get_task_class().apply_async(
+                    [task.pk],
+                    opts,
+                    queue=task.get_queue_name(),
+                    uuid=task.celery_task_id,
+                )
+
     @timeit
     def process_running_tasks(self, running_tasks):
         for task in running_tasks:
@@ -575,7 +635,7 @@ class TaskManager(TaskBase):
                 control_impact = task.task_impact + self.control_task_impact
             else:
                 control_impact = self.control_task_impact
-            control_instance = self.tm_models.instance_groups.fit_task_to_most_remaining_capacity_instance(
+            control_instance = self.tm_models.instance_groups.fit_task_to_instance(
                 task, instance_group_name=self.controlplane_ig.name, impact=control_impact, capacity_type='control'
             )
             if not control_instance:
@@ -607,7 +667,7 @@ class TaskManager(TaskBase):
 
                 # at this point we know the instance group is NOT a container group
                 # because if it was, it would have started the task and broke out of the loop.
-                execution_instance = self.tm_models.instance_groups.fit_task_to_most_remaining_capacity_instance(
+                execution_instance = self.tm_models.instance_groups.fit_task_to_instance(
                     task, instance_group_name=instance_group.name, add_hybrid_control_cost=True
                 ) or self.tm_models.instance_groups.find_largest_idle_instance(instance_group_name=instance_group.name, capacity_type=task.capacity_type)
 
@@ -656,12 +716,15 @@ class TaskManager(TaskBase):
         # that we know about; this is a fairly rare event, but it can occur if you,
         # for example, SQL backup an awx install with running jobs and restore it
         # elsewhere
+        orphaned = []
         for j in UnifiedJob.objects.filter(
             status__in=['pending', 'waiting', 'running'],
         ).exclude(execution_node__in=Instance.objects.exclude(node_type='hop').values_list('hostname', flat=True)):
             if j.execution_node and not j.is_container_group_task:
                 logger.error(f'{j.execution_node} is not a registered instance; reaping {j.log_format}')
-                reap_job(j, 'failed')
+                orphaned.append(j.id)
+        if orphaned:
+            reap_jobs(UnifiedJob.objects.filter(id__in=orphaned), 'failed')
 
     def process_tasks(self):
         # maintain a list of jobs that went to an early failure state,
@@ -676,7 +739,12 @@ class TaskManager(TaskBase):
         pending_tasks = [t for t in self.all_tasks if t.status == 'pending']
 
         self.process_pending_tasks(pending_tasks)
+        started_ct = len(self.started_tasks)
+        self.save_started_tasks()
         self.subsystem_metrics.inc(f"{self.prefix}_pending_processed", len(pending_tasks))
+        start_seconds = self.subsystem_metrics.get(f"{self.prefix}_start_task_seconds") + self.subsystem_metrics.get(f"{self.prefix}_save_started_tasks_seconds")
+        if started_ct and start_seconds:
+            self.subsystem_metrics.set(f"{self.prefix}_tasks_started_per_second", started_ct / start_seconds)
 
         if self.pre_start_failed:
             from awx.main.tasks.system import handle_failure_notifications
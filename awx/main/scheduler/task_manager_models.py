@@ -1,5 +1,6 @@
 # Copyright (c) 2022 Ansible by Red Hat
 # All Rights Reserved.
+import bisect
 import logging
 
 from django.conf import settings
@@ -22,11 +23,15 @@ class TaskManagerInstance:
         self.capacity = obj.capacity
         self.hostname = obj.hostname
         self.jobs_running = 0
+        # the CapacityIndex objects of the instance groups this instance is in
+        self.indexes = []
 
     def consume_capacity(self, impact, job_impact=False):
         self.consumed_capacity += impact
         if job_impact:
             self.jobs_running += 1
+        for index in self.indexes:
+            index.update(self)
 
     @property
     def remaining_capacity(self):
@@ -36,6 +41,123 @@ class TaskManagerInstance:
         return remaining
 
 
+class CapacityIndex:
+    """
+    The instances of one node type in an instance group, sorted by the key of a
+    placement strategy and kept sorted as capacity is consumed on them, so that
+    picking an instance is a bisect rather than a scan of the whole group.
+
+    Entries are (key, position of the instance in the group, instance) tuples;
+    instances for which the key is None are left out of the index.
+    """
+
+    def __init__(self, instances, key):
+        self.key = key
+        self.entries = []
+        # hostname -> (key, position) of the entry of the instance
+        self.positions = {}
+        for position, instance in instances:
+            self.insert(instance, position)
+            instance.indexes.append(self)
+
+    def insert(self, instance, position):
+        key = self.key(instance)
+        if key is not None:
+            bisect.insort(self.entries, (key, position, instance))
+        self.positions[instance.hostname] = (key, position)
+
+    def update(self, instance):
+        key, position = self.positions[instance.hostname]
+        if key is not None:
+            del self.entries[bisect.bisect_left(self.entries, (key, position))]
+        self.insert(instance, position)
+
+
+class PlacementStrategy:
+    """
+    Chooses the instance of an instance group a task runs on, see
+    TASK_MANAGER_PLACEMENT_STRATEGY.
+
+    candidate() returns the best instance of a CapacityIndex that has room
+    for impact plus extra (the control cost on hybrid nodes) as a
+    (rank, position, instance) tuple, or None; the lowest ranked candidate of
+    the node types that can run the task is picked, the first instance of the
+    group on a tie.
+    """
+
+    name = None
+
+    def key(self, instance):
+        raise NotImplementedError
+
+    def candidate(self, index, impact, extra):
+        raise NotImplementedError
+
+
+class MostRemainingCapacity(PlacementStrategy):
+    """The instance with the most capacity left once the task runs, spreads the tasks evenly"""
+
+    name = 'most_remaining'
+
+    def key(self, instance):
+        return -instance.remaining_capacity
+
+    def candidate(self, index, impact, extra):
+        if index.entries:
+            key, position, instance = index.entries[0]
+            if -key - extra >= impact:
+                return (key + extra, position, instance)
+
+
+class BestFit(PlacementStrategy):
+    """The instance with the least capacity left once the task runs, packs the tasks on as few instances as possible"""
+
+    name = 'best_fit'
+
+    def key(self, instance):
+        return instance.remaining_capacity
+
+    def candidate(self, index, impact, extra):
+        i = bisect.bisect_left(index.entries, (impact + extra,))
+        if i < len(index.entries):
+            key, position, instance = index.entries[i]
+            return (key - extra, position, instance)
+
+
+class LeastJobsRunning(PlacementStrategy):
+    """The instance running the fewest jobs that has room for the task"""
+
+    name = 'least_jobs_running'
+
+    def key(self, instance):
+        return instance.jobs_running
+
+    def candidate(self, index, impact, extra):
+        # instances are skipped only while they are full, so this rarely goes past the first few
+        for key, position, instance in index.entries:
+            if instance.remaining_capacity - extra >= impact:
+                return (key, position, instance)
+
+
+class LargestIdleInstance(PlacementStrategy):
+    """The idle instance with the most capacity, for tasks that do not fit anywhere else"""
+
+    name = 'largest_idle'
+
+    def key(self, instance):
+        # We don't want to select an idle instance with 0 capacity
+        if instance.capacity > 0 and (instance.jobs_running == 0 or instance.remaining_capacity == instance.capacity):
+            return -instance.capacity
+
+    def candidate(self, index, impact, extra):
+        if index.entries:
+            return index.entries[0]
+
+
+PLACEMENT_STRATEGIES = {strategy.name: strategy for strategy in (MostRemainingCapacity(), BestFit(), LeastJobsRunning())}
+LARGEST_IDLE_INSTANCE = LargestIdleInstance()
+
+
 class TaskManagerInstanceGroup:
     """A class representing minimal data the task manager needs to represent an InstanceGroup."""
 
@@ -52,6 +174,26 @@ class TaskManagerInstanceGroup:
         self.max_concurrent_jobs = obj.max_concurrent_jobs
         self.max_forks = obj.max_forks
         self.control_task_impact = kwargs.get('control_task_impact', settings.AWX_CONTROL_NODE_TASK_IMPACT)
+        # (strategy name, node type) -> CapacityIndex, built on first use
+        self.indexes = dict()
+
+    def get_index(self, strategy, node_type):
+        index = self.indexes.get((strategy.name, node_type))
+        if index is None:
+            instances = [(position, i) for position, i in enumerate(self.instances) if i.node_type == node_type]
+            index = self.indexes[(strategy.name, node_type)] = CapacityIndex(instances, strategy.key)
+        return index
+
+    def place(self, strategy, impact, capacity_type, hybrid_cost=0):
+        """Return the instance strategy picks among the instances of capacity_type and hybrid instances, or None"""
+        candidates = []
+        for node_type in dict.fromkeys((capacity_type, 'hybrid')):
+            candidate = strategy.candidate(self.get_index(strategy, node_type), impact, hybrid_cost if node_type == 'hybrid' else 0)
+            if candidate is not None:
+                candidates.append(candidate)
+        if candidates:
+            return min(candidates)[2]
+        return None
 
     def consume_capacity(self, task):
         """We only consume capacity on an instance group level if it is a container group. Otherwise we consume capacity on an instance level."""
@@ -170,6 +312,11 @@ class TaskManagerInstanceGroups:
         self.pk_ig_map = dict()
         self.control_task_impact = kwargs.get('control_task_impact', settings.AWX_CONTROL_NODE_TASK_IMPACT)
         self.controlplane_ig_name = kwargs.get('controlplane_ig_name', settings.DEFAULT_CONTROL_PLANE_QUEUE_NAME)
+        placement_strategy = kwargs.get('placement_strategy', settings.TASK_MANAGER_PLACEMENT_STRATEGY)
+        if placement_strategy not in PLACEMENT_STRATEGIES:
+            logger.error(f"Unknown TASK_MANAGER_PLACEMENT_STRATEGY {placement_strategy}, using most_remaining")
+            placement_strategy = 'most_remaining'
+        self.placement_strategy = PLACEMENT_STRATEGIES[placement_strategy]
 
         if instance_groups is not None:  # for testing
             self.instance_groups = {ig.name: TaskManagerInstanceGroup(ig, self.task_manager_instances, **kwargs) for ig in instance_groups}
@@ -206,40 +353,26 @@ class TaskManagerInstanceGroups:
     def get_instances(self, group_name):
         return self.instance_groups[group_name].instances
 
-    def fit_task_to_most_remaining_capacity_instance(self, task, instance_group_name, impact=None, capacity_type=None, add_hybrid_control_cost=False):
+    def fit_task_to_instance(self, task, instance_group_name, impact=None, capacity_type=None, add_hybrid_control_cost=False, strategy=None):
+        """Return the instance of the group the placement strategy picks to run the task, or None if it fits on none of them"""
         impact = impact if impact else task.task_impact
         capacity_type = capacity_type if capacity_type else task.capacity_type
-        instance_most_capacity = None
-        most_remaining_capacity = -1
-        instances = self.instance_groups[instance_group_name].instances
-
-        for i in instances:
-            if i.node_type not in (capacity_type, 'hybrid'):
-                continue
-            would_be_remaining = i.remaining_capacity - impact
-            # hybrid nodes _always_ control their own tasks
-            if add_hybrid_control_cost and i.node_type == 'hybrid':
-                would_be_remaining -= self.control_task_impact
-            if would_be_remaining >= 0 and (instance_most_capacity is None or would_be_remaining > most_remaining_capacity):
-                instance_most_capacity = i
-                most_remaining_capacity = would_be_remaining
-        return instance_most_capacity
+        # hybrid nodes _always_ control their own tasks
+        hybrid_cost = self.control_task_impact if add_hybrid_control_cost else 0
+        return self.instance_groups[instance_group_name].place(strategy or self.placement_strategy, impact, capacity_type, hybrid_cost)
+
+    def fit_task_to_most_remaining_capacity_instance(self, task, instance_group_name, impact=None, capacity_type=None, add_hybrid_control_cost=False):
+        return self.fit_task_to_instance(
+            task,
+            instance_group_name,
+            impact=impact,
+            capacity_type=capacity_type,
+            add_hybrid_control_cost=add_hybrid_control_cost,
+            strategy=PLACEMENT_STRATEGIES['most_remaining'],
+        )
 
     def find_largest_idle_instance(self, instance_group_name, capacity_type='execution'):
-        largest_instance = None
-        instances = self.instance_groups[instance_group_name].instances
-        for i in instances:
-            if i.node_type not in (capacity_type, 'hybrid'):
-                continue
-            if i.capacity <= 0:
-                # We don't want to select an idle instance with 0 capacity
-                continue
-            if (hasattr(i, 'jobs_running') and i.jobs_running == 0) or i.remaining_capacity == i.capacity:
-                if largest_instance is None:
-                    largest_instance = i
-                elif i.capacity > largest_instance.capacity:
-                    largest_instance = i
-        return largest_instance
+        return self.instance_groups[instance_group_name].place(LARGEST_IDLE_INSTANCE, 0, capacity_type)
 
     def get_instance_groups_from_task_cache(self, task):
         igs = []
@@ -261,6 +394,7 @@ class TaskManagerModels:
         # We want to avoid calls to settings over and over in loops, so cache this information here
         kwargs['control_task_impact'] = kwargs.get('control_task_impact', settings.AWX_CONTROL_NODE_TASK_IMPACT)
         kwargs['controlplane_ig_name'] = kwargs.get('controlplane_ig_name', settings.DEFAULT_CONTROL_PLANE_QUEUE_NAME)
+        kwargs['placement_strategy'] = kwargs.get('placement_strategy', settings.TASK_MANAGER_PLACEMENT_STRATEGY)
         self.instances = TaskManagerInstances(**kwargs)
         self.instance_groups = TaskManagerInstanceGroups(task_manager_instances=self.instances, **kwargs)
 
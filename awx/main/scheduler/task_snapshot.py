@@ -0,0 +1,128 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+from awx.main.models import UnifiedJob, WorkflowApproval
+
+logger = logging.getLogger('awx.main.scheduler')
+
+
+def tasks_queryset(filter_args):
+    """The unified jobs a task manager works on, filtered by filter_args"""
+    wf_approval_ctype_id = ContentType.objects.get_for_model(WorkflowApproval).id
+    return (
+        UnifiedJob.objects.filter(**filter_args)
+        .exclude(launch_type='sync')
+        .exclude(polymorphic_ctype_id=wf_approval_ctype_id)
+        .order_by('created')
+        .prefetch_related('dependent_jobs')
+    )
+
+
+class TaskSnapshot:
+    """
+    The pending, waiting and running tasks of the TaskManager, kept in memory
+    between task manager runs in the same process
+
+    Loading every active job with its dependencies is most of the cost of a
+    task manager run when thousands of jobs are pending, and between two runs
+    only a few of them change.  sync() reads the (id, modified, status,
+    dependencies_processed) of the active jobs, a query on the status index
+    that loads no model instances, and only loads the jobs that are new or
+    changed, and the jobs whose dependencies changed.
+
+    The jobs are model instances the task manager modifies as it works; if
+    its transaction is not committed (see commit()), or every
+    TASK_MANAGER_FULL_SYNC_INTERVAL seconds, all of them are loaded again.
+    """
+
+    STATUSES = ('pending', 'waiting', 'running')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.tasks = {}
+        # version of every active unified job seen by the last sync, tasks or not
+        self.versions = {}
+        # id of a dependency -> ids of the tasks that have it in dependent_jobs
+        self.dependents = {}
+        self.last_full_sync = None
+        self.committed = False
+        self.loaded = 0
+
+    def commit(self):
+        """Called once the transaction of the task manager run that used the tasks is committed"""
+        self.committed = True
+
+    @staticmethod
+    def version(task):
+        return (task.modified, task.status, task.dependencies_processed)
+
+    def active_versions(self):
+        """Return {id: (version, is a task)} for all active unified jobs"""
+        wf_approval_ctype_id = ContentType.objects.get_for_model(WorkflowApproval).id
+        rows = UnifiedJob.objects.filter(status__in=self.STATUSES).values_list(
+            'id', 'modified', 'status', 'dependencies_processed', 'launch_type', 'polymorphic_ctype_id'
+        )
+        return {
+            pk: ((modified, status, processed), processed and launch_type != 'sync' and ctype_id != wf_approval_ctype_id)
+            for pk, modified, status, processed, launch_type, ctype_id in rows
+        }
+
+    def add(self, tasks):
+        for task in tasks:
+            self.tasks[task.id] = task
+            for dep in task.dependent_jobs.all():
+                self.dependents.setdefault(dep.id, set()).add(task.id)
+
+    def full_sync(self):
+        self.clear()
+        # versions are read first, so a job changing while the tasks are
+        # loaded is at worst loaded again by the next sync
+        self.versions = {pk: version for pk, (version, _) in self.active_versions().items()}
+        self.add(tasks_queryset(dict(status__in=self.STATUSES, dependencies_processed=True)))
+        self.loaded = len(self.tasks)
+        self.last_full_sync = time.monotonic()
+
+    def incremental_sync(self):
+        current = self.active_versions()
+        reload = set()
+        for pk, task in list(self.tasks.items()):
+            version, is_task = current.get(pk, (None, False))
+            if version != self.version(task):
+                del self.tasks[pk]
+                if is_task:
+                    reload.add(pk)
+        # tasks that are blocked by, or fail because of, a dependency that
+        # changed or finished are loaded again with fresh dependent_jobs
+        for pk, version in self.versions.items():
+            if current.get(pk, (None,))[0] != version:
+                for task_id in self.dependents.pop(pk, ()):
+                    if self.tasks.pop(task_id, None) is not None:
+                        reload.add(task_id)
+        reload.update(pk for pk, (_, is_task) in current.items() if is_task and pk not in self.tasks)
+        self.versions = {pk: version for pk, (version, _) in current.items()}
+
+        if len(reload) > len(current) // 2:
+            # most of it changed, a plain reload is cheaper than a long id__in
+            self.full_sync()
+            return
+        if reload:
+            self.add(tasks_queryset(dict(id__in=reload, status__in=self.STATUSES, dependencies_processed=True)))
+        self.loaded = len(reload)
+
+    def sync(self):
+        """Bring the tasks up to date with the database, return them ordered by creation"""
+        full_sync_interval = getattr(settings, 'TASK_MANAGER_FULL_SYNC_INTERVAL', 300)
+        if not self.committed or self.last_full_sync is None or time.monotonic() - self.last_full_sync > full_sync_interval:
+            self.full_sync()
+        else:
+            self.incremental_sync()
+        # until the caller's transaction commits, the tasks may hold changes
+        # that were never saved
+        self.committed = False
+        logger.debug(f'Task manager loaded {self.loaded} of {len(self.tasks)} tasks from the database')
+        return sorted(self.tasks.values(), key=lambda task: (task.created, task.id))
@@ -20,16 +20,18 @@ def run_manager(manager, prefix):
     manager().schedule()
 
 
-@task(queue=get_task_queuename)
+# the managers look at all pending work, so a burst of schedule() calls only
+# needs one run
+@task(queue=get_task_queuename, priority='control', coalesce_key=True, coalesce_window=0.2)
 def task_manager():
     run_manager(TaskManager, "task")
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='control', coalesce_key=True, coalesce_window=0.2)
 def dependency_manager():
     run_manager(DependencyManager, "dependency")
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='control', coalesce_key=True, coalesce_window=0.2)
 def workflow_manager():
     run_manager(WorkflowManager, "workflow")
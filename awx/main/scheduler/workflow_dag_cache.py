@@ -0,0 +1,92 @@
+import logging
+
+from django.db.models import prefetch_related_objects
+
+from awx.main.models import WorkflowJobNode
+from awx.main.scheduler.dag_workflow import WorkflowDAG
+
+logger = logging.getLogger('awx.main.scheduler')
+
+
+class WorkflowDAGCache:
+    """
+    The WorkflowDAG of every running workflow job, kept in memory between
+    workflow manager runs in the same process
+
+    Building the DAG of a workflow job loads its nodes and edges, and the
+    scheduling decisions then load the job of every node one at a time, for
+    every running workflow on every run, while between two runs only the few
+    nodes whose job changed status matter.  get_dags() reads the
+    (job, do_not_run, unified job template, job status, job cancel flag) of
+    the nodes of all the cached workflows in one query, and only loads again
+    the nodes that differ from the ones in memory, with their job.
+
+    Only node and job state is cached: the unified job templates are not
+    loaded with the nodes, the workflow manager reads the templates of the
+    nodes it spawns fresh on every run, so edits made to them while the
+    workflow runs are not missed.
+
+    The nodes in memory are compared with the database on every run, so
+    changes made by a run whose transaction was rolled back are thrown away
+    too.  A DAG is evicted once its workflow job is no longer running.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # workflow job id -> WorkflowDAG
+        self.dags = {}
+        self.loaded = 0
+
+    def evict(self, workflow_job_id):
+        self.dags.pop(workflow_job_id, None)
+
+    @staticmethod
+    def state(node):
+        job = node.job
+        return (node.job_id, node.do_not_run, node.unified_job_template_id, job.status if job else None, job.cancel_flag if job else None)
+
+    def refresh(self):
+        """Load again the nodes of the cached DAGs that changed in the database"""
+        rows = WorkflowJobNode.objects.filter(workflow_job_id__in=self.dags.keys()).values_list(
+            'workflow_job_id', 'id', 'job_id', 'do_not_run', 'unified_job_template_id', 'job__status', 'job__cancel_flag'
+        )
+        current = {}
+        for workflow_job_id, pk, *state in rows:
+            current.setdefault(workflow_job_id, {})[pk] = tuple(state)
+
+        stale = []
+        for workflow_job_id, dag in list(self.dags.items()):
+            nodes = {n['node_object'].id: n['node_object'] for n in dag.nodes}
+            states = current.get(workflow_job_id, {})
+            if nodes.keys() != states.keys():
+                self.evict(workflow_job_id)
+                continue
+            stale.extend(pk for pk, node in nodes.items() if self.state(node) != states[pk])
+        if stale:
+            for node in WorkflowJobNode.objects.filter(id__in=stale).prefetch_related('job'):
+                self.dags[node.workflow_job_id].replace_node_object(node)
+        return len(stale)
+
+    def get_dags(self, workflow_jobs):
+        """Return {workflow job id: WorkflowDAG} for the workflow_jobs, up to date with the database"""
+        workflow_jobs = {wj.id: wj for wj in workflow_jobs}
+        for workflow_job_id in list(self.dags):
+            if workflow_job_id not in workflow_jobs:
+                self.evict(workflow_job_id)
+        self.loaded = self.refresh() if self.dags else 0
+
+        new = [wj for wj in workflow_jobs.values() if wj.id not in self.dags]
+        if new:
+            prefetch_related_objects(new, 'workflow_job_nodes__job')
+            for workflow_job in new:
+                self.dags[workflow_job.id] = WorkflowDAG(workflow_job)
+                self.loaded += len(self.dags[workflow_job.id])
+
+        for workflow_job_id, workflow_job in workflow_jobs.items():
+            # the nodes may outlive this copy of the workflow job, do not let them see an older one
+            for n in self.dags[workflow_job_id].nodes:
+                n['node_object'].workflow_job = workflow_job
+        logger.debug(f'Workflow manager loaded {self.loaded} workflow nodes from the database')
+        return {pk: self.dags[pk] for pk in workflow_jobs}
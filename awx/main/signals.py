@@ -430,34 +430,75 @@ def emit_activity_stream_change(instance):
     )
 
 
+def _activity_stream_create_entry(instance):
+    """Return the unsaved activity stream entry recording the creation of instance, or None"""
+    _type = type(instance)
+    if getattr(_type, '_deferred', False):
+        return None
+    object1 = camelcase_to_underscore(instance.__class__.__name__)
+    changes = model_to_dict(instance, model_serializer_mapping())
+    # Special case where Job survey password variables need to be hidden
+    if type(instance) == Job:
+        changes['credentials'] = ['{} ({})'.format(c.name, c.id) for c in instance.credentials.iterator()]
+        changes['labels'] = [label.name for label in instance.labels.iterator()]
+        if 'extra_vars' in changes:
+            changes['extra_vars'] = instance.display_extra_vars()
+    if type(instance) == OAuth2AccessToken:
+        changes['token'] = CENSOR_VALUE
+    return get_activity_stream_class()(operation='create', object1=object1, changes=json.dumps(changes), actor=get_current_user_or_none())
+
+
 def activity_stream_create(sender, instance, created, **kwargs):
     if created and activity_stream_enabled:
-        _type = type(instance)
-        if getattr(_type, '_deferred', False):
+        activity_entry = _activity_stream_create_entry(instance)
+        if activity_entry is None:
             return
-        object1 = camelcase_to_underscore(instance.__class__.__name__)
-        changes = model_to_dict(instance, model_serializer_mapping())
-        # Special case where Job survey password variables need to be hidden
-        if type(instance) == Job:
-            changes['credentials'] = ['{} ({})'.format(c.name, c.id) for c in instance.credentials.iterator()]
-            changes['labels'] = [label.name for label in instance.labels.iterator()]
-            if 'extra_vars' in changes:
-                changes['extra_vars'] = instance.display_extra_vars()
-        if type(instance) == OAuth2AccessToken:
-            changes['token'] = CENSOR_VALUE
-        activity_entry = get_activity_stream_class()(operation='create', object1=object1, changes=json.dumps(changes), actor=get_current_user_or_none())
         # TODO: Weird situation where cascade SETNULL doesn't work
         #      it might actually be a good idea to remove all of these FK references since
         #      we don't really use them anyway.
         if instance._meta.model_name != 'setting':  # Is not conf.Setting instance
             activity_entry.save()
-            getattr(activity_entry, object1).add(instance.pk)
+            getattr(activity_entry, activity_entry.object1).add(instance.pk)
         else:
             activity_entry.setting = conf_to_dict(instance)
             activity_entry.save()
         connection.on_commit(lambda: emit_activity_stream_change(activity_entry))
 
 
+def activity_stream_create_bulk(instances):
+    """
+    Record the creation of many instances like activity_stream_create, with
+    one insert for all of the entries and one per model for their relations
+    to the instances.  Not for conf.Setting instances.
+    """
+    if not activity_stream_enabled:
+        return
+    entries = []
+    for instance in instances:
+        activity_entry = _activity_stream_create_entry(instance)
+        if activity_entry is not None:
+            activity_entry.set_denormalized_fields()
+            entries.append((activity_entry, instance))
+    if not entries:
+        return
+    activity_stream_class = get_activity_stream_class()
+    activity_stream_class.objects.bulk_create([activity_entry for activity_entry, _ in entries])
+    relations = {}
+    for activity_entry, instance in entries:
+        field = activity_stream_class._meta.get_field(activity_entry.object1)
+        relations.setdefault(field, []).append(
+            field.remote_field.through(**{f'{field.m2m_field_name()}_id': activity_entry.pk, f'{field.m2m_reverse_field_name()}_id': instance.pk})
+        )
+    for field, rows in relations.items():
+        field.remote_field.through.objects.bulk_create(rows)
+
+    def emit():
+        for activity_entry, _ in entries:
+            emit_activity_stream_change(activity_entry)
+
+    connection.on_commit(emit)
+
+
 def activity_stream_update(sender, instance, **kwargs):
     if instance.id is None:
         return
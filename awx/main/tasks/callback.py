@@ -14,6 +14,7 @@ from awx.main.redact import UriCleaner
 from awx.main.constants import MINIMAL_EVENTS, ANSIBLE_RUNNER_NEEDS_UPDATE_MESSAGE
 from awx.main.utils.update_model import update_model
 from awx.main.queue import CallbackQueueDispatcher
+import awx.main.analytics.subsystem_metrics as s_metrics
 
 logger = logging.getLogger('awx.main.tasks.callback')
 
@@ -28,6 +29,7 @@ class RunnerCallback:
         self.dispatcher = CallbackQueueDispatcher()
         self.safe_env = {}
         self.event_ct = 0
+        self.websocket_messages_skipped = 0
         self.model = model
         self.update_attempts = int(getattr(settings, 'DISPATCHER_DB_DOWNTOWN_TOLLERANCE', settings.DISPATCHER_DB_DOWNTIME_TOLERANCE) / 5)
         self.wrapup_event_dispatched = False
@@ -130,7 +132,12 @@ class RunnerCallback:
             event_data['event_data']['guid'] = self.guid
 
         # To prevent overwhelming the broadcast queue, skip some websocket messages
-        if self.recent_event_timings:
+        if self.dispatcher.backpressure and event_data.get('event') not in MINIMAL_EVENTS:
+            # the callback receiver is falling behind, leave it only the work of saving events
+            event_data.setdefault('event_data', {})
+            event_data['skip_websocket_message'] = True
+            self.websocket_messages_skipped += 1
+        elif self.recent_event_timings:
             cpu_time = time.time()
             first_window_time = self.recent_event_timings[0]
             last_window_time = self.recent_event_timings[-1]
@@ -186,6 +193,13 @@ class RunnerCallback:
         }
         event_data.setdefault(self.event_data_key, self.instance.id)
         self.dispatcher.dispatch(event_data)
+        # push any buffered events now, so that EOF is never left waiting behind a timer
+        self.dispatcher.flush()
+        if self.websocket_messages_skipped:
+            try:
+                s_metrics.CallbackReceiverMetrics(auto_pipe_execute=True).inc('callback_receiver_backpressure_skipped_websocket', self.websocket_messages_skipped)
+            except Exception:
+                logger.exception('Failed to record backpressure metrics')
         if self.wrapup_event_type == 'EOF':
             self.wrapup_event_dispatched = True
 
@@ -1708,6 +1708,8 @@ class RunInventoryUpdate(SourceControlMixin, BaseTask):
         except Exception:
             logger.exception('Exception saving {} content, rolling back changes.'.format(inventory_update.log_format))
             raise PostRunError('Error occured while saving inventory data, see traceback or server logs', status='error', tb=traceback.format_exc())
+        finally:
+            self.runner_callback.dispatcher.flush()
 
 
 @task(queue=get_task_queuename)
@@ -52,6 +52,7 @@ from awx.main.models import (
     Inventory,
     SmartInventoryMembership,
     Job,
+    DispatcherPayload,
     convert_jsonfields,
 )
 from awx.main.constants import ACTIVE_STATES, ERROR_STATES
@@ -134,7 +135,7 @@ def inform_cluster_of_shutdown():
         logger.exception('Encountered problem with normal shutdown signal.')
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='bulk')
 def migrate_jsonfield(table, pkfield, columns):
     batchsize = 10000
     with advisory_lock(f'json_migration_{table}', wait=False) as acquired:
@@ -364,13 +365,13 @@ def send_notifications(notification_list, job_id=None):
                 logger.exception('Error saving notification {} result.'.format(notification.id))
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='bulk')
 def gather_analytics():
     if is_run_threshold_reached(getattr(settings, 'AUTOMATION_ANALYTICS_LAST_GATHER', None), settings.AUTOMATION_ANALYTICS_GATHER_INTERVAL):
         analytics.gather()
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='bulk', coalesce_key=True)
 def purge_old_stdout_files():
     nowtime = time.time()
     for f in os.listdir(settings.JOBOUTPUT_ROOT):
@@ -418,11 +419,19 @@ def handle_removed_image(remove_images=None):
     _cleanup_images_and_files(remove_images=remove_images, file_pattern='')
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='bulk')
 def cleanup_images_and_files():
     _cleanup_images_and_files(image_prune=True)
 
 
+@task(queue=get_task_queuename, priority='bulk', coalesce_key=True)
+def cleanup_dispatcher_payloads():
+    """Delete the stored arguments of oversized dispatcher messages once they expire"""
+    deleted, _ = DispatcherPayload.objects.filter(created__lt=now() - timedelta(seconds=settings.DISPATCHER_PAYLOAD_EXPIRE_TIME)).delete()
+    if deleted:
+        logger.info(f'Deleted {deleted} unconsumed dispatcher payloads')
+
+
 @task(queue=get_task_queuename)
 def cluster_node_health_check(node):
     """
@@ -559,7 +568,7 @@ def inspect_execution_and_hop_nodes(instance_list):
                     execution_node_health_check.apply_async([hostname])
 
 
-@task(queue=get_task_queuename, bind_kwargs=['dispatch_time', 'worker_tasks'])
+@task(queue=get_task_queuename, bind_kwargs=['dispatch_time', 'worker_tasks'], priority='control')
 def cluster_node_heartbeat(dispatch_time=None, worker_tasks=None):
     logger.debug("Cluster node heartbeat task.")
     nowtime = now()
@@ -657,7 +666,7 @@ def cluster_node_heartbeat(dispatch_time=None, worker_tasks=None):
             reaper.reap_waiting(instance=this_inst, excluded_uuids=active_task_ids, ref_time=datetime.fromisoformat(dispatch_time))
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='control')
 def awx_receptor_workunit_reaper():
     """
     When an AWX job is launched via receptor, files such as status, stdin, and stdout are created
@@ -718,7 +727,7 @@ def awx_k8s_reaper():
                 logger.exception("Failed to delete orphaned pod {} from {}".format(job.log_format, group))
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='control')
 def awx_periodic_scheduler():
     lock_session_timeout_milliseconds = settings.TASK_MANAGER_LOCK_TIMEOUT * 1000
     with advisory_lock('awx_periodic_scheduler_lock', lock_session_timeout_milliseconds=lock_session_timeout_milliseconds, wait=False) as acquired:
@@ -792,7 +801,7 @@ def handle_failure_notifications(task_ids):
         logger.warning(f'Could not send notifications for {deleted_tasks} because they were not found in the database')
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, coalesce_key=True)
 def update_inventory_computed_fields(inventory_id):
     """
     Signal handler and wrapper around inventory.update_computed_fields to
@@ -842,7 +851,7 @@ def update_smart_memberships_for_inventory(smart_inventory):
     return False
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, coalesce_key=True)
 def update_host_smart_inventory_memberships():
     smart_inventories = Inventory.objects.filter(kind='smart', host_filter__isnull=False, pending_deletion=False)
     changed_inventories = set([])
@@ -858,7 +867,7 @@ def update_host_smart_inventory_memberships():
         smart_inventory.update_computed_fields()
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='bulk')
 def delete_inventory(inventory_id, user_id, retries=5):
     # Delete inventory as user
     if user_id is None:
@@ -975,7 +984,7 @@ def deep_copy_model_obj(model_module, model_name, obj_pk, new_obj_pk, user_pk, p
         update_inventory_computed_fields.delay(new_obj.id)
 
 
-@task(queue=get_task_queuename)
+@task(queue=get_task_queuename, priority='bulk')
 def periodic_resource_sync():
     if not getattr(settings, 'RESOURCE_SERVER', None):
         logger.debug("Skipping periodic resource_sync, RESOURCE_SERVER not configured")
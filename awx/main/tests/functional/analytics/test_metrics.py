@@ -1,8 +1,14 @@
+import json
+
 import pytest
 
+import prometheus_client
 from prometheus_client.parser import text_string_to_metric_families
+from prometheus_client.registry import CollectorRegistry
 from awx.main import models
 from awx.main.analytics.metrics import metrics
+from awx.main.analytics.subsystem_metrics import CustomToPrometheusMetricsCollector, DispatcherMetrics, LabeledFloatHistogramM
+from awx.main.dispatch.ledger import TaskLedger
 from awx.api.versioning import reverse
 
 EXPECTED_VALUES = {
@@ -76,3 +82,80 @@ def test_metrics_http_methods(get, post, patch, put, options, admin):
     assert patch(get_metrics_view_db_only(), user=admin).status_code == 405
     assert post(get_metrics_view_db_only(), user=admin).status_code == 405
     assert options(get_metrics_view_db_only(), user=admin).status_code == 200
+
+
+class FakeRedisHash:
+    def __init__(self):
+        self.fields = {}
+
+    def hincrby(self, key, field, value):
+        self.fields[field.encode('utf-8')] = self.fields.get(field.encode('utf-8'), 0) + value
+
+    hincrbyfloat = hincrby
+
+    def hset(self, key, field, value):
+        self.fields[field.encode('utf-8')] = value
+
+    def hget(self, key, field):
+        value = self.fields.get(field.encode('utf-8'))
+        return None if value is None else str(value).encode('utf-8')
+
+    def hgetall(self, key):
+        return {field: str(value).encode('utf-8') for field, value in self.fields.items()}
+
+    def hkeys(self, key):
+        return list(self.fields)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.fields.pop(field, None)
+
+
+def test_labeled_histogram():
+    conn = FakeRedisHash()
+    histogram = LabeledFloatHistogramM('dispatcher_task_execution_seconds', 'Time workers spent running tasks', [1, 5], 'task')
+    histogram.observe(0.5, 'awx.main.tasks.system.gather_analytics')
+    histogram.observe(3.0, 'awx.main.tasks.system.gather_analytics')
+    histogram.observe(10.0, 'awx.main.scheduler.tasks.task_manager')
+    histogram.store_value(conn)
+
+    data = histogram.decode(conn)
+    assert data == {
+        'awx.main.tasks.system.gather_analytics': {'counts': [1, 1], 'sum': 3.5, 'inf': 2},
+        'awx.main.scheduler.tasks.task_manager': {'counts': [0, 0], 'sum': 10.0, 'inf': 1},
+    }
+
+    families = list(text_string_to_metric_families(histogram.to_prometheus({'awx_1': {histogram.field: data}})))
+    buckets = {(s.labels['task'], s.labels['le']): s.value for s in families[0].samples if s.name == 'dispatcher_task_execution_seconds_bucket'}
+    assert buckets[('awx.main.tasks.system.gather_analytics', '5')] == 2
+    assert buckets[('awx.main.scheduler.tasks.task_manager', '5')] == 0
+    assert buckets[('awx.main.scheduler.tasks.task_manager', '+Inf')] == 1
+
+    histogram.reset_value(conn)
+    assert histogram.decode(conn) == {}
+
+
+def test_collector_exports_labeled_histogram(mocker, settings):
+    ledger = TaskLedger()
+    ledger.record('awx.main.tasks.system.gather_analytics', 0.05, 0.5, 3.0)
+    ledger.record('awx.main.tasks.system.gather_analytics', 0.05, 0.5, 45.0)
+    metrics_obj = DispatcherMetrics()
+    metrics_obj.conn = FakeRedisHash()
+    ledger.export(metrics_obj)
+    for metric in metrics_obj.METRICS.values():
+        metric.store_value(metrics_obj.conn)
+    instance_data = {settings.CLUSTER_HOST_ID: json.loads(metrics_obj.serialize_local_metrics())}
+    mocker.patch.object(metrics_obj, 'load_other_metrics', return_value=instance_data)
+
+    registry = CollectorRegistry()
+    registry.register(CustomToPrometheusMetricsCollector(metrics_obj))
+    families = {family.name: family for family in text_string_to_metric_families(prometheus_client.generate_latest(registry).decode('utf-8'))}
+
+    samples = {(s.name, s.labels.get('le')): s.value for s in families['dispatcher_task_execution_seconds'].samples}
+    assert all(s.labels['task'] == 'awx.main.tasks.system.gather_analytics' for s in families['dispatcher_task_execution_seconds'].samples)
+    assert samples[('dispatcher_task_execution_seconds_bucket', '5')] == 1
+    assert samples[('dispatcher_task_execution_seconds_bucket', '120')] == 2
+    assert samples[('dispatcher_task_execution_seconds_bucket', '+Inf')] == 2
+    assert samples[('dispatcher_task_execution_seconds_count', None)] == 2
+    assert samples[('dispatcher_task_execution_seconds_sum', None)] == 48.0
+    assert families['dispatcher_normal_tasks_started'].samples[0].value == 2
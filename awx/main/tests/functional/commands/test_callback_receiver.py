@@ -1,9 +1,12 @@
+import json
 import pytest
+import tempfile
 import time
 from unittest import mock
 from uuid import uuid4
 
-from django.test import TransactionTestCase
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
 
 from awx.main.dispatch.worker.callback import job_stats_wrapup, CallbackBrokerWorker
 
@@ -55,7 +58,7 @@ class FakeRedis:
 class TestCallbackBrokerWorker(TransactionTestCase):
     @pytest.fixture(autouse=True)
     def turn_off_websockets(self):
-        with mock.patch('awx.main.dispatch.worker.callback.emit_event_detail', lambda *a, **kw: None):
+        with mock.patch('awx.main.dispatch.worker.callback.emit_event_details', lambda *a, **kw: None):
             yield
 
     def get_worker(self):
@@ -116,6 +119,119 @@ class TestCallbackBrokerWorker(TransactionTestCase):
         assert worker.buff.get(InventoryUpdateEvent, []) == []
         assert InventoryUpdateEvent.objects.filter(uuid=events[0].uuid).count() == 0  # sanity
 
+    @override_settings(JOB_EVENT_PERSISTENCE_METHOD='copy')
+    def test_copy_falls_back_to_bulk_create(self):
+        # COPY FROM STDIN is postgres-only, tests use sqlite3
+        worker = self.get_worker()
+        events = [InventoryUpdateEvent(uuid=str(uuid4()), **self.event_create_kwargs())]
+        worker.buff = {InventoryUpdateEvent: events.copy()}
+        with mock.patch('awx.main.dispatch.worker.callback.copy_events') as copy_mock:
+            worker.flush()
+        copy_mock.assert_not_called()
+        assert InventoryUpdateEvent.objects.filter(uuid=events[0].uuid).count() == 1
+
+    @override_settings(JOB_EVENT_PERSISTENCE_METHOD='copy')
+    def test_copy_error_saves_individually(self):
+        worker = self.get_worker()
+        events = [InventoryUpdateEvent(uuid=str(uuid4()), **self.event_create_kwargs())]
+        worker.buff = {InventoryUpdateEvent: events.copy()}
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with mock.patch('awx.main.dispatch.worker.callback.copy_events', side_effect=ValueError) as copy_mock:
+                worker.flush()
+        copy_mock.assert_called_once()
+        assert worker.buff.get(InventoryUpdateEvent, []) == []
+        assert InventoryUpdateEvent.objects.filter(uuid=events[0].uuid).count() == 1
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY FROM STDIN requires PostgreSQL')
+    @override_settings(JOB_EVENT_PERSISTENCE_METHOD='copy')
+    def test_copy_saves_events(self):
+        worker = self.get_worker()
+        kwargs = self.event_create_kwargs()
+        events = [InventoryUpdateEvent(uuid=str(uuid4()), stdout=f'line {i}', counter=i, job_created=kwargs['created'], **kwargs) for i in range(3)]
+        worker.buff = {InventoryUpdateEvent: events.copy()}
+        with mock.patch.object(InventoryUpdateEvent, 'save', side_effect=AssertionError('COPY should not fall back to individual saves')):
+            worker.flush()
+        assert worker.buff.get(InventoryUpdateEvent, []) == []
+        assert all(e.pk is not None for e in events)
+        saved = InventoryUpdateEvent.objects.filter(uuid__in=[e.uuid for e in events])
+        assert sorted(saved.values_list('pk', flat=True)) == sorted(e.pk for e in events)
+        assert sorted(saved.values_list('stdout', flat=True)) == ['line 0', 'line 1', 'line 2']
+
+    def test_read_single_event(self):
+        worker = self.get_worker()
+        worker.redis = mock.MagicMock()
+        worker.redis.blpop.return_value = ('callback_tasks', json.dumps({'counter': 1}).encode())
+        assert worker.read(None) == {'counter': 1}
+        worker.redis.pipeline.assert_not_called()
+
+        worker.redis.blpop.return_value = None
+        assert worker.read(None) == {'event': 'FLUSH'}
+
+    @override_settings(JOB_EVENT_READ_BATCH_SIZE=3)
+    def test_read_batch_of_events(self):
+        worker = self.get_worker()
+        worker.redis = mock.MagicMock()
+        pipe = worker.redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.return_value = [[json.dumps({'counter': i}).encode() for i in range(3)], True]
+
+        assert [worker.read(None) for i in range(3)] == [{'counter': 0}, {'counter': 1}, {'counter': 2}]
+        pipe.lrange.assert_called_once_with('callback_tasks', 0, 2)
+        pipe.ltrim.assert_called_once_with('callback_tasks', 3, -1)
+        pipe.execute.assert_called_once()
+        worker.redis.blpop.assert_not_called()
+        assert worker.total == 3
+
+    @override_settings(JOB_EVENT_READ_BATCH_SIZE=3)
+    def test_read_batch_empty_queue_blocks(self):
+        worker = self.get_worker()
+        worker.redis = mock.MagicMock()
+        worker.redis.pipeline.return_value.__enter__.return_value.execute.return_value = [[], True]
+        worker.redis.blpop.return_value = None
+        assert worker.read(None) == {'event': 'FLUSH'}
+        worker.redis.blpop.assert_called_once_with(['callback_tasks'], timeout=1)
+
+    @override_settings(JOB_EVENT_QUEUE_SHARDING=True, JOB_EVENT_WORKERS=3)
+    def test_sharded_queue_ownership(self):
+        owned = []
+        for idx in range(3):
+            worker = self.get_worker()
+            with mock.patch('awx.main.dispatch.worker.base.BaseWorker.work_loop'):
+                worker.work_loop(None, None, idx)
+            owned.append(worker.queue_names)
+        assert owned == [['callback_tasks_0', 'callback_tasks'], ['callback_tasks_1'], ['callback_tasks_2']]
+
+    def test_spill_and_replay(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            with override_settings(JOB_EVENT_SPILL_DIR=spill_dir):
+                worker = self.get_worker()
+                with mock.patch('awx.main.dispatch.worker.base.BaseWorker.work_loop'):
+                    worker.work_loop(None, None, 0)
+                assert worker.spill_pending is False
+
+                events = [InventoryUpdateEvent(uuid=str(uuid4()), stdout='spilled', **self.event_create_kwargs())]
+                events[0]._skip_websocket_message = True
+                worker.buff = {InventoryUpdateEvent: events}
+                with mock.patch.object(worker, 'flush', side_effect=ValueError('database is down')), mock.patch('time.sleep'):
+                    worker.perform_work({'event': 'FLUSH'})
+                assert worker.buff == {}
+                assert worker.spill_pending is True
+                assert InventoryUpdateEvent.objects.filter(uuid=events[0].uuid).count() == 0
+
+                worker.perform_work({'event': 'FLUSH'})
+                assert worker.spill_pending is False
+                assert worker.spill.size == 0
+                saved = InventoryUpdateEvent.objects.get(uuid=events[0].uuid)
+                assert saved.stdout == 'spilled'
+                assert saved.inventory_update_id == events[0].inventory_update_id
+
+    def test_clear_statistics(self):
+        with mock.patch('redis.Redis.from_url') as from_url:
+            from_url.return_value.keys.return_value = [b'awx_callback_receiver_statistics_1']
+            CallbackBrokerWorker(clear_statistics=False)
+            from_url.return_value.delete.assert_not_called()
+            CallbackBrokerWorker()
+            from_url.return_value.delete.assert_called_once_with(b'awx_callback_receiver_statistics_1')
+
     def test_flush_with_empty_buffer(self):
         worker = self.get_worker()
         worker.buff = {InventoryUpdateEvent: []}
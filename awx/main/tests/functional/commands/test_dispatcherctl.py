@@ -0,0 +1,28 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from awx.main.dispatch.ledger import TaskLedger
+
+
+def test_dispatcherctl_stats():
+    ledger = TaskLedger()
+    ledger.record('awx.main.tasks.system.gather_analytics', 0.1, 0.2, 30.0)
+    ledger.record('awx.main.scheduler.tasks.task_manager', 0.1, 0.2, 1.0)
+    ledger.record('awx.main.scheduler.tasks.task_manager', None, None, 2.0)
+    stats = json.loads(json.dumps(ledger.stats()))
+
+    out = StringIO()
+    with mock.patch('awx.main.management.commands.dispatcherctl.Control.stats', return_value=stats):
+        call_command('dispatcherctl', 'stats', stdout=out)
+    lines = out.getvalue().splitlines()
+    # sorted by the time spent running the task
+    assert lines[1].split()[:3] == ['awx.main.tasks.system.gather_analytics', '1', '30.000']
+    assert lines[2].split()[:3] == ['awx.main.scheduler.tasks.task_manager', '2', '3.000']
+
+    out = StringIO()
+    with mock.patch('awx.main.management.commands.dispatcherctl.Control.stats', return_value=stats):
+        call_command('dispatcherctl', 'stats', '--json', stdout=out)
+    assert json.loads(out.getvalue()) == stats
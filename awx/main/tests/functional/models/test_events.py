@@ -3,9 +3,11 @@ import pytest
 
 from django.utils.timezone import now
 
+from django.db import connection
 from django.db.models import Q
 
 from awx.main.models import Job, JobEvent, Inventory, Host, JobHostSummary, HostMetric
+from awx.main.models.events import emit_event_details
 
 
 @pytest.mark.django_db
@@ -52,6 +54,23 @@ class TestEvents:
         for e in events.all():
             assert e.failed is True
 
+    @pytest.mark.parametrize('batch', [True, False])
+    def test_emit_event_details(self, settings, batch):
+        settings.JOB_EVENT_BROADCAST_BATCH = batch
+        jobs = [Job.objects.create(), Job.objects.create()]
+        events = [JobEvent(id=i, job_id=jobs[i % 2].id, uuid=str(i), counter=i, created=now(), event='runner_on_ok') for i in range(5)]
+        with mock.patch('awx.main.consumers.emit_channel_notification') as emit:
+            with mock.patch('awx.main.consumers.emit_channel_notification_batch') as emit_batch:
+                emit_event_details(events)
+        if batch:
+            emit.assert_not_called()
+            assert [c.args[0] for c in emit_batch.call_args_list] == [f'job_events-{jobs[0].id}', f'job_events-{jobs[1].id}']
+            assert [p['counter'] for p in emit_batch.call_args_list[0].args[1]] == [0, 2, 4]
+            assert [p['counter'] for p in emit_batch.call_args_list[1].args[1]] == [1, 3]
+        else:
+            emit_batch.assert_not_called()
+            assert [c.args[1]['counter'] for c in emit.call_args_list] == [0, 1, 2, 3, 4]
+
     def test_host_summary_generation(self):
         self._generate_hosts(100)
         self._create_job_event(ok=dict((hostname, len(hostname)) for hostname in self.hostnames))
@@ -113,6 +132,41 @@ class TestEvents:
                 assert h.last_job_id is None
                 assert h.last_job_host_summary_id is None
 
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='the set-based host summary wrapup requires PostgreSQL')
+    def test_host_summary_generation_sql(self):
+        self._generate_hosts(10)
+        Host.objects.get(name='Host 9').delete()
+        other_job = Job.objects.create(inventory=self.inventory)
+        Host.objects.filter(name='Host 8').update(last_job=other_job)
+
+        with mock.patch.object(JobEvent, '_save_host_summaries_orm', side_effect=AssertionError('PostgreSQL should not fall back to the ORM path')):
+            self._create_job_event(
+                ok=dict((hostname, len(hostname)) for hostname in self.hostnames[0:7] + self.hostnames[9:]),
+                failures={'Host 1': 2},
+                dark={'Host 2': 1},
+            )
+
+        summaries = {s.host_name: s for s in self.job.job_host_summaries.all()}
+        assert sorted(summaries) == sorted(self.hostnames[0:7] + self.hostnames[9:])
+        assert summaries['Host 0'].ok == len('Host 0')
+        assert summaries['Host 0'].failed is False
+        assert summaries['Host 1'].failures == 2
+        assert summaries['Host 1'].failed is True
+        assert summaries['Host 2'].dark == 1
+        assert summaries['Host 2'].failed is True
+        assert summaries['Host 9'].host_id is None
+
+        for host in Host.objects.all():
+            if host.name in summaries:
+                assert host.last_job_id == self.job.id
+                assert host.last_job_host_summary_id == summaries[host.name].id
+            elif host.name == 'Host 8':
+                assert host.last_job_id == other_job.id
+                assert host.last_job_host_summary_id is None
+            else:
+                assert host.last_job_id is None
+                assert host.last_job_host_summary_id is None
+
     def test_host_metrics_insert(self):
         self._generate_hosts(10)
 
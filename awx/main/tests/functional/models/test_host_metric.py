@@ -70,3 +70,24 @@ def test_soft_restore():
                 assert hm.last_deleted is None
             else:
                 assert hm.last_deleted == current_time
+
+
+@pytest.mark.django_db
+def test_record_automation():
+    current_time = now()
+    HostMetric.objects.create(hostname="Host 1", last_automation=current_time, automated_counter=5, deleted=True)
+
+    later = now()
+    # duplicates are counted once, batches smaller than the input are all applied
+    HostMetric.objects.record_automation(["Host 3", "Host 1", "Host 2", "Host 1"], automated_at=later, batch_size=2)
+
+    assert HostMetric.objects.count() == 3
+    hm = HostMetric.objects.get(hostname="Host 1")
+    assert hm.automated_counter == 6
+    assert hm.deleted is False
+    assert hm.last_automation == later
+    for hostname in ("Host 2", "Host 3"):
+        hm = HostMetric.objects.get(hostname=hostname)
+        assert hm.automated_counter == 1
+        assert hm.deleted_counter == 0
+        assert hm.last_automation == later
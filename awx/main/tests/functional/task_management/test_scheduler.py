@@ -3,6 +3,7 @@ from unittest import mock
 import json
 from datetime import timedelta
 
+from awx.main.dispatch.publish import publish_batch
 from awx.main.scheduler import TaskManager, DependencyManager, WorkflowManager
 from awx.main.utils import encrypt_field
 from awx.main.models import WorkflowJobTemplate, JobTemplate, Job
@@ -76,6 +77,28 @@ class TestJobLifeCycle:
         # no further action is necessary, so rescheduling should not happen
         self.run_tm(WorkflowManager(), [mock.call('successful')])
 
+    def test_workflow_fan_out_spawned_together(self, inventory, project, controlplane_instance_group):
+        jt = JobTemplate.objects.create(allow_simultaneous=True, inventory=inventory, project=project, playbook='helloworld.yml')
+        wfjt = WorkflowJobTemplate.objects.create(name='foo')
+        root = wfjt.workflow_nodes.create(unified_job_template=jt, identifier='root')
+        for i in range(10):
+            root.success_nodes.add(wfjt.workflow_nodes.create(unified_job_template=jt))
+        wj = wfjt.create_unified_job()
+        wj.status = 'running'
+        wj.save()
+        root_node = wj.workflow_nodes.get(identifier='root')
+        root_node.job = Job.objects.create(name='root', status='successful')
+        root_node.save()
+
+        with mock.patch('awx.main.models.workflow.WorkflowJobNode.save') as node_save:
+            self.run_tm(WorkflowManager())
+        # node links are saved with one bulk update
+        assert node_save.call_count == 0
+        spawned = [n.job for n in wj.workflow_nodes.exclude(pk=root_node.pk)]
+        assert all(job is not None and job.status == 'pending' for job in spawned)
+        for job in spawned:
+            assert [entry.operation for entry in job.activitystream_set.all()] == ['create']
+
     def test_task_manager_workflow_workflow_rescheduling(self, controlplane_instance_group):
         wfjts = [WorkflowJobTemplate.objects.create(name='foo')]
         for i in range(5):
@@ -526,3 +549,24 @@ def test_generate_dependencies_only_once(job_template_factory):
         dm.generate_dependencies = mock.MagicMock(return_value=[])
         dm.schedule()
         dm.generate_dependencies.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_started_jobs_saved_and_submitted_together(hybrid_instance, job_template_factory, mocker):
+    objects = job_template_factory('jt', organization='org1', project='proj', inventory='inv', credential='cred')
+    objects.job_template.allow_simultaneous = True
+    objects.job_template.save()
+    jobs = [create_job(objects.job_template) for _ in range(3)]
+    batch = mocker.patch('awx.main.scheduler.task_manager.publish_batch', wraps=publish_batch)
+    apply_async = mocker.patch('awx.main.tasks.jobs.RunJob.apply_async')
+    tm = TaskManager()
+    tm.schedule()
+    batch.assert_called_once()
+    assert apply_async.call_count == 3
+    for job in jobs:
+        job.refresh_from_db()
+        assert job.status == 'waiting'
+        assert job.controller_node == job.execution_node == hybrid_instance.hostname
+        assert job.instance_group == hybrid_instance.rampart_groups.first()
+        apply_async.assert_any_call([job.pk], {}, queue=hybrid_instance.hostname, uuid=job.celery_task_id)
+    assert tm.subsystem_metrics.get('task_manager_tasks_started_per_second') > 0
@@ -0,0 +1,83 @@
+import pytest
+
+from awx.main.models import Job, ProjectUpdate
+from awx.main.scheduler.task_snapshot import TaskSnapshot
+from . import create_job
+
+
+def sync(snapshot):
+    tasks = snapshot.sync()
+    snapshot.commit()
+    return tasks
+
+
+@pytest.mark.django_db
+class TestTaskSnapshot:
+    @pytest.fixture
+    def job_template(self, job_template_factory):
+        return job_template_factory('jt', organization='org1', project='proj', inventory='inv', credential='cred').job_template
+
+    def test_only_changes_are_loaded(self, job_template):
+        jobs = [create_job(job_template) for _ in range(4)]
+        create_job(job_template, dependencies_processed=False)
+        snapshot = TaskSnapshot()
+        assert sync(snapshot) == jobs
+        assert snapshot.loaded == 4
+
+        assert sync(snapshot) == jobs
+        assert snapshot.loaded == 0
+
+        jobs[0].status = 'running'
+        jobs[0].save()
+        jobs[1].status = 'successful'
+        jobs[1].save()
+        new_job = create_job(job_template)
+        tasks = sync(snapshot)
+        assert tasks == [jobs[0]] + jobs[2:] + [new_job]
+        assert tasks[0].status == 'running'
+        assert snapshot.loaded == 2
+
+    def test_changes_from_queryset_updates_are_loaded(self, job_template):
+        jobs = [create_job(job_template) for _ in range(3)]
+        unprocessed = create_job(job_template, dependencies_processed=False)
+        snapshot = TaskSnapshot()
+        sync(snapshot)
+        # like the DependencyManager, which does not update modified
+        Job.objects.filter(pk=unprocessed.pk).update(dependencies_processed=True)
+        assert sync(snapshot) == jobs + [unprocessed]
+        assert snapshot.loaded == 1
+
+    def test_dependency_change_reloads_dependents(self, job_template):
+        jobs = [create_job(job_template) for _ in range(3)]
+        project_update = ProjectUpdate.objects.create(project=job_template.project, status='running')
+        jobs[0].dependent_jobs.add(project_update)
+        snapshot = TaskSnapshot()
+        sync(snapshot)
+        assert [dep.status for dep in snapshot.tasks[jobs[0].id].dependent_jobs.all()] == ['running']
+
+        project_update.status = 'failed'
+        project_update.save()
+        sync(snapshot)
+        assert snapshot.loaded == 1
+        assert [dep.status for dep in snapshot.tasks[jobs[0].id].dependent_jobs.all()] == ['failed']
+
+    def test_full_sync_unless_committed(self, job_template):
+        jobs = [create_job(job_template) for _ in range(3)]
+        snapshot = TaskSnapshot()
+        sync(snapshot)
+        tasks = snapshot.sync()
+        # changes made by a task manager run that was rolled back are thrown away
+        tasks[0].status = 'waiting'
+        tasks = snapshot.sync()
+        assert snapshot.loaded == 3
+        assert [t.status for t in tasks] == ['pending'] * 3
+        assert tasks == jobs
+
+    def test_full_sync_interval(self, job_template, settings):
+        for _ in range(3):
+            create_job(job_template)
+        settings.TASK_MANAGER_FULL_SYNC_INTERVAL = 0
+        snapshot = TaskSnapshot()
+        sync(snapshot)
+        sync(snapshot)
+        assert snapshot.loaded == 3
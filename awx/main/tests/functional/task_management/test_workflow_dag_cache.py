@@ -0,0 +1,74 @@
+import pytest
+
+from awx.main.models import Job, JobTemplate, WorkflowJobTemplate
+from awx.main.scheduler import WorkflowManager
+from awx.main.scheduler.workflow_dag_cache import WorkflowDAGCache
+
+
+@pytest.mark.django_db
+class TestWorkflowDAGCache:
+    @pytest.fixture
+    def workflow_job(self):
+        jt = JobTemplate.objects.create(name='jt')
+        wfjt = WorkflowJobTemplate.objects.create(name='wfjt')
+        first, second, third = [wfjt.workflow_nodes.create(unified_job_template=jt, identifier=name) for name in ('first', 'second', 'third')]
+        first.success_nodes.add(second)
+        first.failure_nodes.add(third)
+        wj = wfjt.create_unified_job()
+        wj.status = 'running'
+        wj.save()
+        return wj
+
+    def node(self, workflow_job, identifier):
+        return workflow_job.workflow_job_nodes.get(identifier=identifier)
+
+    def test_only_changes_are_loaded(self, workflow_job, django_assert_num_queries):
+        cache = WorkflowDAGCache()
+        dag = cache.get_dags([workflow_job])[workflow_job.id]
+        assert cache.loaded == 3
+        assert [n.identifier for n in dag.bfs_nodes_to_run()] == ['first']
+
+        with django_assert_num_queries(1):
+            assert cache.get_dags([workflow_job])[workflow_job.id] is dag
+            assert [n.identifier for n in dag.bfs_nodes_to_run()] == ['first']
+        assert cache.loaded == 0
+
+        first = self.node(workflow_job, 'first')
+        first.job = Job.objects.create(name='first', status='running')
+        first.save()
+        cache.get_dags([workflow_job])
+        assert cache.loaded == 1
+        assert dag.bfs_nodes_to_run() == []
+
+        first.job.status = 'successful'
+        first.job.save()
+        cache.get_dags([workflow_job])
+        assert cache.loaded == 1
+        assert [n.identifier for n in dag.mark_dnr_nodes()] == ['third']
+        assert [n.identifier for n in dag.bfs_nodes_to_run()] == ['second']
+
+    def test_changes_not_in_the_database_are_thrown_away(self, workflow_job):
+        cache = WorkflowDAGCache()
+        dag = cache.get_dags([workflow_job])[workflow_job.id]
+        # like a workflow manager run whose transaction was rolled back
+        for n in dag.nodes:
+            n['node_object'].do_not_run = True
+        cache.get_dags([workflow_job])
+        assert cache.loaded == 3
+        assert [n.identifier for n in dag.bfs_nodes_to_run()] == ['first']
+
+    def test_evicted_once_not_running(self, workflow_job):
+        cache = WorkflowDAGCache()
+        cache.get_dags([workflow_job])
+        assert cache.get_dags([]) == {}
+        assert cache.dags == {}
+
+    def test_templates_are_read_when_spawning(self, workflow_job):
+        cache = WorkflowDAGCache()
+        cache.get_dags([workflow_job])
+        JobTemplate.objects.filter(name='jt').update(job_tags='edited')
+        dag = cache.get_dags([workflow_job])[workflow_job.id]
+        assert cache.loaded == 0
+        spawned = WorkflowManager().spawn_node_jobs(workflow_job, dag.bfs_nodes_to_run())
+        assert [n.identifier for n in spawned] == ['first']
+        assert spawned[0].job.job_tags == 'edited'
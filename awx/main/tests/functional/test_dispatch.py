@@ -1,20 +1,25 @@
 import datetime
+import json
 import multiprocessing
 import random
 import signal
 import time
 import yaml
+from queue import Full as QueueFull
 from unittest import mock
 
 from django.utils.timezone import now as tz_now
 import pytest
 
-from awx.main.models import Job, WorkflowJob, Instance
+from awx.main.models import Job, JobTemplate, WorkflowJob, Instance, DispatcherPayload
 from awx.main.dispatch import reaper
-from awx.main.dispatch.pool import StatefulPoolWorker, WorkerPool, AutoscalePool
-from awx.main.dispatch.publish import task
-from awx.main.dispatch.worker import BaseWorker, TaskWorker
+from awx.main.dispatch.pool import StatefulPoolWorker, WorkerPool, AutoscalePool, TIMINGS_RING_SIZE
+from awx.main.dispatch.publish import task, publish_batch, encode_message
+from awx.main.dispatch.worker import AWXConsumerPG, BaseWorker, TaskWorker
+from awx.main.dispatch.coalesce import Coalescer
+from awx.main.dispatch.ledger import task_label
 from awx.main.dispatch.periodic import Scheduler
+from awx.main.tasks.system import cleanup_dispatcher_payloads
 
 
 '''
@@ -58,6 +63,26 @@ def multiply(a, b):
     return a * b
 
 
+@task()
+def echo(*args, **kwargs):
+    return args, kwargs
+
+
+@task(priority='control')
+def ping():
+    return 'pong'
+
+
+@task(coalesce_key=True)
+def refresh(inventory_id, force=False):
+    return inventory_id
+
+
+@task(coalesce_key=lambda inventory_id, **kwargs: inventory_id, coalesce_window=5)
+def refresh_inventory(inventory_id, force=False):
+    return inventory_id
+
+
 class SimpleWorker(BaseWorker):
     def perform_work(self, body, *args):
         pass
@@ -68,6 +93,11 @@ class ResultWriter(BaseWorker):
         result_queue.put(body + '!!!')
 
 
+class Sleeper(BaseWorker):
+    def perform_work(self, body):
+        time.sleep(3)
+
+
 class SlowResultWriter(BaseWorker):
     def perform_work(self, body, result_queue):
         time.sleep(3)
@@ -80,8 +110,9 @@ class TestPoolWorker:
         self.worker = StatefulPoolWorker(1000, self.tick, tuple())
 
     def tick(self):
-        self.worker.finished.put(self.worker.queue.get()['uuid'])
-        time.sleep(0.5)
+        body = self.worker.queue.get()
+        self.worker.status.start(body)
+        self.worker.status.finish()
 
     def test_qsize(self):
         assert self.worker.qsize == 0
@@ -121,6 +152,55 @@ class TestPoolWorker:
         assert self.worker.busy is True
         assert self.worker.idle is False
 
+    def test_status(self):
+        for i in range(3):
+            self.worker.put({'task': 'abc123', 'uuid': str(i)})
+        assert self.worker.status.current is None
+        assert self.worker.running_since is None
+
+        self.worker.status.start(self.worker.queue.get())
+        uuid, start_time = self.worker.status.current
+        assert uuid == '0'
+        assert self.worker.running_since == start_time
+
+        # finished messages are dropped from managed_tasks by their uuid
+        self.worker.status.finish()
+        self.tick()
+        assert self.worker.status.current is None
+        self.worker.calculate_managed_tasks()
+        assert list(self.worker.managed_tasks) == ['2']
+        assert self.worker.messages_finished == 2
+
+    def test_failed_put_is_not_tracked(self):
+        with mock.patch.object(self.worker.queue, 'put', side_effect=QueueFull):
+            with pytest.raises(QueueFull):
+                self.worker.put({'task': 'abc123', 'uuid': 'lost'})
+        assert len(self.worker.managed_tasks) == 0
+        assert self.worker.messages_sent == 0
+
+        self.worker.put({'task': 'abc123', 'uuid': '1'})
+        self.tick()
+        assert self.worker.idle is True
+
+    def test_duplicate_uuid(self):
+        for uuid in ('dup', 'dup', 'other'):
+            self.worker.put({'task': 'abc123', 'uuid': uuid})
+        self.tick()
+        self.tick()
+        self.worker.calculate_managed_tasks()
+        assert list(self.worker.managed_tasks) == ['other']
+        self.tick()
+        assert self.worker.idle is True
+
+    def test_finished_more_than_status_remembers(self):
+        for i in range(TIMINGS_RING_SIZE + 3):
+            self.worker.put({'task': 'abc123', 'uuid': str(i)})
+        for i in range(TIMINGS_RING_SIZE + 2):
+            self.tick()
+        self.worker.calculate_managed_tasks()
+        assert list(self.worker.managed_tasks) == [str(TIMINGS_RING_SIZE + 2)]
+        assert self.worker.messages_finished == TIMINGS_RING_SIZE + 2
+
 
 @pytest.mark.django_db
 class TestWorkerPool:
@@ -258,6 +338,148 @@ class TestAutoScaling:
         self.pool.write(0, 'Hello, Worker')
         assert len(self.pool) == 2
 
+    def test_task_affinity(self):
+        self.pool.init_workers(SimpleWorker().work_loop)
+
+        # idle workers that last ran the same task are preferred
+        self.pool.workers[1].last_task = 'awx.main.tasks.system.cluster_node_heartbeat'
+        self.pool.write(0, {'task': 'awx.main.tasks.system.cluster_node_heartbeat', 'uuid': '1'})
+        assert self.pool.workers[0].messages_sent == 0
+        assert self.pool.workers[1].messages_sent == 1
+
+    def test_warm_spares(self):
+        with mock.patch('awx.main.dispatch.pool.settings.DISPATCHER_WARM_SPARE_WORKERS', 1, create=True):
+            pool = AutoscalePool(min_workers=2, max_workers=10)
+        try:
+            pool.init_workers(SlowResultWriter().work_loop, multiprocessing.Queue())
+
+            # one busy and one idle worker, no spare needs to be forked
+            pool.write(0, 'Hello, World!')
+            deadline = time.monotonic() + 5
+            while not any(w.status.current for w in pool.workers) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            pool.add_spares()
+            assert len(pool) == 2
+
+            # both workers are busy now, spares are forked outside of write()
+            pool.write(0, 'Hello, World!')
+            assert len(pool) == 2
+            pool.add_spares()
+            assert len(pool) == 3
+            assert pool.cold_start_ct == 0
+
+            # every message that had to wait for a fork raises the number of spares
+            for w in pool.workers:
+                if w.idle:
+                    w.put('Hello, Worker')
+            pool.write(0, 'Hello, World!')
+            assert pool.cold_start_ct == 1
+            assert pool.spare_target == 2
+            assert len(pool) == 4
+            pool.add_spares()
+            assert len(pool) == 6
+
+            # idle spares are not scaled down
+            pool.cleanup()
+            assert sum(1 for w in pool.workers if w.idle) >= 2
+        finally:
+            pool.stop(signal.SIGTERM)
+
+    def test_control_priority_reserved_workers(self):
+        with mock.patch('awx.main.dispatch.pool.settings.DISPATCHER_CONTROL_WORKERS', 2, create=True):
+            pool = AutoscalePool(min_workers=2, max_workers=4)
+        try:
+            pool.init_workers(Sleeper().work_loop)
+            for i in range(5):
+                pool.write(0, {'task': 'awx.main.tasks.jobs.RunJob', 'uuid': f'job-{i}'})
+            assert len(pool) == 4
+
+            # control tasks can use workers past max_workers
+            for i in range(2):
+                pool.write(0, {'task': 'awx.main.scheduler.tasks.task_manager', 'uuid': f'tm-{i}', 'priority': 'control'})
+            assert len(pool) == 6
+            control_workers = pool.workers[4:]
+            assert [list(w.managed_tasks) for w in control_workers] == [['tm-0'], ['tm-1']]
+
+            # and once those are busy too, queue behind other control tasks
+            pool.write(0, {'task': 'awx.main.scheduler.tasks.task_manager', 'uuid': 'tm-2', 'priority': 'control'})
+            assert len(pool) == 6
+            assert sum(1 for w in control_workers if 'tm-2' in w.managed_tasks) == 1
+        finally:
+            pool.stop(signal.SIGTERM)
+
+    def test_bulk_priority_limit(self):
+        pool = AutoscalePool(min_workers=2, max_workers=4)
+        try:
+            pool.init_workers(Sleeper().work_loop)
+            for i in range(3):
+                pool.write(0, {'task': 'awx.main.tasks.system.gather_analytics', 'uuid': f'bulk-{i}', 'priority': 'bulk'})
+            # bulk tasks can keep at most half of max_workers busy
+            assert len(pool) == 2
+            assert sorted(len(w.managed_tasks) for w in pool.workers) == [1, 2]
+
+            pool.write(0, {'task': 'awx.main.tasks.jobs.RunJob', 'uuid': 'job'})
+            assert len(pool) == 3
+            assert list(pool.workers[2].managed_tasks) == ['job']
+        finally:
+            pool.stop(signal.SIGTERM)
+
+    def test_full_backlogs_do_not_overflow_the_lane(self):
+        pool = AutoscalePool(min_workers=2, max_workers=4)
+        try:
+            pool.init_workers(Sleeper().work_loop)
+            for i in range(2):
+                pool.write(0, {'task': 'awx.main.tasks.system.gather_analytics', 'uuid': f'bulk-{i}', 'priority': 'bulk'})
+            pool.up()
+            busy_workers = [w for w in pool.workers if w.busy]
+            assert len(busy_workers) == 2
+
+            with mock.patch.object(busy_workers[0], 'put', side_effect=QueueFull), mock.patch.object(busy_workers[1], 'put', side_effect=QueueFull):
+                assert pool.write(0, {'task': 'awx.main.tasks.system.gather_analytics', 'uuid': 'bulk-2', 'priority': 'bulk'}) is None
+            assert not any('bulk-2' in w.managed_tasks for w in pool.workers)
+        finally:
+            pool.stop(signal.SIGTERM)
+
+    def test_task_ledger(self):
+        self.pool.init_workers(SimpleWorker().work_loop)
+        now = time.time()
+        for i in range(3):
+            self.pool.write(0, {'task': 'awx.main.tasks.system.cluster_node_heartbeat', 'priority': 'control', 'time_pub': now - 2, 'time_ack': now - 1})
+        self.pool.write(0, {'task': 'awx.main.tasks.system.gather_analytics'})
+
+        for _ in range(50):
+            if sum(w.messages_finished for w in self.pool.workers if w.idle) == 4:
+                break
+            time.sleep(0.1)
+        stats = self.pool.ledger.stats()
+        heartbeat = stats['awx.main.tasks.system.cluster_node_heartbeat']
+        assert heartbeat['count'] == 3
+        assert 1 <= heartbeat['publish_to_ack']['p50'] < 1.5
+        assert heartbeat['ack_to_start']['p95'] >= 1
+        assert heartbeat['execution']['max'] < 5
+        assert stats['awx.main.tasks.system.gather_analytics']['publish_to_ack']['p50'] is None
+
+        metrics = mock.MagicMock()
+        self.pool.produce_subsystem_metrics(metrics)
+        observed = [c.args[0] for c in metrics.observe.call_args_list]
+        assert observed.count('dispatcher_task_execution_seconds') == 4
+        assert observed.count('dispatcher_task_publish_to_ack_seconds') == 3
+        labels = {c.args[2] for c in metrics.observe.call_args_list}
+        assert labels == {'awx.main.tasks.system.cluster_node_heartbeat', 'awx.main.tasks.system.gather_analytics'}
+        wait = {c.args[0]: c.args[1] for c in metrics.inc.call_args_list}
+        assert wait['dispatcher_control_tasks_started'] == 3
+        assert wait['dispatcher_control_queue_wait_seconds'] >= 6
+        assert 'dispatcher_normal_tasks_started' not in wait
+        self.pool.produce_subsystem_metrics(metrics)
+        assert metrics.observe.call_count == len(observed)
+
+
+def test_task_label():
+    assert task_label('awx.main.tasks.system.gather_analytics') == 'awx.main.tasks.system.gather_analytics'
+    assert task_label('awx.main.tasks.system.not_a_task') == 'other'
+    assert task_label('awx.main.no_such_module.task') == 'other'
+    assert task_label('os.system') == 'other'
+
 
 @pytest.mark.usefixtures("disable_database_settings")
 class TestTaskDispatcher:
@@ -283,6 +505,21 @@ class TestTaskDispatcher:
         assert isinstance(result, ValueError)
         assert str(result) == 'awx.main.tests.functional.test_dispatch.Restricted is not decorated with @task()'  # noqa
 
+    def test_resolve_from_registry(self):
+        with mock.patch('awx.main.dispatch.worker.task.importlib.import_module') as import_module:
+            assert self.tm.resolve_callable('awx.main.tests.functional.test_dispatch.add') is add
+            assert self.tm.resolve_callable('awx.main.tests.functional.test_dispatch.Adder') is Adder
+        import_module.assert_not_called()
+
+    def test_k8s_tmp_files_cleaned_only_when_present(self):
+        with mock.patch('awx.main.dispatch.worker.task.kube_config') as kube_config:
+            kube_config._temp_files = {}
+            self.tm.perform_work({'task': 'awx.main.tests.functional.test_dispatch.add', 'args': [2, 2]})
+            kube_config._cleanup_temp_files.assert_not_called()
+            kube_config._temp_files = {'abc': '/tmp/abc'}
+            self.tm.perform_work({'task': 'awx.main.tests.functional.test_dispatch.add', 'args': [2, 2]})
+            kube_config._cleanup_temp_files.assert_called_once_with()
+
     def test_python_function_cannot_be_imported(self):
         result = self.tm.perform_work(
             {
@@ -333,10 +570,158 @@ class TestTaskPublisher:
         message, queue = multiply.apply_async([2, 2], queue='not-so-hard')
         assert queue == 'not-so-hard'
 
+    def test_priority_defined_in_task_decorator(self):
+        message, queue = ping.apply_async(queue='foobar')
+        assert message['priority'] == 'control'
+        message, queue = add.apply_async([2, 2], queue='foobar')
+        assert 'priority' not in message
+
+    def test_coalesce_key_defined_in_task_decorator(self):
+        message, _ = refresh.apply_async([1], queue='foobar')
+        assert message['coalesce_key'] == 'awx.main.tests.functional.test_dispatch.refresh:[[1], {}]'
+        assert 'coalesce_window' not in message
+        message, _ = refresh_inventory.apply_async([1], {'force': True}, queue='foobar')
+        assert message['coalesce_key'] == 'awx.main.tests.functional.test_dispatch.refresh_inventory:1'
+        assert message['coalesce_window'] == 5
+        message, _ = add.apply_async([2, 2], queue='foobar')
+        assert 'coalesce_key' not in message
+
+    def test_invalid_priority(self):
+        with pytest.raises(ValueError):
+            task(priority='urgent')
+
     def test_apply_with_callable_queuename(self):
         message, queue = add.apply_async([2, 2], queue=lambda: 'called')
         assert queue == 'called'
 
+    def test_publish_batch(self):
+        with mock.patch('awx.main.dispatch.publish.is_testing', return_value=False), mock.patch('awx.main.dispatch.publish.pg_bus_conn') as pg_bus_conn:
+            conn = pg_bus_conn.return_value.__enter__.return_value
+            with publish_batch():
+                first, _ = add.apply_async([2, 2], queue='foobar')
+                with publish_batch():
+                    second, _ = multiply.apply_async([2, 2])
+                conn.notify_many.assert_not_called()
+            conn.notify_many.assert_called_once_with([('foobar', json.dumps(first)), ('hard-math', json.dumps(second))])
+
+    def test_publish_batch_discarded_on_error(self):
+        with mock.patch('awx.main.dispatch.publish.is_testing', return_value=False), mock.patch('awx.main.dispatch.publish.pg_bus_conn') as pg_bus_conn:
+            with pytest.raises(RuntimeError):
+                with publish_batch():
+                    add.apply_async([2, 2], queue='foobar')
+                    raise RuntimeError()
+            pg_bus_conn.assert_not_called()
+
+            # later messages are published right away again
+            message, _ = add.apply_async([2, 2], queue='foobar')
+            pg_bus_conn.return_value.__enter__.return_value.notify_many.assert_called_once_with([('foobar', json.dumps(message))])
+
+
+class TestCoalescer:
+    def test_duplicates_are_merged(self, mocker):
+        clock = mocker.patch('awx.main.dispatch.coalesce.time.monotonic', return_value=100)
+        coalescer = Coalescer()
+        first, _ = refresh.apply_async([1], queue='foobar')
+        other, _ = refresh.apply_async([2], queue='foobar')
+        assert coalescer.hold(first) is False
+        assert coalescer.hold(other) is False
+        for _ in range(3):
+            duplicate, _ = refresh.apply_async([1], queue='foobar')
+            assert coalescer.hold(duplicate) is True
+        assert coalescer.coalesced == 2
+        assert coalescer.hold(add.get_async_body([2, 2])) is False
+
+        assert coalescer.due() == []
+        assert coalescer.time_until_next() == 1
+        clock.return_value = 101
+        assert coalescer.due() == [duplicate]
+        assert coalescer.time_until_next() is None
+
+        # releasing the trailing message opens the next window
+        trailing = refresh.get_async_body([1])
+        assert coalescer.hold(trailing) is True
+        clock.return_value = 102
+        assert coalescer.due() == [trailing]
+
+        # once a window passes without duplicates, the next submission runs right away
+        clock.return_value = 103
+        assert coalescer.due() == []
+        assert coalescer.hold(refresh.get_async_body([1])) is False
+
+    def test_window(self, mocker, settings):
+        mocker.patch('awx.main.dispatch.coalesce.time.monotonic', return_value=100)
+        coalescer = Coalescer()
+        assert coalescer.hold(refresh_inventory.get_async_body([1])) is False
+        assert coalescer.hold(refresh_inventory.get_async_body([1])) is True
+        assert coalescer.time_until_next() == 5
+        settings.DISPATCHER_COALESCE_WINDOW = 0
+        assert coalescer.hold(refresh.get_async_body([1])) is False
+
+    def get_consumer(self):
+        pool = mock.MagicMock()
+        pool.__len__.return_value = 1
+        consumer = AWXConsumerPG('dispatcher', TaskWorker(), ['foobar'], pool, schedule={})
+        consumer.record_statistics = mock.MagicMock()
+        return consumer, pool
+
+    def test_consumer_releases_held_messages(self, mocker):
+        mocker.patch('awx.main.dispatch.coalesce.time.monotonic', return_value=100)
+        consumer, pool = self.get_consumer()
+        for _ in range(3):
+            consumer.dispatch_task(refresh.get_async_body([1]))
+        assert pool.write.call_count == 1
+        assert consumer.run_periodic_tasks() <= 1
+
+        mocker.patch('awx.main.dispatch.coalesce.time.monotonic', return_value=101)
+        consumer.run_periodic_tasks()
+        assert pool.write.call_count == 2
+        assert pool.write.call_args.args[1]['args'] == [1]
+
+    def test_consumer_stop_dispatches_held_messages(self, mocker):
+        mocker.patch('awx.main.dispatch.coalesce.time.monotonic', return_value=100)
+        consumer, pool = self.get_consumer()
+        for _ in range(2):
+            consumer.dispatch_task(refresh.get_async_body([1]))
+        assert pool.write.call_count == 1
+        with mock.patch.object(consumer.worker, 'on_stop'), pytest.raises(SystemExit):
+            consumer.stop(signal.SIGTERM, None)
+        assert pool.write.call_count == 2
+        assert consumer.coalescer.held == {}
+
+
+@pytest.mark.django_db
+class TestLargePayloads:
+    def test_small_message_is_sent_as_is(self):
+        message = echo.get_async_body([2, 2])
+        assert json.loads(encode_message(message)) == message
+        assert DispatcherPayload.objects.count() == 0
+
+    def test_large_message_round_trip(self, settings):
+        settings.DISPATCHER_NOTIFY_MAX_BYTES = 200
+        message = echo.get_async_body([list(range(100))], {'flag': True})
+        body = json.loads(encode_message(message))
+        assert 'args' not in body and 'kwargs' not in body
+        assert body['task'] == message['task']
+        assert DispatcherPayload.objects.count() == 1
+
+        body['kwargs'] = {'dispatch_time': 'now'}  # bound by the dispatcher
+        assert TaskWorker.run_callable(body) == ((list(range(100)),), {'flag': True, 'dispatch_time': 'now'})
+
+    def test_large_broadcast_message_on_every_node(self, settings):
+        settings.DISPATCHER_NOTIFY_MAX_BYTES = 200
+        message = encode_message(echo.get_async_body([list(range(100))]))
+        # every node listening on a broadcast queue gets its own copy
+        for _ in range(2):
+            assert TaskWorker.run_callable(json.loads(message)) == ((list(range(100)),), {})
+        assert DispatcherPayload.objects.count() == 1
+
+    def test_cleanup_unconsumed_payloads(self):
+        old = DispatcherPayload.objects.create(data={'args': [1]})
+        DispatcherPayload.objects.filter(pk=old.pk).update(created=tz_now() - datetime.timedelta(days=2))
+        recent = DispatcherPayload.objects.create(data={'args': [2]})
+        cleanup_dispatcher_payloads()
+        assert list(DispatcherPayload.objects.values_list('pk', flat=True)) == [recent.pk]
+
 
 yesterday = tz_now() - datetime.timedelta(days=1)
 minute = tz_now() - datetime.timedelta(seconds=120)
@@ -442,6 +827,51 @@ class TestJobReaper(object):
         assert job.status == 'running'
         assert job.job_explanation == ''
 
+    def test_reap_jobs_in_bulk(self):
+        started = tz_now() - datetime.timedelta(minutes=5)
+        running = [Job.objects.create(status='running', started=started, start_args='SENSITIVE') for _ in range(5)]
+        explained = Job.objects.create(status='waiting', job_explanation='Blocked.')
+        pending = Job.objects.create(status='pending')
+        with mock.patch('awx.main.tasks.system.handle_failure_notifications.delay') as notify:
+            reaped = reaper.reap_jobs(Job.objects.all(), 'failed')
+
+        assert reaped == sorted(j.id for j in running + [explained])
+        # one task sends the notifications of every reaped job
+        notify.assert_called_once_with(reaped)
+        for job in running:
+            job.refresh_from_db()
+            assert job.status == 'failed'
+            assert job.failed is True
+            assert job.start_args == ''
+            assert job.finished is not None
+            assert job.elapsed > 0
+            assert job.job_explanation.endswith('so it has been marked as failed.')
+        explained.refresh_from_db()
+        assert explained.job_explanation.startswith('Blocked. Task was marked as running')
+        pending.refresh_from_db()
+        assert pending.status == 'pending'
+
+    def test_reap_simultaneous_jobs_of_a_template(self):
+        jt = JobTemplate.objects.create(name='jt', allow_simultaneous=True)
+        first, second = jt.create_unified_job(), jt.create_unified_job()
+        for job in (first, second):
+            job.status = 'running'
+            job.save()
+        # with simultaneous jobs, the template's current job can be any of them
+        JobTemplate.objects.filter(pk=jt.pk).update(current_job=first)
+        with mock.patch('awx.main.tasks.system.handle_failure_notifications.delay'):
+            assert reaper.reap_jobs(Job.objects.all(), 'failed') == [first.id, second.id]
+        jt.refresh_from_db()
+        assert jt.current_job is None
+        assert jt.last_job == second
+        assert jt.last_job_failed is True
+
+    def test_reap_jobs_nothing_to_reap(self):
+        Job.objects.create(status='successful')
+        with mock.patch('awx.main.tasks.system.handle_failure_notifications.delay') as notify:
+            assert reaper.reap_jobs(Job.objects.all(), 'failed') == []
+        notify.assert_not_called()
+
 
 @pytest.mark.django_db
 class TestScheduler:
@@ -514,3 +944,32 @@ class TestScheduler:
         assert data['schedule_list']['jobd']['missed_runs'] == 3
         assert data['schedule_list']['jobd']['completed_runs'] == 1
         assert data['schedule_list']['jobb']['next_run_in_seconds'] > 25.0
+        assert data['total_missed_runs'] == sum(job['missed_runs'] for job in data['schedule_list'].values())
+
+    def test_heap_matches_schedule_order(self, mocker):
+        scheduler = Scheduler({f'job{i}': {'schedule': datetime.timedelta(seconds=20 + 10 * i)} for i in range(10)})
+        runs = []
+        for t in range(0, 300):
+            mocker.patch('awx.main.dispatch.periodic.time.time', return_value=scheduler.global_start + t)
+            runs.extend((t, job.name) for job in scheduler.get_and_mark_pending())
+        for i in range(10):
+            job = self.get_job(scheduler, f'job{i}')
+            assert [t for t, name in runs if name == job.name] == [n * job.interval + job.offset for n in range(1, job.completed_runs + 1)]
+            assert job.missed_runs(299) == 0
+
+    def test_jitter(self, mocker):
+        scheduler = Scheduler({'joba': {'schedule': datetime.timedelta(seconds=20)}, 'jobb': {'schedule': datetime.timedelta(seconds=20), 'jitter': 0}}, jitter=5)
+        joba, jobb = self.get_job(scheduler, 'joba'), self.get_job(scheduler, 'jobb')
+        assert joba.jitter == 5 and jobb.jitter == 0
+        for run in range(1, 20):
+            delay = joba.delay
+            assert 0 <= delay <= 5
+            # waiting out the jitter is not a missed run
+            mocker.patch('awx.main.dispatch.periodic.time.time', return_value=scheduler.global_start + joba.target)
+            assert joba.missed_runs(joba.target) == 0
+            mocker.patch('awx.main.dispatch.periodic.time.time', return_value=scheduler.global_start + joba.next_run + 1.0e-6)
+            scheduler.get_and_mark_pending()
+            assert joba.completed_runs == run
+            assert joba.last_lateness == pytest.approx(delay, abs=1.0e-3)
+        # the jitter of a schedule is limited to half of its interval
+        assert Scheduler({'job': {'schedule': datetime.timedelta(seconds=4)}}, jitter=10).jobs[0].jitter == 2
@@ -21,6 +21,10 @@ class WorkflowNode(object):
         self.unified_job_template = unified_job_template
         self.all_parents_must_converge = False
 
+    @property
+    def unified_job_template_id(self):
+        return None if self.unified_job_template is None else id(self.unified_job_template)
+
 
 @pytest.fixture
 def wf_node_generator(mocker):
@@ -221,3 +221,59 @@ class TestSelectBestInstanceForTask(object):
             assert tm_models.instance_groups.find_largest_idle_instance('controlplane') is None, reason
         else:
             assert tm_models.instance_groups.find_largest_idle_instance('controlplane').hostname == instances[instance_fit_index].hostname, reason
+
+    @pytest.mark.parametrize(
+        'strategy,instances,instance_fit_index,reason',
+        [
+            ('most_remaining', Is([(0, 300), (2, 500), (0, 150)]), 1, "Most capacity left"),
+            ('best_fit', Is([(0, 300), (2, 500), (0, 150)]), 2, "Least capacity left that the task fits in"),
+            ('best_fit', Is([(0, 300), (0, 100), (0, 99)]), 1, "The task fits exactly"),
+            ('best_fit', Is([(0, 300), (0, 120), (0, 120)]), 1, "Two equally good fits, pick the first"),
+            ('least_jobs_running', Is([(1, 300), (2, 500), (0, 150)]), 2, "Fewest jobs running"),
+            ('least_jobs_running', Is([(1, 300), (2, 500), (0, 50)]), 0, "Fewest jobs running that the task fits in"),
+            ('best_fit', Is([(0, 50), (0, 99)]), None, "The task fits nowhere"),
+        ],
+    )
+    def test_placement_strategy(self, strategy, instances, instance_fit_index, reason):
+        ig = InstanceGroup(id=10, name='controlplane')
+        tasks = []
+        for instance in instances:
+            ig.instances.add(instance)
+            for _ in range(instance.jobs_running):
+                tasks.append(Job(task_impact=10, execution_node=instance.hostname, controller_node=instance.hostname, instance_group=ig))
+        tm_models = TaskManagerModels.init_with_consumed_capacity(tasks=tasks, instances=instances, instance_groups=[ig], placement_strategy=strategy)
+        instance_picked = tm_models.instance_groups.fit_task_to_instance(Job(task_impact=100), 'controlplane')
+
+        if instance_fit_index is None:
+            assert instance_picked is None, reason
+        else:
+            assert instance_picked.hostname == instances[instance_fit_index].hostname, reason
+
+    @pytest.mark.parametrize('strategy', ['most_remaining', 'best_fit', 'least_jobs_running'])
+    def test_placement_index_follows_consumed_capacity(self, strategy):
+        nodes = [(300, 'execution'), (200, 'hybrid'), (250, 'execution'), (100, 'control'), (220, 'hybrid')]
+        instances = [Instance(capacity=capacity, node_type=node_type, hostname=f'fakehost-{i}') for i, (capacity, node_type) in enumerate(nodes)]
+        ig = InstanceGroup(id=10, name='default')
+        ig.instances.add(*instances)
+        tm_models = TaskManagerModels(instances=instances, instance_groups=[ig], placement_strategy=strategy, control_task_impact=5)
+        group = tm_models.instance_groups['default']
+        placed = []
+        for impact in [40, 70, 10, 120, 30, 90, 60, 20, 80, 50, 110, 15]:
+            task = Job(task_impact=impact)
+            # the same choice as a scan of every instance of the group
+            fits = []
+            for position, i in enumerate(group.instances):
+                left = i.remaining_capacity - impact - (5 if i.node_type == 'hybrid' else 0)
+                if i.node_type in ('execution', 'hybrid') and left >= 0:
+                    rank = {'most_remaining': -left, 'best_fit': left, 'least_jobs_running': i.jobs_running}[strategy]
+                    fits.append((rank, position, i))
+            expected = min(fits)[2] if fits else None
+            instance = tm_models.instance_groups.fit_task_to_instance(task, 'default', add_hybrid_control_cost=True)
+            assert instance is expected
+            if instance is None:
+                continue
+            instance.consume_capacity(impact, job_impact=True)
+            if instance.node_type == 'hybrid':
+                instance.consume_capacity(5)
+            placed.append(instance.hostname)
+        assert 'fakehost-3' not in placed
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from unittest import mock
+
+from awx.main import consumers
+from awx.main.consumers import ChannelNotificationPublisher, EventConsumer
+
+
+class FakeChannelLayer:
+    def __init__(self):
+        self.sent = []
+        self.started = threading.Event()
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    async def group_send(self, group, message):
+        self.started.set()
+        self.unblocked.wait(timeout=5)
+        self.sent.append((group, message['text']))
+
+
+def get_publisher(maxsize=100):
+    channel_layer = FakeChannelLayer()
+    with mock.patch('awx.main.consumers.get_channel_layer', return_value=channel_layer):
+        publisher = ChannelNotificationPublisher(maxsize)
+    return publisher, channel_layer
+
+
+def test_publisher_sends_in_order():
+    publisher, channel_layer = get_publisher()
+    for i in range(50):
+        publisher.put('job_events-1', {'text': str(i)})
+    publisher.flush()
+    assert channel_layer.sent == [('job_events-1', str(i)) for i in range(50)]
+    assert publisher.qsize() == 0
+    assert publisher.dropped == 0
+
+
+def test_publisher_drops_when_full():
+    publisher, channel_layer = get_publisher(maxsize=2)
+    channel_layer.unblocked.clear()
+    publisher.put('jobs-status_changed', {'text': 'sending'})
+    # wait for the publisher to pick up the first message, which then blocks
+    assert channel_layer.started.wait(timeout=5)
+    assert publisher.qsize() == 0
+    for i in range(5):
+        publisher.put('jobs-status_changed', {'text': str(i)})
+    assert publisher.qsize() == 2
+    assert publisher.dropped == 3
+
+    channel_layer.unblocked.set()
+    publisher.flush()
+    assert [text for group, text in channel_layer.sent] == ['sending', '0', '1']
+
+
+def test_emit_channel_notification_uses_publisher(settings):
+    settings.CHANNEL_NOTIFICATION_ASYNC_PUBLISHER = True
+    with mock.patch('awx.main.consumers.get_channel_notification_publisher') as get_publisher:
+        with mock.patch('awx.main.consumers.run_sync') as run_sync:
+            consumers.emit_channel_notification('jobs-summary', {'unified_job_id': 1})
+    run_sync.assert_not_called()
+    get_publisher.return_value.put.assert_called_once_with('jobs-summary', {'type': 'internal.message', 'text': '{"unified_job_id": 1}', 'needs_relay': True})
+
+
+def test_emit_channel_notification_batch(settings):
+    settings.CHANNEL_NOTIFICATION_ASYNC_PUBLISHER = False
+    with mock.patch('awx.main.consumers.get_channel_layer'):
+        with mock.patch('awx.main.consumers.run_sync') as run_sync:
+            consumers.emit_channel_notification_batch('job_events-1', [{'counter': 1}, {'counter': 2}])
+    run_sync.assert_called_once()
+    with mock.patch('awx.main.consumers.get_channel_notification_publisher') as get_publisher:
+        settings.CHANNEL_NOTIFICATION_ASYNC_PUBLISHER = True
+        consumers.emit_channel_notification_batch('job_events-1', [{'counter': 1}, {'counter': 2}])
+    get_publisher.return_value.put.assert_called_once_with(
+        'job_events-1', {'type': 'internal.message_batch', 'texts': ['{"counter": 1}', '{"counter": 2}'], 'needs_relay': True}
+    )
+
+
+def test_event_consumer_batch_message():
+    consumer = EventConsumer()
+    consumer.send = mock.AsyncMock()
+    batch = {'type': 'internal.message_batch', 'texts': ['{"counter": 1}', '{"counter": 2}']}
+
+    # clients which did not opt in get one message per event
+    asyncio.run(consumer.internal_message_batch(batch))
+    assert consumer.send.call_args_list == [mock.call('{"counter": 1}'), mock.call('{"counter": 2}')]
+
+    consumer.send.reset_mock()
+    consumer.batch_events = True
+    asyncio.run(consumer.internal_message_batch(batch))
+    consumer.send.assert_called_once_with('[{"counter": 1},{"counter": 2}]')
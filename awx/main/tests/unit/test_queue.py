@@ -0,0 +1,121 @@
+import json
+from unittest import mock
+
+import pytest
+import redis
+
+from awx.main.queue import CallbackQueueDispatcher
+
+
+@pytest.fixture
+def dispatcher(settings):
+    def rf(batch_size=1, buffer_seconds=60):
+        settings.JOB_EVENT_DISPATCH_BATCH_SIZE = batch_size
+        settings.JOB_EVENT_DISPATCH_BUFFER_SECONDS = buffer_seconds
+        with mock.patch('awx.main.queue.redis.Redis.from_url'):
+            return CallbackQueueDispatcher()
+
+    return rf
+
+
+def test_dispatch_unbuffered(dispatcher):
+    d = dispatcher()
+    d.dispatch({'counter': 1})
+    d.connection.rpush.assert_called_once_with(d.queue, json.dumps({'counter': 1}))
+    assert d.timer is None
+
+
+def test_dispatch_flushes_full_buffer(dispatcher):
+    d = dispatcher(batch_size=3)
+    for i in range(2):
+        d.dispatch({'counter': i})
+    d.connection.rpush.assert_not_called()
+    assert d.timer is not None
+
+    d.dispatch({'counter': 2})
+    d.connection.rpush.assert_called_once_with(d.queue, *[json.dumps({'counter': i}) for i in range(3)])
+    assert d.buffer == []
+    assert d.timer is None
+
+
+def test_explicit_flush(dispatcher):
+    d = dispatcher(batch_size=100)
+    d.dispatch({'counter': 1})
+    d.dispatch({'event': 'EOF'})
+    d.flush()
+    d.connection.rpush.assert_called_once_with(d.queue, json.dumps({'counter': 1}), json.dumps({'event': 'EOF'}))
+
+    d.flush()  # nothing left to push
+    d.connection.rpush.assert_called_once()
+
+
+def test_flush_on_timer(dispatcher):
+    d = dispatcher(batch_size=100, buffer_seconds=0.01)
+    d.dispatch({'counter': 1})
+    d.timer.join(timeout=5)
+    d.connection.rpush.assert_called_once_with(d.queue, json.dumps({'counter': 1}))
+    assert d.timer is None
+
+
+def test_failed_flush_keeps_events(dispatcher):
+    d = dispatcher(batch_size=100)
+    d.dispatch({'counter': 1})
+    d.dispatch({'counter': 2})
+    d.connection.rpush.side_effect = redis.exceptions.ConnectionError
+    with pytest.raises(redis.exceptions.ConnectionError):
+        d.flush()
+    assert d.buffer == [(d.queue, json.dumps({'counter': 1})), (d.queue, json.dumps({'counter': 2}))]
+
+    d.connection.rpush.side_effect = None
+    d.connection.rpush.reset_mock()
+    d.flush()
+    d.connection.rpush.assert_called_once_with(d.queue, json.dumps({'counter': 1}), json.dumps({'counter': 2}))
+    assert d.buffer == []
+
+
+def test_failed_flush_keeps_unsent_shards(dispatcher, settings):
+    settings.JOB_EVENT_QUEUE_SHARDING = True
+    settings.JOB_EVENT_WORKERS = 4
+    d = dispatcher(batch_size=100)
+    d.dispatch({'job_id': 1, 'counter': 1})
+    d.dispatch({'job_id': 2, 'counter': 1})
+    d.connection.rpush.side_effect = [1, redis.exceptions.ConnectionError]
+    with pytest.raises(redis.exceptions.ConnectionError):
+        d.flush()
+    assert d.buffer == [(f'{d.queue}_2', json.dumps({'job_id': 2, 'counter': 1}))]
+
+
+def test_flush_on_timer_failure_keeps_events(dispatcher):
+    d = dispatcher(batch_size=100, buffer_seconds=0.01)
+    d.connection.rpush.side_effect = redis.exceptions.ConnectionError
+    d.dispatch({'counter': 1})
+    d.timer.join(timeout=5)
+    assert d.buffer == [(d.queue, json.dumps({'counter': 1}))]
+    assert d.timer is None
+
+
+def test_sharded_queues(dispatcher, settings):
+    settings.JOB_EVENT_QUEUE_SHARDING = True
+    settings.JOB_EVENT_WORKERS = 4
+    d = dispatcher(batch_size=100)
+    for job_id in (5, 6, 5):
+        d.dispatch({'job_id': job_id, 'counter': 1})
+    d.dispatch({'project_update_id': 7, 'counter': 1})
+    d.dispatch({'event': 'keepalive'})
+    d.flush()
+    assert d.connection.rpush.call_args_list == [
+        mock.call(f'{d.queue}_1', json.dumps({'job_id': 5, 'counter': 1})),
+        mock.call(f'{d.queue}_2', json.dumps({'job_id': 6, 'counter': 1})),
+        mock.call(f'{d.queue}_1', json.dumps({'job_id': 5, 'counter': 1})),
+        mock.call(f'{d.queue}_3', json.dumps({'project_update_id': 7, 'counter': 1})),
+        mock.call(d.queue, json.dumps({'event': 'keepalive'})),
+    ]
+
+
+def test_backpressure(dispatcher, settings):
+    settings.JOB_EVENT_BACKPRESSURE_HIGH_WATER_MARK = 10
+    d = dispatcher()
+    for queue_length, engaged in ((9, False), (10, True), (6, True), (4, False)):
+        d.connection.rpush.return_value = queue_length
+        d.dispatch({'counter': 1})
+        assert d.backpressure is engaged
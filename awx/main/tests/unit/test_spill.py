@@ -0,0 +1,53 @@
+import pytest
+
+from awx.main.dispatch.spill import SpillLog
+
+
+@pytest.fixture
+def spill(tmp_path):
+    return SpillLog(str(tmp_path / 'worker.spill'), max_bytes=1024)
+
+
+def test_append_and_read(spill):
+    assert list(spill.read()) == []
+    assert spill.append([{'counter': 1}, {'counter': 2}]) == 2
+    assert spill.append([{'counter': 3}]) == 1
+    assert list(spill.read()) == [{'counter': 1}, {'counter': 2}, {'counter': 3}]
+
+
+def test_append_stops_at_max_bytes(spill):
+    record = {'stdout': 'x' * 100}
+    written = spill.append([record] * 20)
+    assert 0 < written < 20
+    assert spill.size <= spill.max_bytes
+    assert spill.append([record]) == 0
+
+
+def test_truncated_record_is_ignored(spill):
+    spill.append([{'counter': 1}, {'counter': 2}])
+    with open(spill.path, 'r+b') as f:
+        f.truncate(spill.size - 1)
+    assert list(spill.read()) == [{'counter': 1}]
+
+
+def test_replay(spill):
+    spill.append([{'counter': i} for i in range(5)])
+    saved = []
+    assert spill.replay(saved.extend, chunk_size=2) == 5
+    assert saved == [{'counter': i} for i in range(5)]
+    assert spill.size == 0
+
+
+def test_replay_failure_keeps_unsaved_records(spill):
+    spill.append([{'counter': i} for i in range(5)])
+    saved = []
+
+    def save(records):
+        if len(saved) >= 2:
+            raise RuntimeError('database is down')
+        saved.extend(records)
+
+    with pytest.raises(RuntimeError):
+        spill.replay(save, chunk_size=2)
+    assert saved == [{'counter': 0}, {'counter': 1}]
+    assert list(spill.read()) == [{'counter': i} for i in range(2, 5)]
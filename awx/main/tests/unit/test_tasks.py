@@ -513,6 +513,17 @@ class TestGenericRun:
         [task.runner_callback.event_handler(event_data) for i in range(20)]
         assert 20 == task.runner_callback.event_ct
 
+    def test_backpressure_skips_websocket_messages(self, mock_me):
+        task = jobs.RunJob()
+        task.runner_callback.dispatcher = mock.MagicMock(backpressure=True)
+        task.runner_callback.instance = Job(pk=1, id=1)
+        task.runner_callback.event_handler({'event': 'runner_on_ok', 'stdout': 'ok', 'start_line': 0, 'end_line': 1})
+        task.runner_callback.event_handler({'event': 'playbook_on_stats', 'stdout': '', 'start_line': 1, 'end_line': 1})
+        events = [c.args[0] for c in task.runner_callback.dispatcher.dispatch.call_args_list]
+        assert events[0]['skip_websocket_message'] is True
+        assert 'skip_websocket_message' not in events[1]
+        assert task.runner_callback.websocket_messages_skipped == 1
+
     def test_finished_callback_eof(self, mock_me):
         task = jobs.RunJob()
         task.runner_callback.dispatcher = mock.MagicMock()
@@ -520,6 +531,7 @@ class TestGenericRun:
         task.runner_callback.event_ct = 17
         task.runner_callback.finished_callback(None)
         task.runner_callback.dispatcher.dispatch.assert_called_with({'event': 'EOF', 'final_counter': 17, 'job_id': 1, 'guid': None})
+        task.runner_callback.dispatcher.flush.assert_called_once_with()
 
     def test_save_job_metadata(self, job, update_model_wrapper, mock_me):
         class MockMe:
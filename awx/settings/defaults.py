@@ -223,10 +223,53 @@ LOCAL_STDOUT_EXPIRE_TIME = 2592000
 # events into the database
 JOB_EVENT_WORKERS = 4
 
+# If True, job events are pushed to one of JOB_EVENT_WORKERS redis lists
+# (CALLBACK_QUEUE suffixed with the shard number) chosen by their job id, and
+# every callback receiver worker consumes a single list.  All events of a job
+# are then saved by the same worker, in the order they were emitted, and one
+# busy job can't delay the events of jobs in other shards.  Producers and the
+# callback receiver must agree on JOB_EVENT_WORKERS.
+JOB_EVENT_QUEUE_SHARDING = False
+
 # The number of seconds to buffer callback receiver bulk
 # writes in memory before flushing via JobEvent.objects.bulk_create()
 JOB_EVENT_BUFFER_SECONDS = 1
 
+# The method used by the callback receiver to write buffered events to the
+# database. 'bulk_create' uses the Django ORM, 'copy' streams rows into the
+# event tables with PostgreSQL COPY FROM STDIN (falls back to 'bulk_create'
+# on other database backends)
+JOB_EVENT_PERSISTENCE_METHOD = 'bulk_create'
+
+# The maximum number of events a callback receiver worker pops from redis
+# in a single round trip, a value of 1 pops events one at a time with BLPOP
+JOB_EVENT_READ_BATCH_SIZE = 1
+
+# The number of events a running job buffers before pushing them to the
+# callback receiver queue with a single RPUSH, a value of 1 disables buffering
+JOB_EVENT_DISPATCH_BATCH_SIZE = 1
+
+# The maximum number of seconds a running job holds buffered events before
+# pushing them to the callback receiver queue
+JOB_EVENT_DISPATCH_BUFFER_SECONDS = 0.05
+
+# When a running job sees the callback receiver queue it pushes to grow to
+# this many events, it stops asking for websocket messages for its events
+# (except for the few types in MINIMAL_EVENTS) until the queue is back under
+# half of this value, so that the callback receiver can spend its time saving
+# events.  0 disables backpressure.
+JOB_EVENT_BACKPRESSURE_HIGH_WATER_MARK = 0
+
+# Directory where callback receiver workers write the events they could not
+# save because the database stayed unavailable; the events are saved from
+# there once the database is reachable again.  None discards such events.
+# See `awx-manage job_event_spill` to inspect or replay these files.
+JOB_EVENT_SPILL_DIR = None
+
+# The maximum size in bytes of the spill file of each callback receiver
+# worker, events that don't fit are discarded
+JOB_EVENT_SPILL_MAX_BYTES = 512 * 1024 * 1024
+
 # The interval at which callback receiver statistics should be
 # recorded
 JOB_EVENT_STATISTICS_INTERVAL = 5
@@ -243,6 +286,9 @@ SUBSYSTEM_METRICS_REDIS_KEY_PREFIX = "awx_metrics"
 # Histogram buckets for the callback_receiver_batch_events_insert_db metric
 SUBSYSTEM_METRICS_BATCH_INSERT_BUCKETS = [10, 50, 150, 350, 650, 2000]
 
+# Histogram buckets, in seconds, for the dispatcher_task_* timing metrics
+SUBSYSTEM_METRICS_DISPATCHER_TASK_BUCKETS = [0.01, 0.1, 1, 5, 30, 120, 600, 3600]
+
 # Interval in seconds for sending local metrics to other nodes
 SUBSYSTEM_METRICS_INTERVAL_SEND_METRICS = 3
 
@@ -262,6 +308,24 @@ TASK_MANAGER_TIMEOUT = 300
 TASK_MANAGER_TIMEOUT_GRACE_PERIOD = 60
 TASK_MANAGER_LOCK_TIMEOUT = TASK_MANAGER_TIMEOUT + TASK_MANAGER_TIMEOUT_GRACE_PERIOD
 
+# Keep the pending, waiting and running jobs loaded by the task manager in
+# memory between its runs, and only load the jobs that changed since the last
+# run; every TASK_MANAGER_FULL_SYNC_INTERVAL seconds all of them are loaded again
+TASK_MANAGER_INCREMENTAL_STATE = True
+TASK_MANAGER_FULL_SYNC_INTERVAL = 300
+
+# Keep the DAG of every running workflow in memory between workflow manager
+# runs, and only load the workflow nodes whose job or state changed
+WORKFLOW_MANAGER_INCREMENTAL_STATE = True
+
+# How the task manager picks the instance of an instance group a job runs on:
+#   most_remaining: the instance with the most capacity left, spreading jobs evenly
+#   best_fit: the instance with the least capacity left that the job fits on,
+#     packing jobs on as few instances as possible
+#   least_jobs_running: the instance running the fewest jobs that the job fits on
+# Jobs that fit on no instance still go to the largest idle instance.
+TASK_MANAGER_PLACEMENT_STRATEGY = 'most_remaining'
+
 # Number of seconds _in addition to_ the task manager timeout a job can stay
 # in waiting without being reaped
 JOB_WAITING_GRACE_PERIOD = 60
@@ -429,6 +493,43 @@ EXECUTION_NODE_REMEDIATION_CHECKS = 60 * 30  # once every 30 minutes check if an
 # Amount of time dispatcher will try to reconnect to database for jobs and consuming new work
 DISPATCHER_DB_DOWNTIME_TOLERANCE = 40
 
+# Number of idle dispatcher workers to keep forked ahead of time, so that new
+# tasks don't wait for a worker process to start; the pool adds one more for
+# every task in the last minute that still had to wait.  0 only forks workers
+# when all of them are busy.
+DISPATCHER_WARM_SPARE_WORKERS = 0
+
+# Number of dispatcher workers that may be forked past the pool maximum for
+# tasks declared with @task(priority='control'), like the task manager and
+# the heartbeat, so they still start promptly when jobs fill the pool; other
+# tasks can't use them.  0 leaves control tasks queued behind other work when
+# the pool is full.
+DISPATCHER_CONTROL_WORKERS = 2
+
+# Number of recent runs per task name that the dispatcher keeps timings of,
+# for `awx-manage dispatcherctl stats`
+DISPATCHER_TASK_LEDGER_WINDOW = 1000
+
+# Seconds after running a task declared with @task(coalesce_key=...) during
+# which the dispatcher merges identical submissions into one run at the end
+DISPATCHER_COALESCE_WINDOW = 1.0
+
+# Dispatcher task messages larger than this many bytes don't fit in a
+# pg_notify payload (limited to 8000 bytes); their args and kwargs are stored
+# in the database and the message only carries a reference to them
+DISPATCHER_NOTIFY_MAX_BYTES = 7500
+
+# Stored arguments of oversized dispatcher messages are deleted by the
+# cleanup_dispatcher_payloads task after this many seconds; they are kept
+# after being read, as a broadcast message is read on every node
+DISPATCHER_PAYLOAD_EXPIRE_TIME = 86400
+
+# Delay every run of the dispatcher's periodic tasks (CELERYBEAT_SCHEDULE) by a
+# random amount of up to this many seconds, so that a large cluster doesn't
+# run the same schedule on every node at once; an entry of CELERYBEAT_SCHEDULE
+# may set its own 'jitter'
+DISPATCHER_SCHEDULE_JITTER = 0.0
+
 BROKER_URL = 'unix:///var/run/redis/redis.sock'
 CELERYBEAT_SCHEDULE = {
     'tower_scheduler': {'task': 'awx.main.tasks.system.awx_periodic_scheduler', 'schedule': timedelta(seconds=30), 'options': {'expires': 20}},
@@ -444,6 +545,7 @@ CELERYBEAT_SCHEDULE = {
     'receptor_reaper': {'task': 'awx.main.tasks.system.awx_receptor_workunit_reaper', 'schedule': timedelta(seconds=60)},
     'send_subsystem_metrics': {'task': 'awx.main.analytics.analytics_tasks.send_subsystem_metrics', 'schedule': timedelta(seconds=20)},
     'cleanup_images': {'task': 'awx.main.tasks.system.cleanup_images_and_files', 'schedule': timedelta(hours=3)},
+    'cleanup_dispatcher_payloads': {'task': 'awx.main.tasks.system.cleanup_dispatcher_payloads', 'schedule': timedelta(hours=1)},
     'cleanup_host_metrics': {'task': 'awx.main.tasks.host_metrics.cleanup_host_metrics', 'schedule': timedelta(hours=3, minutes=30)},
     'host_metric_summary_monthly': {'task': 'awx.main.tasks.host_metrics.host_metric_summary_monthly', 'schedule': timedelta(hours=4)},
     'periodic_resource_sync': {'task': 'awx.main.tasks.system.periodic_resource_sync', 'schedule': timedelta(minutes=15)},
@@ -934,6 +1036,18 @@ BROADCAST_WEBSOCKET_STATS_POLL_RATE_SECONDS = 5
 # How often should web instances advertise themselves?
 BROADCAST_WEBSOCKET_BEACON_FROM_WEB_RATE_SECONDS = 15
 
+# Send websocket notifications from a long-lived publisher thread in each
+# process, instead of creating a new event loop for every message
+CHANNEL_NOTIFICATION_ASYNC_PUBLISHER = False
+
+# Send the job events saved by each callback receiver flush as one websocket
+# message per job, instead of one message per event
+JOB_EVENT_BROADCAST_BATCH = False
+
+# Maximum number of websocket notifications waiting to be sent by the publisher
+# thread of a process, any new notifications are dropped while it is full
+CHANNEL_NOTIFICATION_MAX_QUEUE_SIZE = 10000
+
 DJANGO_GUID = {'GUID_HEADER_NAME': 'X-API-Request-Id'}
 
 # Name of the default task queue
@@ -977,6 +1091,11 @@ CLEANUP_HOST_METRICS_SOFT_THRESHOLD = 12  # months
 # - also threshold for computing HostMetricSummaryMonthly (command/scheduled task)
 CLEANUP_HOST_METRICS_HARD_THRESHOLD = 36  # months
 
+# Number of hostnames upserted into HostMetric per statement (and transaction)
+# when a job finishes; smaller batches hold fewer row locks at a time when
+# several jobs against overlapping hosts finish concurrently
+HOST_METRIC_UPSERT_BATCH_SIZE = 500
+
 # Host metric summary monthly task - last time of run
 HOST_METRIC_SUMMARY_TASK_LAST_TS = None
 HOST_METRIC_SUMMARY_TASK_INTERVAL = 7  # days
@@ -0,0 +1,110 @@
+#! /usr/bin/env awx-python
+
+#
+# Measures dispatcher throughput for tasks that do (almost) nothing, which is
+# dominated by the per-message overhead of the TaskWorker:
+#
+#   * inline: TaskWorker.perform_work() called in this process
+#   * pool: messages written round robin to a pool of forked TaskWorkers,
+#     timed until every worker is idle again
+#
+# Both are run in the "legacy" mode, which resolves the task by importing its
+# module and runs the fork and k8s temp file cleanups for every message, and
+# in the "cached" mode, which is what the dispatcher does now.  The task is
+# delete_project_files for a path that does not exist.
+#
+#   $ awx-python tools/scripts/benchmark_dispatcher_noop.py --messages 20000 --workers 4
+#
+
+import argparse
+import contextlib
+import importlib
+import site
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django import setup as setup_django
+
+
+TASK = 'awx.main.tasks.system.delete_project_files'
+
+
+def legacy_resolve_callable(task):
+    module, target = task.rsplit('.', 1)
+    return getattr(importlib.import_module(module), target)
+
+
+def run(messages, workers):
+    sys.path[:0] = site.getsitepackages()
+    from awx import prepare_env
+
+    prepare_env()
+    setup_django()
+
+    from django.conf import settings
+    from kubernetes.config import kube_config
+    from awx.main.dispatch.pool import StatefulPoolWorker, WorkerPool
+    from awx.main.dispatch.worker import TaskWorker
+
+    original_perform_work = TaskWorker.perform_work
+
+    def legacy_perform_work(self, body):
+        settings.__clean_on_fork__()
+        try:
+            return original_perform_work(self, body)
+        finally:
+            kube_config._cleanup_temp_files()
+
+    @contextlib.contextmanager
+    def legacy():
+        with mock.patch.object(TaskWorker, 'resolve_callable', staticmethod(legacy_resolve_callable)), mock.patch.object(
+            TaskWorker, 'perform_work', legacy_perform_work
+        ):
+            yield
+
+    modes = {'legacy': legacy, 'cached': contextlib.nullcontext}
+    project_path = tempfile.mktemp(prefix='awx-benchmark-')
+
+    def body():
+        return {'task': TASK, 'args': [project_path], 'kwargs': {}}
+
+    def inline():
+        worker = TaskWorker()
+        start = time.perf_counter()
+        for _ in range(messages):
+            worker.perform_work(body())
+        return time.perf_counter() - start
+
+    class Pool(WorkerPool):
+        pool_cls = StatefulPoolWorker
+
+    def pool():
+        pool = Pool(min_workers=workers, queue_size=messages)
+        pool.init_workers(TaskWorker().work_loop)
+        try:
+            start = time.perf_counter()
+            for i in range(messages):
+                pool.write(i % workers, body())
+            while not all(w.idle for w in pool.workers):
+                time.sleep(0.001)
+            return time.perf_counter() - start
+        finally:
+            for w in pool.workers:
+                w.quit()
+
+    print(f'{"benchmark":<10} {"mode":<8} {"seconds":>9} {"tasks/s":>10}')
+    for name, benchmark in (('inline', inline), ('pool', pool)):
+        for mode, context in modes.items():
+            with context():
+                elapsed = benchmark()
+            print(f'{name:<10} {mode:<8} {elapsed:>9.3f} {messages / elapsed:>10.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--messages', type=int, help='Number of no-op task messages per run.', default=20000)
+    parser.add_argument('--workers', type=int, help='Number of worker processes in the pool benchmark.', default=4)
+    args = parser.parse_args()
+    run(args.messages, args.workers)
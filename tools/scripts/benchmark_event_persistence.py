@@ -0,0 +1,86 @@
+#! /usr/bin/env awx-python
+
+#
+# Compares the callback receiver's job event persistence methods
+# (see JOB_EVENT_PERSISTENCE_METHOD) by timing how long it takes to save
+# batches of synthetic main_jobevent rows with each of them.
+#
+# This creates (and afterwards deletes) a throwaway job and its events; run it
+# against a development or staging database, not a production installation.
+#
+#   $ awx-python tools/scripts/benchmark_event_persistence.py --batch-sizes 100 1000 10000
+#
+
+import argparse
+import site
+import sys
+from time import perf_counter
+from uuid import uuid4
+
+from django import setup as setup_django
+
+
+def make_events(JobEvent, job, n):
+    events = []
+    for i in range(n):
+        event = JobEvent.create_from_data(
+            job_id=job.id,
+            job_created=job.created,
+            uuid=str(uuid4()),
+            counter=i + 1,
+            event='runner_on_ok',
+            event_data={'task_action': 'debug', 'host': f'host-{i}', 'res': {'msg': 'x' * 64}},
+            stdout=f'ok: [host-{i}] => {{"msg": "{"x" * 64}"}}',
+            start_line=i,
+            end_line=i + 1,
+        )
+        event.created = event.modified = job.created
+        events.append(event)
+    return events
+
+
+def run(batch_sizes, repeat):
+    sys.path[:0] = site.getsitepackages()
+    from awx import prepare_env
+
+    prepare_env()
+    setup_django()
+
+    from django.db import connection
+    from awx.main.dispatch.worker.callback import copy_events
+    from awx.main.models import Job, JobEvent
+    from awx.main.utils.common import create_partition
+
+    if connection.vendor != 'postgresql':
+        sys.exit('COPY FROM STDIN requires a PostgreSQL database')
+
+    methods = {
+        'bulk_create': lambda events: JobEvent.objects.bulk_create(events),
+        'copy': lambda events: copy_events(JobEvent, events),
+    }
+
+    job = Job.objects.create(name='event persistence benchmark', status='running')
+    create_partition(JobEvent._meta.db_table, start=job.created)
+    try:
+        print(f'{"batch size":>10}  {"method":<12} {"best (s)":>10} {"events/s":>12}')
+        for n in batch_sizes:
+            for name, save in methods.items():
+                best = None
+                for _ in range(repeat):
+                    events = make_events(JobEvent, job, n)
+                    start = perf_counter()
+                    save(events)
+                    elapsed = perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f'{n:>10}  {name:<12} {best:>10.4f} {n / best:>12.0f}')
+    finally:
+        JobEvent.objects.filter(job_id=job.id, job_created=job.created).delete()
+        job.delete()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', help='Number of events saved per batch.', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, help='Number of times each batch is saved, the best time is reported.', default=5)
+    args = parser.parse_args()
+    run(args.batch_sizes, args.repeat)
@@ -0,0 +1,86 @@
+#! /usr/bin/env awx-python
+
+#
+# Times the playbook_on_stats wrapup (JobHostSummary creation and Host
+# last_job/last_job_host_summary updates) for synthetic inventories of
+# increasing size, comparing the ORM code path with the set-based SQL used on
+# PostgreSQL.  HostMetric records are saved the same way by both paths, so
+# they are left out of the timings.
+#
+# This creates (and afterwards deletes) a throwaway organization, inventory,
+# hosts and jobs; run it against a development or staging database, not a
+# production installation.
+#
+#   $ awx-python tools/scripts/benchmark_host_summary_wrapup.py --host-counts 1000 10000 100000
+#
+
+import argparse
+import site
+import sys
+from time import perf_counter
+from unittest import mock
+from uuid import uuid4
+
+from django import setup as setup_django
+
+
+def run(host_counts, repeat):
+    sys.path[:0] = site.getsitepackages()
+    from awx import prepare_env
+
+    prepare_env()
+    setup_django()
+
+    from django.db import connection
+    from awx.main.models import Host, Inventory, Job, JobEvent, JobHostSummary, Organization
+
+    if connection.vendor != 'postgresql':
+        sys.exit('The set-based host summary wrapup requires a PostgreSQL database')
+
+    def wrapup_orm(event, hostnames):
+        with mock.patch.object(connection, 'vendor', 'sqlite'), mock.patch.object(JobEvent, '_update_host_metrics'):
+            event._update_host_summary_from_stats(hostnames)
+
+    def wrapup_sql(event, hostnames):
+        with mock.patch.object(JobEvent, '_update_host_metrics'):
+            event._update_host_summary_from_stats(hostnames)
+
+    methods = {'orm': wrapup_orm, 'sql': wrapup_sql}
+
+    prefix = f'wrapup-benchmark-{uuid4().hex[:8]}'
+    org = Organization.objects.create(name=prefix)
+    inventory = Inventory.objects.create(name=prefix, organization=org)
+    try:
+        print(f'{"hosts":>10}  {"method":<6} {"best (s)":>10} {"hosts/s":>12}')
+        for n in host_counts:
+            Host.objects.bulk_create([Host(name=f'{prefix}-{i}', inventory=inventory) for i in range(n)], batch_size=5000)
+            hosts = dict(Host.objects.filter(inventory=inventory).values_list('name', 'id'))
+            hostnames = list(hosts.keys())
+            stats = {'ok': {name: 1 for name in hostnames}, 'changed': {name: 1 for name in hostnames}}
+            for name, wrapup in methods.items():
+                best = None
+                for _ in range(repeat):
+                    job = Job.objects.create(name=prefix, inventory=inventory, status='running')
+                    event = JobEvent(job=job, job_id=job.id, job_created=job.created, event='playbook_on_stats', event_data=stats, host_map=hosts)
+                    start = perf_counter()
+                    wrapup(event, hostnames)
+                    elapsed = perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f'{n:>10}  {name:<6} {best:>10.4f} {n / best:>12.0f}')
+            Host.objects.filter(inventory=inventory).update(last_job=None, last_job_host_summary=None)
+            JobHostSummary.objects.filter(job__inventory=inventory).delete()
+            Host.objects.filter(inventory=inventory).delete()
+    finally:
+        Host.objects.filter(inventory=inventory).update(last_job=None, last_job_host_summary=None)
+        JobHostSummary.objects.filter(job__inventory=inventory).delete()
+        Job.objects.filter(inventory=inventory).delete()
+        inventory.delete()
+        org.delete()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host-counts', type=int, nargs='+', help='Number of hosts in the playbook_on_stats event.', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, help='Number of jobs wrapped up per host count, the best time is reported.', default=3)
+    args = parser.parse_args()
+    run(args.host_counts, args.repeat)
@@ -0,0 +1,87 @@
+#! /usr/bin/env awx-python
+
+#
+# Times task manager runs with many pending jobs, loading every pending,
+# waiting and running job on each run (TASK_MANAGER_INCREMENTAL_STATE=False)
+# and keeping them between runs, only loading the jobs that changed
+# (TASK_MANAGER_INCREMENTAL_STATE=True).
+#
+# Between two runs, --churn of the pending jobs finish and as many new jobs
+# are launched.  Jobs are not actually started: TaskManager.start_task is
+# replaced with a no-op, so every run looks at all of the pending jobs.
+#
+# This creates (and afterwards deletes) a throwaway job template and jobs;
+# run it against a development or staging database, not a production
+# installation.
+#
+#   $ awx-python tools/scripts/benchmark_task_manager_state.py --job-counts 1000 5000 20000
+#
+
+import argparse
+import random
+import site
+import statistics
+import sys
+from time import perf_counter
+from unittest import mock
+from uuid import uuid4
+
+from django import setup as setup_django
+
+
+def run(job_counts, runs, churn):
+    sys.path[:0] = site.getsitepackages()
+    from awx import prepare_env
+
+    prepare_env()
+    setup_django()
+
+    from django.db import transaction
+    from django.test import override_settings
+    from awx.main.models import Job, JobTemplate
+    from awx.main.scheduler import TaskManager
+    from awx.main.scheduler.task_manager import task_snapshot
+
+    prefix = f'tm-benchmark-{uuid4().hex[:8]}'
+    jt = JobTemplate.objects.create(name=prefix, playbook='helloworld.yml')
+    try:
+        print(f'{"jobs":>8}  {"state":<12} {"run p50 (s)":>12} {"load p50 (s)":>13} {"loaded":>8}')
+
+        def launch(count):
+            with transaction.atomic():
+                for _ in range(count):
+                    Job.objects.create(name=prefix, job_template=jt, status='pending', dependencies_processed=True)
+
+        for n in job_counts:
+            launch(n - Job.objects.filter(job_template=jt, status='pending').count())
+            for state, incremental in (('full', False), ('incremental', True)):
+                task_snapshot.clear()
+                run_times, load_times = [], []
+                with override_settings(TASK_MANAGER_INCREMENTAL_STATE=incremental), mock.patch.object(TaskManager, 'start_task'):
+                    TaskManager().schedule()  # warm up, and the first full load
+                    for _ in range(runs):
+                        pending = list(Job.objects.filter(job_template=jt, status='pending').values_list('id', flat=True))
+                        for job in Job.objects.filter(id__in=random.sample(pending, min(churn, len(pending)))):
+                            job.status = 'successful'
+                            job.save()
+                        launch(churn)
+                        tm = TaskManager()
+                        start = perf_counter()
+                        tm.schedule()
+                        run_times.append(perf_counter() - start)
+                        load_times.append(tm.subsystem_metrics.get('task_manager_get_tasks_seconds'))
+                loaded = task_snapshot.loaded if incremental else n
+                print(f'{n:>8}  {state:<12} {statistics.median(run_times):>12.3f} {statistics.median(load_times):>13.3f} {loaded:>8}')
+    finally:
+        task_snapshot.clear()
+        Job.objects.filter(job_template=jt).delete()
+        jt.delete()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--job-counts', type=int, nargs='+', help='Number of pending jobs.', default=[1000, 5000, 20000])
+    parser.add_argument('--runs', type=int, help='Number of task manager runs timed per job count and state.', default=5)
+    parser.add_argument('--churn', type=int, help='Number of pending jobs modified between two runs.', default=20)
+    args = parser.parse_args()
+    run(args.job_counts, args.runs, args.churn)
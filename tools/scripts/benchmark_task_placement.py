@@ -0,0 +1,112 @@
+#! /usr/bin/env awx-python
+
+#
+# Simulates the task manager placing jobs on the instances of an instance
+# group, with synthetic instances and jobs and no database, and compares:
+#
+#   * scan: every instance of the group looked at for each job, and again
+#     for the largest idle instance when the job fits nowhere, which is what
+#     the task manager did before placement strategies
+#   * each TASK_MANAGER_PLACEMENT_STRATEGY, backed by the sorted capacity index
+#
+# Jobs are never released, so the instances fill up like they would under a
+# backlog of pending jobs; jobs are placed until --jobs of them are placed or
+# one fits nowhere.  For each run it prints the time per placement and how
+# much of the capacity of the instances was used by then.
+#
+#   $ awx-python tools/scripts/benchmark_task_placement.py --instances 10 100 1000 --jobs 20000
+#
+
+import argparse
+import random
+import site
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+
+from django import setup as setup_django
+
+
+def scan_fit(instance_group, impact, capacity_type, hybrid_cost):
+    instance_most_capacity = None
+    most_remaining_capacity = -1
+    for i in instance_group.instances:
+        if i.node_type not in (capacity_type, 'hybrid'):
+            continue
+        would_be_remaining = i.remaining_capacity - impact
+        if i.node_type == 'hybrid':
+            would_be_remaining -= hybrid_cost
+        if would_be_remaining >= 0 and (instance_most_capacity is None or would_be_remaining > most_remaining_capacity):
+            instance_most_capacity = i
+            most_remaining_capacity = would_be_remaining
+    if instance_most_capacity is not None:
+        return instance_most_capacity
+    largest_instance = None
+    for i in instance_group.instances:
+        if i.node_type not in (capacity_type, 'hybrid') or i.capacity <= 0:
+            continue
+        if i.jobs_running == 0 or i.remaining_capacity == i.capacity:
+            if largest_instance is None or i.capacity > largest_instance.capacity:
+                largest_instance = i
+    return largest_instance
+
+
+def run(instance_counts, jobs, seed):
+    sys.path[:0] = site.getsitepackages()
+    from awx import prepare_env
+
+    prepare_env()
+    setup_django()
+
+    from awx.main.scheduler.task_manager_models import PLACEMENT_STRATEGIES, TaskManagerModels
+
+    print(f'{"instances":>9}  {"strategy":<20} {"placed":>7} {"us/placement":>13} {"capacity used":>14}')
+    for n in instance_counts:
+        rng = random.Random(seed)
+        nodes = [
+            SimpleNamespace(hostname=f'node-{i}', node_type=rng.choice(('execution', 'execution', 'hybrid')), capacity=rng.choice((50, 100, 200, 400)))
+            for i in range(n)
+        ]
+        group = SimpleNamespace(
+            pk=1, name='default', is_container_group=False, max_concurrent_jobs=0, max_forks=0, instances=SimpleNamespace(all=lambda: nodes)
+        )
+        impacts = [rng.choice((1, 2, 5, 10, 20, 50)) for _ in range(jobs)]
+
+        for strategy in ['scan'] + list(PLACEMENT_STRATEGIES):
+            tm_models = TaskManagerModels(
+                instances=nodes,
+                instance_groups=[group],
+                control_task_impact=1,
+                controlplane_ig_name='controlplane',
+                placement_strategy=strategy if strategy != 'scan' else 'most_remaining',
+            )
+            instance_groups = tm_models.instance_groups
+            placed = 0
+            start = perf_counter()
+            for impact in impacts:
+                task = SimpleNamespace(task_impact=impact, capacity_type='execution')
+                if strategy == 'scan':
+                    instance = scan_fit(instance_groups['default'], impact, 'execution', 1)
+                else:
+                    instance = instance_groups.fit_task_to_instance(
+                        task, 'default', add_hybrid_control_cost=True
+                    ) or instance_groups.find_largest_idle_instance('default')
+                if instance is None:
+                    break
+                instance.consume_capacity(impact, job_impact=True)
+                if instance.node_type == 'hybrid':
+                    # hybrid nodes control their own jobs
+                    instance.consume_capacity(1)
+                placed += 1
+            elapsed = perf_counter() - start
+            used = instance_groups.get_consumed_capacity('default') / instance_groups.get_capacity('default')
+            print(f'{n:>9}  {strategy:<20} {placed:>7} {elapsed / max(placed, 1) * 1e6:>13.1f} {used:>14.1%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--instances', type=int, nargs='+', help='Number of instances in the instance group.', default=[10, 100, 1000])
+    parser.add_argument('--jobs', type=int, help='Maximum number of jobs placed per run.', default=20000)
+    parser.add_argument('--seed', type=int, help='Seed of the synthetic instances and jobs.', default=0)
+    args = parser.parse_args()
+    run(args.instances, args.jobs, args.seed)